@@ -0,0 +1,159 @@
+"""
+Structured access log: one JSON line per request.
+
+With `ACCESS_LOG.enabled`, each request is logged with its method, route, path,
+status, organization (if authenticated), duration, database queries and time (see
+`app.queries`), and response size. Only `ACCESS_LOG.success_sample_rate` of the
+successful requests (below 400) are logged, and all the others.
+
+Records are handed over to a background thread, which logs them, through a queue of
+`ACCESS_LOG.queue_size`, so that the event loop never waits on the log's sinks. When
+the thread falls behind and the queue is full, records are dropped. How many records
+are written, dropped and left out by sampling is counted in `app.metrics`.
+
+The lines are logged with loguru, bound with `access=True`. `configure_sinks()` sends
+them, as bare JSON lines, to a sink of their own, and keeps them out of the default
+one on stderr.
+"""
+
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from typing import Any
+
+from loguru import logger
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import settings
+from .metrics import metrics
+from .queries import count_queries
+
+# Fields to add to the record of the current request, if it is logged.
+access_fields: ContextVar[dict[str, Any] | None] = ContextVar(
+    "access_fields", default=None
+)
+
+
+def annotate(**fields: Any) -> None:
+    """Add `fields` to the access log record of the current request."""
+    current = access_fields.get()
+    if current is not None:
+        current.update(fields)
+
+
+def configure_sinks(sink: Any = sys.stdout) -> None:
+    """
+    Log access records to `sink`, one JSON object per line, and the other records to
+    stderr, formatted as loguru does by default.
+    """
+    logger.remove()
+    logger.add(sys.stderr, filter=lambda record: "access" not in record["extra"])
+    logger.add(
+        sink,
+        format="{message}",
+        filter=lambda record: "access" in record["extra"],
+    )
+
+
+class AccessLogWriter(threading.Thread):
+    """Log the records of `records` until it gets `None`."""
+
+    def __init__(self, records: queue.Queue[dict[str, Any] | None]) -> None:
+        super().__init__(name="access-log", daemon=True)
+        self.records = records
+
+    def run(self) -> None:
+        access_logger = logger.bind(access=True)
+        while (record := self.records.get()) is not None:
+            access_logger.info(json.dumps(record))
+            metrics.access_log_record("written")
+
+
+class AccessLog:
+    """The queue of records to log, while a writer is started."""
+
+    def __init__(self) -> None:
+        self.records: queue.Queue[dict[str, Any] | None] | None = None
+        self.writer: AccessLogWriter | None = None
+
+    def start(self) -> None:
+        self.records = queue.Queue(settings.ACCESS_LOG.queue_size)
+        self.writer = AccessLogWriter(self.records)
+        self.writer.start()
+
+    def stop(self) -> None:
+        """Log the records left, then stop the writer."""
+        if self.records is None or self.writer is None:
+            return
+        self.records.put(None)
+        self.writer.join()
+        self.records = self.writer = None
+
+    def put(self, record: dict[str, Any]) -> None:
+        if self.records is None:
+            return
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            metrics.access_log_record("dropped")
+
+
+access_log = AccessLog()
+
+
+class AccessLogMiddleware:
+    """Log requests to the access log."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.ACCESS_LOG.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_counted(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            else:
+                size += len(message.get("body", b""))
+            await send(message)
+
+        fields: dict[str, Any] = {}
+        token = access_fields.set(fields)
+        start = time.perf_counter()
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_counted)
+        finally:
+            access_fields.reset(token)
+            seconds = time.perf_counter() - start
+            rate = settings.ACCESS_LOG.success_sample_rate
+            if status < 400 and rate < 1 and random.random() >= rate:  # noqa: S311
+                metrics.access_log_record("sampled_out")
+            else:
+                # Set by the router once it matched a route.
+                route = scope.get("route")
+                access_log.put(
+                    {
+                        "time": datetime.now(tz=UTC).isoformat(),
+                        "method": scope["method"],
+                        "route": route.path if route is not None else None,
+                        "path": scope["path"],
+                        "status": status,
+                        **fields,
+                        "duration_ms": round(seconds * 1000, 3),
+                        "db_queries": queries.count,
+                        "db_ms": round(queries.seconds * 1000, 3),
+                        "response_bytes": size,
+                    }
+                )
@@ -0,0 +1,102 @@
+"""
+Write-behind access counters for sharing links.
+
+Accesses are accumulated in memory and periodically written to the database with a
+single batched upsert, so a popular link costs one row write per flush instead of one
+per access. Each shard has its own counters, flushed to its own database.
+"""
+
+from datetime import UTC, datetime
+
+from tortoise.connection import connections
+
+from .sharding import DEFAULT_SHARD, current_shard
+
+UPSERT_SQL = """
+INSERT INTO "sharinglinkaccess" (
+    "sharing_link_id", "organization_id", "access_count", "last_access_time"
+)
+SELECT t.id, "sharinglink"."organization_id", t.count, t.time
+FROM unnest($1::bigint[], $2::bigint[], $3::timestamptz[]) AS t(id, count, time)
+JOIN "sharinglink" ON "sharinglink"."id" = t.id
+ON CONFLICT ("sharing_link_id") DO UPDATE SET
+    "access_count" = "sharinglinkaccess"."access_count" + EXCLUDED."access_count",
+    "last_access_time" = GREATEST(
+        "sharinglinkaccess"."last_access_time",
+        EXCLUDED."last_access_time"
+    )
+"""
+
+
+class AccessCounter:
+    """
+    Coalesce sharing link accesses in memory until the next flush.
+
+    `record` never awaits, so it is atomic with respect to other coroutines on the
+    event loop and needs no lock.
+    """
+
+    def __init__(self, shard: str = DEFAULT_SHARD) -> None:
+        self.shard = shard
+        self.pending: dict[int, tuple[int, datetime]] = {}
+
+    def record(self, sharing_link_id: int) -> None:
+        count, _ = self.pending.get(sharing_link_id, (0, None))
+        self.pending[sharing_link_id] = (count + 1, datetime.now(tz=UTC))
+
+    async def flush(self) -> int:
+        """
+        Upsert all pending counters in one statement.
+
+        Counters of links deleted in the meantime are dropped. If the upsert fails,
+        the counters are merged back so the next flush retries them.
+
+        Returns the number of links flushed.
+        """
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+
+        ids = list(pending)
+        counts = [count for count, _ in pending.values()]
+        times = [time for _, time in pending.values()]
+        try:
+            await connections.get(self.shard).execute_query(
+                UPSERT_SQL,
+                [ids, counts, times],
+            )
+        except Exception:
+            for sharing_link_id, (count, time) in pending.items():
+                new_count, new_time = self.pending.get(sharing_link_id, (0, time))
+                self.pending[sharing_link_id] = (count + new_count, new_time)
+            raise
+        return len(pending)
+
+
+class ShardedAccessCounter:
+    """Keep an `AccessCounter` per shard, recording into the current one."""
+
+    def __init__(self) -> None:
+        self.counters: dict[str, AccessCounter] = {}
+
+    def record(self, sharing_link_id: int) -> None:
+        shard = current_shard.get()
+        if shard not in self.counters:
+            self.counters[shard] = AccessCounter(shard)
+        self.counters[shard].record(sharing_link_id)
+
+    async def flush(self) -> int:
+        """
+        Flush the counters of every shard.
+
+        If a shard fails, the remaining ones are left for the next flush.
+
+        Returns the number of links flushed.
+        """
+        flushed = 0
+        for counter in list(self.counters.values()):
+            flushed += await counter.flush()
+        return flushed
+
+
+sharing_link_access = ShardedAccessCounter()
@@ -0,0 +1,130 @@
+"""
+Per-organization admission control.
+
+Every authenticated request holds one of `ADMISSION.slots` slots while its endpoint
+runs, and an organization holds at most `ADMISSION.organization_slots` of them at
+once, so that one busy organization can't take up the whole connection pool. Requests
+that can't get a slot wait in a queue of at most `ADMISSION.queue_size` requests, for
+at most `ADMISSION.queue_timeout_seconds`; beyond that they are shed right away with
+a 503 telling the client when to retry.
+
+Slots are counted per process, each with its share of the slots (see
+`AdmissionSettings.split`).
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+
+from . import settings
+
+
+@dataclass
+class AdmissionStats:
+    admitted: int = 0
+    rejected: int = 0
+    # Admitted requests that had to wait, and how long they waited in total.
+    queued: int = 0
+    queue_wait_seconds: float = 0
+
+
+class AdmissionController:
+    """
+    Hand out request slots, fairly between organizations.
+
+    Nothing awaits between checking and taking a slot, so no lock is needed. Freed
+    slots go to the longest waiting request whose organization is below its share.
+    """
+
+    def __init__(self) -> None:
+        self.in_use = 0
+        self.organizations: dict[int, int] = {}
+        self.waiters: deque[tuple[int, asyncio.Future[None]]] = deque()
+        self.stats = AdmissionStats()
+
+    def can_admit(self, organization_id: int) -> bool:
+        return (
+            self.in_use < settings.ADMISSION.slots
+            and self.organizations.get(organization_id, 0)
+            < settings.ADMISSION.organization_slots
+        )
+
+    def take(self, organization_id: int) -> None:
+        self.in_use += 1
+        self.organizations[organization_id] = (
+            self.organizations.get(organization_id, 0) + 1
+        )
+
+    def release(self, organization_id: int) -> None:
+        self.in_use -= 1
+        self.organizations[organization_id] -= 1
+        if not self.organizations[organization_id]:
+            del self.organizations[organization_id]
+        self.wake()
+
+    def wake(self) -> None:
+        """Hand free slots to waiting requests."""
+        for waiter in list(self.waiters):
+            organization_id, future = waiter
+            if self.can_admit(organization_id):
+                self.waiters.remove(waiter)
+                # Taken on behalf of the waiter, which may not run before the next
+                # request checks.
+                self.take(organization_id)
+                future.set_result(None)
+
+    def reject(self) -> HTTPException:
+        self.stats.rejected += 1
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.ADMISSION.retry_after_seconds)},
+        )
+
+    async def acquire(self, organization_id: int) -> None:
+        """Take a slot, waiting for one if needed; raise 503 if none can be had."""
+        # Waiting requests are below their share only while all slots are in use.
+        if self.can_admit(organization_id):
+            self.take(organization_id)
+            self.stats.admitted += 1
+            return
+        if len(self.waiters) >= settings.ADMISSION.queue_size:
+            raise self.reject()
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (organization_id, future)
+        self.waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout=settings.ADMISSION.queue_timeout_seconds,
+            )
+        except BaseException as e:
+            if future.done():
+                # Admitted just as it gave up.
+                self.release(organization_id)
+            else:
+                self.waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                raise self.reject() from e
+            raise
+        self.stats.admitted += 1
+        self.stats.queued += 1
+        self.stats.queue_wait_seconds += time.perf_counter() - start
+
+    @asynccontextmanager
+    async def admit(self, organization_id: int) -> AsyncIterator[None]:
+        """Hold a slot for the organization in the block."""
+        await self.acquire(organization_id)
+        try:
+            yield
+        finally:
+            self.release(organization_id)
+
+
+admission = AdmissionController()
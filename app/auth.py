@@ -4,6 +4,7 @@ Authentication endpoints and utilities for a simulated OAuth2 flow.
 
 __all__ = ("OAuthRequestSource",)
 
+from collections.abc import AsyncIterator
 from datetime import UTC, datetime, timedelta
 from enum import StrEnum
 from typing import Annotated, Any, Literal, cast
@@ -11,12 +12,18 @@ from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
 from uuid import uuid4
 
 import jwt
-from fastapi import APIRouter, Depends, Form, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Response, status
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from pydantic import BaseModel, Field, HttpUrl
 
 from . import settings
+from .access_log import annotate
+from .admission import admission
+from .metrics import metrics
+from .rate_limits import rate_limiter
+from .sharding import use_organization_shard
+from .timing import TimedRoute, phase
 from .types import Id, Token
 
 jwt_settings = settings.JWT
@@ -25,6 +32,7 @@ auth_settings = settings.AUTH
 router = APIRouter(
     prefix="",
     tags=["Auth"],
+    route_class=TimedRoute,
 )
 
 
@@ -64,11 +72,12 @@ def create_jwt(data: dict[str, Any], expires_in: timedelta, type_: TokenType) ->
 
 
 def verify_jwt(token: Token, type_: TokenType) -> dict[str, Any]:
-    payload = jwt.decode(
-        token,
-        key=jwt_settings.secret_key,
-        algorithms=[jwt_settings.algorithm],
-    )
+    with phase("auth"):
+        payload = jwt.decode(
+            token,
+            key=jwt_settings.secret_key,
+            algorithms=[jwt_settings.algorithm],
+        )
     if payload.get("type") != type_:
         raise jwt.InvalidTokenError
     return cast(dict[str, Any], payload)
@@ -197,12 +206,24 @@ class RequestSource(BaseModel):
     organization_id: Id
 
 
-def get_request_source(token: Annotated[str, Depends(oauth2_scheme)]) -> RequestSource:
+async def get_request_source(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    response: Response,
+) -> AsyncIterator[RequestSource]:
     try:
         payload = verify_jwt(token, type_=TokenType.ACCESS_TOKEN)
     except jwt.InvalidTokenError as e:
+        metrics.auth_failure("invalid_token")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED) from e
-    return RequestSource(organization_id=payload["sub"])
+    rs = RequestSource(organization_id=payload["sub"])
+    annotate(organization_id=rs.organization_id)
+    # Before waiting for a slot, which requests over their rate shouldn't take.
+    await rate_limiter.limit(rs.organization_id, payload["nonce"], response.headers)
+    # Async, so that the shard is set in the context the endpoint runs in.
+    await use_organization_shard(rs.organization_id)
+    # Held until the endpoint returns.
+    async with admission.admit(rs.organization_id):
+        yield rs
 
 
 OAuthRequestSource = Annotated[RequestSource, Depends(get_request_source)]
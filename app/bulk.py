@@ -0,0 +1,218 @@
+"""
+Set-based bulk writes that avoid one ORM round trip per row.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from .models import Item, SharingLink
+from .sharding import shard_db
+
+INSERT_ITEMS_SQL = """
+INSERT INTO "item" (
+    "id", "create_time", "update_time", "organization_id", "owner_id", "parent_id",
+    "name", "type", "file_size"
+)
+SELECT t.id, now(), now(), $1, $2, t.parent_id, t.name, t.type, t.file_size
+FROM unnest($3::bigint[], $4::bigint[], $5::text[], $6::text[], $7::bigint[])
+    AS t(id, parent_id, name, type, file_size)
+"""
+
+INSERT_SHARING_LINKS_SQL = """
+INSERT INTO "sharinglink" (
+    "create_time", "update_time", "organization_id", "item_id", "token", "permission",
+    "expire_time"
+)
+SELECT now(), now(), $1, t.item_id, t.token, t.permission, t.expire_time
+FROM unnest($2::bigint[], $3::uuid[], $4::text[], $5::timestamptz[])
+    AS t(item_id, token, permission, expire_time)
+RETURNING
+    "id", "create_time", "update_time", "item_id", "token", "permission",
+    "expire_time"
+"""
+
+
+@dataclass
+class ItemRows:
+    """Column arrays of items to insert, with every parent before its children."""
+
+    ids: list[int] = field(default_factory=list)
+    parent_ids: list[int | None] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    types: list[Item.Type] = field(default_factory=list)
+    file_sizes: list[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+@dataclass
+class SharingLinkRows:
+    """Column arrays of sharing links to insert."""
+
+    item_ids: list[int] = field(default_factory=list)
+    tokens: list[UUID] = field(default_factory=list)
+    permissions: list[SharingLink.Permission] = field(default_factory=list)
+    expire_times: list[datetime | None] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+
+async def insert_items(
+    organization_id: int,
+    owner_id: int,
+    rows: ItemRows,
+    batch_size: int,
+) -> None:
+    """
+    Insert items with one multi-row statement per `batch_size` rows.
+
+    Foreign keys are checked at the end of each statement, and parents come before
+    their children, so every batch only references rows that already exist.
+    """
+    db = shard_db()
+    for start in range(0, len(rows), batch_size):
+        end = start + batch_size
+        await db.execute_query(
+            INSERT_ITEMS_SQL,
+            [
+                organization_id,
+                owner_id,
+                rows.ids[start:end],
+                rows.parent_ids[start:end],
+                rows.names[start:end],
+                rows.types[start:end],
+                rows.file_sizes[start:end],
+            ],
+        )
+
+
+async def insert_sharing_links(
+    organization_id: int,
+    rows: SharingLinkRows,
+    batch_size: int,
+) -> list[dict[str, Any]]:
+    """
+    Insert sharing links of items in one organization, with one multi-row statement
+    per `batch_size` rows.
+
+    Returns the inserted rows in the order of `rows`.
+    """
+    db = shard_db()
+    inserted: dict[UUID, dict[str, Any]] = {}
+    for start in range(0, len(rows), batch_size):
+        end = start + batch_size
+        _, records = await db.execute_query(
+            INSERT_SHARING_LINKS_SQL,
+            [
+                organization_id,
+                rows.item_ids[start:end],
+                rows.tokens[start:end],
+                rows.permissions[start:end],
+                rows.expire_times[start:end],
+            ],
+        )
+        inserted.update((record["token"], dict(record)) for record in records)
+    # `RETURNING` makes no promise about row order, but tokens are unique.
+    return [inserted[token] for token in rows.tokens]
+
+
+# Every statement below repeats the organization in each reference to "item", so
+# that a partitioned table is pruned to the organization's partition.
+
+IS_DESCENDANT_SQL = """
+WITH RECURSIVE ancestors AS (
+    SELECT "id", "parent_id" FROM "item" WHERE "organization_id" = $3 AND "id" = $2
+    UNION ALL
+    SELECT "item"."id", "item"."parent_id"
+    FROM "item" JOIN ancestors ON "item"."id" = ancestors."parent_id"
+    WHERE "item"."organization_id" = $3
+)
+SELECT EXISTS (SELECT 1 FROM ancestors WHERE "id" = $1) AS "is_descendant"
+"""
+
+MOVE_ITEM_SQL = """
+UPDATE "item" SET "parent_id" = $3, "update_time" = now()
+WHERE "organization_id" = $4 AND "id" = $1 AND "owner_id" = $2
+"""
+
+MOVE_SUBTREE_SQL = """
+WITH RECURSIVE subtree AS (
+    SELECT "id" FROM "item" WHERE "organization_id" = $4 AND "id" = $1
+    UNION ALL
+    SELECT "item"."id" FROM "item" JOIN subtree ON "item"."parent_id" = subtree."id"
+    WHERE "item"."organization_id" = $4
+)
+UPDATE "item" SET
+    "owner_id" = $2,
+    "parent_id" = CASE WHEN "id" = $1 THEN $3 ELSE "parent_id" END,
+    "update_time" = now()
+WHERE "organization_id" = $4 AND "id" IN (SELECT "id" FROM subtree)
+"""
+
+DELETE_SUBTREE_SQL = """
+WITH RECURSIVE subtree AS (
+    SELECT "id" FROM "item" WHERE "organization_id" = $2 AND "id" = $1
+    UNION ALL
+    SELECT "item"."id" FROM "item" JOIN subtree ON "item"."parent_id" = subtree."id"
+    WHERE "item"."organization_id" = $2
+)
+, deleted_links AS (
+    DELETE FROM "sharinglink"
+    WHERE "organization_id" = $2 AND "item_id" IN (SELECT "id" FROM subtree)
+    RETURNING "id"
+)
+, deleted_items AS (
+    DELETE FROM "item"
+    WHERE "organization_id" = $2 AND "id" IN (SELECT "id" FROM subtree)
+    RETURNING "id"
+)
+, tombstones AS (
+    INSERT INTO "tombstone" (
+        "create_time", "update_time", "organization_id", "kind", "object_id"
+    )
+    SELECT now(), now(), $2::bigint, 'item', "id" FROM deleted_items
+    UNION ALL
+    SELECT now(), now(), $2::bigint, 'sharing_link', "id" FROM deleted_links
+)
+SELECT
+    (SELECT count(*) FROM deleted_items) AS "items",
+    (SELECT count(*) FROM deleted_links) AS "sharing_links"
+"""
+
+
+async def is_descendant(organization_id: int, item_id: int, other_id: int) -> bool:
+    """Whether `other_id` is `item_id` itself or lies in its subtree."""
+    _, rows = await shard_db().execute_query(
+        IS_DESCENDANT_SQL, [item_id, other_id, organization_id]
+    )
+    return bool(rows[0]["is_descendant"])
+
+
+async def move_subtree(item: Item, owner_id: int, parent_id: int | None) -> None:
+    """
+    Move an item under `parent_id` (top level if `None`) of `owner_id`.
+
+    A move within the same owner only rewrites the moved item; a move to another
+    owner rewrites the whole subtree in one statement.
+    """
+    same_owner = item.owner_id == owner_id  # type: ignore[attr-defined]
+    sql = MOVE_ITEM_SQL if same_owner else MOVE_SUBTREE_SQL
+    organization_id = item.organization_id  # type: ignore[attr-defined]
+    await shard_db().execute_query(sql, [item.id, owner_id, parent_id, organization_id])
+
+
+async def delete_subtree(item_id: int, organization_id: int) -> tuple[int, int]:
+    """
+    Delete an item, its descendants and their sharing links in one statement,
+    leaving tombstones for all of them.
+
+    Returns the numbers of deleted items and sharing links.
+    """
+    _, rows = await shard_db().execute_query(
+        DELETE_SUBTREE_SQL, [item_id, organization_id]
+    )
+    return rows[0]["items"], rows[0]["sharing_links"]
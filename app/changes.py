@@ -0,0 +1,142 @@
+"""
+Change tracking helpers shared by the change feed and code that modifies objects.
+
+Besides tombstones for the change feed, modifications are announced with Postgres
+`NOTIFY`. Each process holds a single `LISTEN` connection in `change_hub`, which fans
+the notifications out to its in-process subscribers (e.g. Server-Sent Events clients).
+
+Change times are taken when a row is written, not when it commits, so a change can
+become visible after later ones. The feed therefore stops at `feed_horizon()`, before
+the transactions still running.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, suppress
+from datetime import datetime
+from typing import Any
+
+import asyncpg  # type: ignore[import-untyped]
+from loguru import logger
+
+from . import settings
+from .models import Tombstone
+from .sharding import shard_db
+
+Kind = Tombstone.Kind
+
+# Transactions of other clients count, whether they wrote anything yet or not: one
+# that only read so far may still write rows stamped with its start time. Reading
+# their start needs the same role as theirs, or `pg_read_all_stats`.
+HORIZON_SQL = """
+SELECT least(min(xact_start), clock_timestamp()) - make_interval(secs => $1)
+    AS "horizon"
+FROM pg_stat_activity
+WHERE datname = current_database()
+    AND backend_type = 'client backend'
+    AND pid <> pg_backend_pid()
+"""
+
+
+async def feed_horizon() -> datetime:
+    """
+    Return the time before which every change of the current shard is visible: the
+    start of its oldest running transaction, or now, less `CHANGES.safety_lag_seconds`.
+
+    Changes are stamped at, or just before, the start of their transaction, so none
+    stamped before this time can commit later on.
+    """
+    _, rows = await shard_db().execute_query(
+        HORIZON_SQL, [settings.CHANGES.safety_lag_seconds]
+    )
+    horizon: datetime = rows[0]["horizon"]
+    return horizon
+
+
+async def notify_changes(kind: Kind, organization_ids: Iterable[int]) -> None:
+    """
+    Announce that objects of `kind` changed in the given organizations.
+
+    Notifications are delivered when the surrounding transaction commits.
+    """
+    payloads = [
+        json.dumps({"organization_id": organization_id, "kind": kind})
+        for organization_id in set(organization_ids)
+    ]
+    if payloads:
+        await shard_db().execute_query(
+            "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload",
+            [settings.CHANGES.channel, payloads],
+        )
+
+
+async def record_deletions(kind: Kind, objects: Iterable[tuple[int, int]]) -> None:
+    """
+    Leave tombstones for deleted objects, given as `(organization_id, object_id)`
+    pairs, so that change feed clients learn about the deletions.
+    """
+    objects = list(objects)
+    await Tombstone.bulk_create(
+        [
+            Tombstone(organization_id=organization_id, kind=kind, object_id=object_id)
+            for organization_id, object_id in objects
+        ]
+    )
+    await notify_changes(kind, (organization_id for organization_id, _ in objects))
+
+
+class ChangeHub:
+    """
+    Fan change notifications out from one `LISTEN` connection to many subscribers.
+
+    A notification only tells a subscriber that something changed; the change feed
+    tells it what. Notifications for a subscriber whose queue is full are therefore
+    dropped instead of buffered.
+    """
+
+    def __init__(self) -> None:
+        self.subscribers: defaultdict[int, set[asyncio.Queue[Kind]]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, organization_id: int) -> Iterator[asyncio.Queue[Kind]]:
+        queue: asyncio.Queue[Kind] = asyncio.Queue(settings.CHANGES.queue_size)
+        subscribers = self.subscribers[organization_id]
+        subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.subscribers[organization_id]
+
+    def dispatch(self, connection: Any, pid: int, channel: str, payload: str) -> None:  # noqa: ARG002
+        data = json.loads(payload)
+        for queue in self.subscribers.get(data["organization_id"], ()):
+            with suppress(asyncio.QueueFull):
+                queue.put_nowait(Kind(data["kind"]))
+
+    async def listen(self, dsn: str) -> None:
+        """Hold the `LISTEN` connection forever, reconnecting whenever it is lost."""
+        while True:
+            try:
+                await self.listen_once(dsn)
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("Change notification connection failed.")
+            await asyncio.sleep(settings.CHANGES.reconnect_seconds)
+
+    async def listen_once(self, dsn: str) -> None:
+        """Dispatch notifications until the connection is lost."""
+        terminated = asyncio.Event()
+        connection = await asyncpg.connect(dsn)
+        try:
+            connection.add_termination_listener(lambda _: terminated.set())
+            await connection.add_listener(settings.CHANGES.channel, self.dispatch)
+            await terminated.wait()
+            logger.warning("Lost the change notification connection.")
+        finally:
+            await connection.close()
+
+
+change_hub = ChangeHub()
@@ -0,0 +1,91 @@
+"""
+Tortoise engine for Postgres: the asyncpg client, instrumented for `app.metrics` and
+`app.queries`.
+
+Every connection of `TORTOISE_ORM` uses it as its `engine`.
+"""
+
+import time
+from typing import Any, cast
+
+import asyncpg  # type: ignore[import-untyped]
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+from tortoise.backends.base.client import (
+    NestedTransactionContext,
+    TransactionContext,
+    TransactionContextPooled,
+)
+
+from .metrics import metrics
+from .queries import timed
+
+
+class TimedPool:
+    """Wrap an asyncpg pool to time how long acquiring a connection waits."""
+
+    def __init__(self, pool: Any, name: str) -> None:
+        self.pool = pool
+        self.name = name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
+
+    async def acquire(self, *, timeout: float | None = None) -> Any:
+        start = time.perf_counter()
+        connection = await self.pool.acquire(timeout=timeout)
+        metrics.pool_wait(self.name).observe(time.perf_counter() - start)
+        return connection
+
+
+class Client(AsyncpgDBClient):
+    # Tortoise and asyncpg leave no other way to see into the pool; both the client
+    # and transactions acquire connections from it directly.
+    async def create_pool(self, **kwargs: Any) -> Any:
+        pool = await super().create_pool(**kwargs)
+        metrics.pools[self.connection_name] = pool
+        return TimedPool(pool, self.connection_name)
+
+    def _in_transaction(self) -> TransactionContext[Any]:
+        return TransactionContextPooled(Transaction(self), self._pool_init_lock)
+
+    async def execute_insert(self, query: str, values: list[Any]) -> asyncpg.Record:
+        with timed(query):
+            return await super().execute_insert(query, values)
+
+    async def execute_many(self, query: str, values: list[Any]) -> None:
+        with timed(query):
+            await super().execute_many(query, values)
+
+    async def execute_query(
+        self,
+        query: str,
+        values: list[Any] | None = None,
+    ) -> tuple[int, list[dict[str, Any]]]:
+        with timed(query):
+            return cast(
+                tuple[int, list[dict[str, Any]]],
+                await super().execute_query(query, values),
+            )
+
+    async def execute_query_dict(
+        self,
+        query: str,
+        values: list[Any] | None = None,
+    ) -> list[dict[str, Any]]:
+        with timed(query):
+            return cast(
+                list[dict[str, Any]],
+                await super().execute_query_dict(query, values),
+            )
+
+    async def execute_script(self, query: str) -> None:
+        with timed(query):
+            await super().execute_script(query)
+
+
+class Transaction(Client, TransactionWrapper):
+    def _in_transaction(self) -> TransactionContext[Any]:
+        return NestedTransactionContext(Transaction(self))
+
+
+client_class = Client
@@ -0,0 +1,92 @@
+"""
+Fault injection, to see how the service and its clients cope with failures.
+
+Configured in `FAULTS`, a share of requests is:
+
+- failed with a simulated 500, at `error_rate` or, for requests to the routes in
+  `route_error_rates` (by path, e.g. `/users/{user_id}`), at the route's rate;
+- delayed by a random latency, drawn from `latency_distribution` around
+  `latency_mean_seconds`;
+- slowed down by the database: a connection of the default shard is held busy with
+  a query taking `slow_db_seconds` before the request is handled, taking up the pool
+  and a database backend like a slow query would.
+
+With every rate at zero, requests pass straight through.
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from functools import cache
+from re import Pattern
+
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+from tortoise.connection import connections
+
+from . import settings
+from .sharding import DEFAULT_SHARD
+
+
+@dataclass
+class FaultStats:
+    errors: int = 0
+    delays: int = 0
+    slow_db: int = 0
+
+
+fault_stats = FaultStats()
+
+
+@cache
+def route_pattern(path: str) -> Pattern[str]:
+    return compile_path(path)[0]
+
+
+def error_rate(path: str) -> float:
+    for route, rate in settings.FAULTS.route_error_rates.items():
+        if route_pattern(route).match(path):
+            return rate
+    return settings.FAULTS.error_rate
+
+
+def latency() -> float:
+    """Draw a latency to inject from `FAULTS.latency_distribution`."""
+    mean = settings.FAULTS.latency_mean_seconds
+    if settings.FAULTS.latency_distribution == "fixed":
+        return mean
+    if settings.FAULTS.latency_distribution == "uniform":
+        return random.uniform(0, 2 * mean)  # noqa: S311
+    return random.expovariate(1 / mean)
+
+
+class FaultInjectionMiddleware:
+    """Inject the faults configured in `FAULTS` into requests."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        faults = settings.FAULTS
+        if scope["type"] != "http" or not faults.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        if faults.slow_db_rate and random.random() < faults.slow_db_rate:  # noqa: S311
+            fault_stats.slow_db += 1
+            async with connections.get(DEFAULT_SHARD).acquire_connection() as db:
+                await db.execute("SELECT pg_sleep($1)", faults.slow_db_seconds)
+        if faults.latency_rate and random.random() < faults.latency_rate:  # noqa: S311
+            fault_stats.delays += 1
+            await asyncio.sleep(latency())
+        if random.random() < error_rate(scope["path"]):  # noqa: S311
+            fault_stats.errors += 1
+            response = JSONResponse(
+                content="This is a simulated error. Please try again.",
+                status_code=500,
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
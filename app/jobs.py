@@ -0,0 +1,164 @@
+"""
+Background jobs that run for the lifetime of the application.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from loguru import logger
+
+from . import settings
+from .access_stats import sharing_link_access
+from .changes import record_deletions
+from .loop_monitor import Watchdog, loop_lag
+from .models import SharingLink, Tombstone
+from .rate_limits import rate_limiter
+from .sharding import (
+    in_shard_transaction,
+    shard_replicas,
+    shard_settings,
+    using_shard,
+)
+
+
+@dataclass
+class PurgeStats:
+    """Progress counters of the expired sharing link purge job."""
+
+    batches: int = 0
+    purged: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+
+
+purge_stats = PurgeStats()
+
+
+async def purge_expired_sharing_links(batch_size: int) -> int:
+    """
+    Delete up to `batch_size` expired sharing links of the current shard in a short
+    transaction.
+
+    Rows already locked by a concurrent purge are skipped rather than waited on, so
+    several workers can run the job side by side.
+
+    Returns the number of deleted links.
+    """
+    async with in_shard_transaction():
+        links = (
+            await SharingLink.filter(expire_time__lte=datetime.now(tz=UTC))
+            .order_by("expire_time")
+            .limit(batch_size)
+            .select_for_update(skip_locked=True)
+            .only("id")
+        )
+        if not links:
+            return 0
+
+        query = SharingLink.filter(id__in=[link.id for link in links])
+        await record_deletions(
+            Tombstone.Kind.SHARING_LINK,
+            await query.values_list("organization_id", "id"),
+        )
+        return await query.delete()
+
+
+async def sweep_expired_sharing_links() -> None:
+    """
+    Purge expired sharing links of the current shard until they run out, one bounded
+    batch at a time.
+
+    Batches are separated by `PURGE.batch_interval_seconds` to cap lock duration and
+    WAL volume.
+    """
+    purge_settings = settings.PURGE
+    sweep_start = time.perf_counter()
+    sweep_purged = 0
+    while True:
+        batch_start = time.perf_counter()
+        try:
+            purged = await purge_expired_sharing_links(purge_settings.batch_size)
+        except Exception:
+            purge_stats.failures += 1
+            logger.exception("Failed to purge expired sharing links.")
+            break
+        purge_stats.batches += 1
+        purge_stats.purged += purged
+        purge_stats.seconds += time.perf_counter() - batch_start
+        sweep_purged += purged
+        if purged < purge_settings.batch_size:
+            break
+        await asyncio.sleep(purge_settings.batch_interval_seconds)
+
+    if sweep_purged:
+        elapsed = time.perf_counter() - sweep_start
+        logger.info(
+            f"Purged {sweep_purged} expired sharing links in {elapsed:.2f}s "
+            f"({sweep_purged / elapsed:.0f} links/s, {purge_stats.purged} total)."
+        )
+
+
+async def run_purge_job() -> None:
+    """
+    Sweep expired sharing links of every shard forever. After each round, the job
+    idles for `PURGE.idle_interval_seconds`.
+    """
+    while True:
+        for shard in shard_settings():
+            with using_shard(shard):
+                await sweep_expired_sharing_links()
+        await asyncio.sleep(settings.PURGE.idle_interval_seconds)
+
+
+async def run_access_flush_job() -> None:
+    """Flush sharing link access counters periodically."""
+    while True:
+        await asyncio.sleep(settings.ACCESS_STATS.flush_interval_seconds)
+        try:
+            await sharing_link_access.flush()
+        except Exception:
+            logger.exception("Failed to flush sharing link access counters.")
+
+
+async def run_replica_lag_job() -> None:
+    """Check the replication lag of every replica periodically."""
+    while True:
+        for shard in shard_settings():
+            await shard_replicas(shard).check_lag()
+        await asyncio.sleep(settings.REPLICAS.lag_check_interval_seconds)
+
+
+async def run_rate_limit_cleanup_job() -> None:
+    """Drop full rate limit buckets periodically."""
+    while True:
+        await asyncio.sleep(settings.RATE_LIMITS.cleanup_interval_seconds)
+        try:
+            await rate_limiter.cleanup()
+        except Exception:
+            logger.exception("Failed to clean up rate limit buckets.")
+
+
+async def run_loop_monitor_job() -> None:
+    """
+    Measure the lag of the event loop periodically, and with `LOOP_MONITOR.debug`,
+    watch for anything blocking it.
+    """
+    monitor = settings.LOOP_MONITOR
+    interval = monitor.interval_seconds
+    loop_lag.resize(max(1, round(monitor.window_seconds / interval)))
+    watchdog = None
+    if monitor.debug:
+        watchdog = Watchdog(interval, monitor.blocking_threshold_seconds)
+        watchdog.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+            if watchdog is not None:
+                watchdog.beat()
+    finally:
+        if watchdog is not None:
+            watchdog.stop()
@@ -0,0 +1,102 @@
+"""
+Monitoring of the event loop: how late it runs callbacks, and what blocks it.
+
+A background job (see `app.jobs`) sleeps for `LOOP_MONITOR.interval_seconds` over
+and over, and measures how late it wakes up: the lag that every callback ready at the
+time had to wait for as well. The lags of the last `LOOP_MONITOR.window_seconds` are
+reported as percentiles in `app.metrics`.
+
+With `LOOP_MONITOR.debug`, a watchdog thread also logs, with the stack trace of the
+code running at the time, every time the loop doesn't get to the job for longer than
+`LOOP_MONITOR.blocking_threshold_seconds`: CPU-heavy or sync code that blocks the
+loop, which belongs in a thread.
+"""
+
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+
+from loguru import logger
+
+
+@dataclass
+class LoopStats:
+    # Times the loop was reported blocked.
+    blocked: int = 0
+
+
+loop_stats = LoopStats()
+
+
+class LoopLag:
+    """Recent lags of the event loop, in seconds."""
+
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=1)
+        self.count = 0
+        self.sum = 0.0
+
+    def resize(self, size: int) -> None:
+        """Keep the last `size` lags."""
+        self.samples = deque(self.samples, maxlen=size)
+
+    def observe(self, lag: float) -> None:
+        self.samples.append(lag)
+        self.count += 1
+        self.sum += lag
+
+    def percentile(self, q: float) -> float:
+        """The lag of the recent ones that `q` of them are at most (nearest rank)."""
+        if not self.samples:
+            return 0
+        samples = sorted(self.samples)
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+
+loop_lag = LoopLag()
+
+
+class Watchdog(threading.Thread):
+    """
+    Log the stack of the event loop's thread whenever it doesn't `beat` for longer
+    than `interval` and `threshold` seconds, once per stall.
+    """
+
+    def __init__(self, interval: float, threshold: float) -> None:
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.loop_thread_id = threading.get_ident()
+        self.interval = interval
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.reported = False
+        self.stopped = threading.Event()
+
+    def beat(self) -> None:
+        self.last_beat = time.monotonic()
+        self.reported = False
+
+    def check(self) -> None:
+        blocked = time.monotonic() - self.last_beat - self.interval
+        if blocked <= self.threshold or self.reported:
+            return
+        self.reported = True
+        loop_stats.blocked += 1
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        logger.warning(
+            "The event loop has been blocked for {:.3f}s, running:\n{}",
+            blocked,
+            stack,
+        )
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.threshold / 2):
+            self.check()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
@@ -1,28 +1,87 @@
-import random
-from collections.abc import Callable
-from typing import Any
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
-from tortoise.contrib.fastapi import register_tortoise
+from tortoise import Tortoise
 
-from . import auth, settings
-from .routers import items, misc, organizations, users
+from . import auth, jobs, settings, warmup
+from .access_log import AccessLogMiddleware, access_log, configure_sinks
+from .access_stats import sharing_link_access
+from .changes import change_hub
+from .faults import FaultInjectionMiddleware
+from .memory import MemoryMiddleware
+from .metrics import MetricsMiddleware, metrics
+from .migrations import migrate_all
+from .profiling import ProfilingMiddleware
+from .queries import QueryCountMiddleware
+from .replicas import ReplicaReadsMiddleware
+from .routers import changes, imports, items, misc, organizations, users
+from .sharding import shard_settings
+from .threadpool import configure_threadpool
+from .timing import ServerTimingMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:  # noqa: ARG001
+    configure_threadpool()
+    access_log.start()
+    if not settings.TESTING:  # pragma: no cover
+        configure_sinks()
+        await Tortoise.init(config=settings.TORTOISE_ORM)
+        if settings.MIGRATIONS.run_on_startup:
+            await migrate_all()
+    await warmup.warm_up()
+
+    tasks = [
+        asyncio.create_task(jobs.run_access_flush_job()),
+        asyncio.create_task(jobs.run_loop_monitor_job()),
+        # Changes are announced in the shard they happen in.
+        *(
+            asyncio.create_task(change_hub.listen(shard.dsn))
+            for shard in shard_settings().values()
+        ),
+    ]
+    if settings.PURGE.enabled:
+        tasks.append(asyncio.create_task(jobs.run_purge_job()))
+    if settings.RATE_LIMITS.enabled:
+        tasks.append(asyncio.create_task(jobs.run_rate_limit_cleanup_job()))
+    if any(shard.replicas for shard in shard_settings().values()):
+        tasks.append(asyncio.create_task(jobs.run_replica_lag_job()))
+
+    yield
+
+    warmup.readiness.ready = False
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    await sharing_link_access.flush()
+    access_log.stop()
+    if not settings.TESTING:  # pragma: no cover
+        await Tortoise.close_connections()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReplicaReadsMiddleware)
+app.add_middleware(FaultInjectionMiddleware)
+app.add_middleware(QueryCountMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MemoryMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AccessLogMiddleware)
+# Outermost, to measure requests all the way through.
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(misc.router)
 app.include_router(auth.router)
 app.include_router(organizations.router)
 app.include_router(users.router)
 app.include_router(items.router)
-
-if not settings.TESTING:  # pragma: no cover
-    register_tortoise(
-        app,
-        config=settings.TORTOISE_ORM,
-        generate_schemas=True,
-    )
+app.include_router(imports.router)
+app.include_router(changes.router)
 
 
 @app.exception_handler(auth.OAuthException)
@@ -30,24 +89,8 @@ async def oauth_exception_handler(
     request: Request,  # noqa: ARG001
     exc: auth.OAuthException,
 ) -> JSONResponse:
+    metrics.auth_failure(exc.error)
     return JSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content={"error": exc.error},
     )
-
-
-@app.middleware("http")
-async def random_error(request: Request, call_next: Callable[..., Any]) -> Any:
-    """Middleware that simulates random 500 Internal Server Errors.
-
-    With probability settings.RANDOM_ERROR_RATE, this middleware
-    will raise an HTTPException with status 500 instead of calling
-    the downstream handler.
-    """
-    if random.random() < settings.RANDOM_ERROR_RATE:  # noqa: S311
-        return JSONResponse(
-            content="This is a simulated error. Please try again.",
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
-
-    return await call_next(request)
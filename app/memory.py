@@ -0,0 +1,122 @@
+"""
+On-demand tracing of memory allocations, to find what grows a process.
+
+With `MEMORY_PROFILING.enabled`, clients sending `MEMORY_PROFILING.token` in the
+`Memory-Profiling-Token` header can start and stop tracing allocations with
+`tracemalloc` (see `app.routers.misc`). While tracing, they can get the lines that
+allocated the most memory still in use, and the peak memory of the requests of each
+route.
+
+The peak of a request is the most memory traced at any time while it ran, over what
+was traced at its start. Requests running at the same time add to each other's peaks,
+which are exact only for requests sent one at a time.
+
+Tracing slows every allocation down, several times over, so it is meant to be
+started for a while, then stopped.
+"""
+
+import tracemalloc
+from dataclasses import dataclass
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .metrics import UNMATCHED
+
+TOKEN_HEADER = "Memory-Profiling-Token"  # noqa: S105
+
+# Allocations of tracing and of importing modules, left out of the top sites.
+IGNORED = [
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<frozen importlib.*>"),
+    tracemalloc.Filter(inclusive=False, filename_pattern="<unknown>"),
+]
+
+
+@dataclass
+class RoutePeaks:
+    requests: int = 0
+    max_bytes: int = 0
+    total_bytes: int = 0
+
+
+@dataclass
+class AllocationSite:
+    # File and line.
+    site: str
+    size_bytes: int
+    count: int
+
+
+class MemoryTracer:
+    def __init__(self) -> None:
+        self.routes: dict[tuple[str, str], RoutePeaks] = {}
+        # Requests being measured.
+        self.in_flight = 0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Start tracing, forgetting the peaks of the last time."""
+        self.routes = {}
+        tracemalloc.start()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    def observe(self, method: str, route: str, peak: int) -> None:
+        key = (method, route)
+        if key not in self.routes:
+            self.routes[key] = RoutePeaks()
+        peaks = self.routes[key]
+        peaks.requests += 1
+        peaks.max_bytes = max(peaks.max_bytes, peak)
+        peaks.total_bytes += peak
+
+    def top(self, limit: int) -> list[AllocationSite]:
+        """The `limit` lines that allocated the most memory still in use."""
+        if not self.tracing:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+        return [
+            AllocationSite(
+                site=str(stat.traceback), size_bytes=stat.size, count=stat.count
+            )
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+
+
+memory_tracer = MemoryTracer()
+
+
+class MemoryMiddleware:
+    """Measure the peak memory of requests, while tracing."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not memory_tracer.tracing:
+            await self.app(scope, receive, send)
+            return
+
+        # The peak so far is that of requests done, unless others are running.
+        if memory_tracer.in_flight == 0:
+            tracemalloc.reset_peak()
+        memory_tracer.in_flight += 1
+        start, _ = tracemalloc.get_traced_memory()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            memory_tracer.in_flight -= 1
+            # Unless tracing was stopped meanwhile.
+            if memory_tracer.tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                # Set by the router once it matched a route.
+                route = scope.get("route")
+                memory_tracer.observe(
+                    scope["method"],
+                    route.path if route is not None else UNMATCHED,
+                    max(0, peak - start),
+                )
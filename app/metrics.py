@@ -0,0 +1,251 @@
+"""
+Service metrics in the Prometheus text format, served at `/metrics`.
+
+Requests are measured by `MetricsMiddleware`, a pure ASGI middleware, into counters
+and histograms kept per route, created on the first request to the route and only
+incremented afterwards. Everything else is read when the metrics are rendered.
+
+Metrics are kept per process.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from dataclasses import asdict
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .admission import admission
+from .faults import fault_stats
+from .jobs import purge_stats
+from .loop_monitor import loop_lag, loop_stats
+
+# Upper bounds of the histogram buckets, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The route of requests that didn't match any.
+UNMATCHED = "<unmatched>"
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def sample(name: str, labels: dict[str, str], value: float) -> str:
+    return f"{name}{format_labels(labels) if labels else ''} {value}"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self) -> None:
+        # The last bucket is +Inf.
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: dict[str, str]) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip([*BUCKETS, "+Inf"], self.counts, strict=True):
+            cumulative += count
+            yield sample(f"{name}_bucket", {**labels, "le": str(bound)}, cumulative)
+        yield sample(f"{name}_sum", labels, self.sum)
+        yield sample(f"{name}_count", labels, cumulative)
+
+
+class RouteMetrics:
+    __slots__ = ("db_queries", "db_seconds", "duration", "statuses")
+
+    def __init__(self) -> None:
+        self.statuses: dict[int, int] = {}
+        self.duration = Histogram()
+        # Database queries run by the requests, and the time they took (see
+        # `app.queries`).
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        # The pools of database connections, by connection name (see `app.db`).
+        self.pools: dict[str, Any] = {}
+        self.pool_waits: dict[str, Histogram] = {}
+        self.auth_failures: dict[str, int] = {}
+        # Access log records by outcome: written, dropped or sampled out (see
+        # `app.access_log`). Written records are counted by the log's writer thread,
+        # hence the lock.
+        self.access_log_records: dict[str, int] = {}
+        self.access_log_lock = threading.Lock()
+
+    def route(self, method: str, route: str) -> RouteMetrics:
+        key = (method, route)
+        if key not in self.routes:
+            self.routes[key] = RouteMetrics()
+        return self.routes[key]
+
+    def observe_request(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+    ) -> None:
+        route_metrics = self.route(method, route)
+        route_metrics.statuses[status] = route_metrics.statuses.get(status, 0) + 1
+        route_metrics.duration.observe(seconds)
+
+    def observe_queries(
+        self,
+        method: str,
+        route: str,
+        count: int,
+        seconds: float,
+    ) -> None:
+        route_metrics = self.route(method, route)
+        route_metrics.db_queries += count
+        route_metrics.db_seconds += seconds
+
+    def pool_wait(self, connection: str) -> Histogram:
+        if connection not in self.pool_waits:
+            self.pool_waits[connection] = Histogram()
+        return self.pool_waits[connection]
+
+    def auth_failure(self, reason: str) -> None:
+        self.auth_failures[reason] = self.auth_failures.get(reason, 0) + 1
+
+    def access_log_record(self, outcome: str) -> None:
+        with self.access_log_lock:
+            records = self.access_log_records
+            records[outcome] = records.get(outcome, 0) + 1
+
+    def render(self) -> str:
+        return "".join(f"{line}\n" for line in self.lines())
+
+    def lines(self) -> Iterator[str]:
+        yield "# TYPE http_requests_total counter"
+        for (method, route), route_metrics in self.routes.items():
+            for code, count in route_metrics.statuses.items():
+                labels = {"method": method, "route": route, "status": str(code)}
+                yield sample("http_requests_total", labels, count)
+        yield "# TYPE http_request_duration_seconds histogram"
+        for (method, route), route_metrics in self.routes.items():
+            yield from route_metrics.duration.lines(
+                "http_request_duration_seconds", {"method": method, "route": route}
+            )
+        yield "# TYPE http_request_db_queries_total counter"
+        for (method, route), route_metrics in self.routes.items():
+            labels = {"method": method, "route": route}
+            yield sample(
+                "http_request_db_queries_total", labels, route_metrics.db_queries
+            )
+        yield "# TYPE http_request_db_seconds_total counter"
+        for (method, route), route_metrics in self.routes.items():
+            labels = {"method": method, "route": route}
+            yield sample(
+                "http_request_db_seconds_total", labels, route_metrics.db_seconds
+            )
+        yield "# TYPE http_requests_in_flight gauge"
+        yield sample("http_requests_in_flight", {}, self.in_flight)
+
+        yield "# TYPE event_loop_lag_seconds summary"
+        for q in ("0.5", "0.9", "0.99", "1"):
+            lag = loop_lag.percentile(float(q))
+            yield sample("event_loop_lag_seconds", {"quantile": q}, lag)
+        yield sample("event_loop_lag_seconds_sum", {}, loop_lag.sum)
+        yield sample("event_loop_lag_seconds_count", {}, loop_lag.count)
+        yield "# TYPE event_loop_blocked_total counter"
+        yield sample("event_loop_blocked_total", {}, loop_stats.blocked)
+
+        yield "# TYPE db_pool_connections gauge"
+        for name, pool in self.pools.items():
+            idle = pool.get_idle_size()
+            busy = pool.get_size() - idle
+            for state, count in [("idle", idle), ("busy", busy)]:
+                labels = {"connection": name, "state": state}
+                yield sample("db_pool_connections", labels, count)
+        yield "# TYPE db_pool_wait_seconds histogram"
+        for name, histogram in self.pool_waits.items():
+            yield from histogram.lines("db_pool_wait_seconds", {"connection": name})
+
+        yield "# TYPE auth_failures_total counter"
+        for reason, count in self.auth_failures.items():
+            yield sample("auth_failures_total", {"reason": reason}, count)
+
+        stats = admission.stats
+        yield "# TYPE admission_requests_total counter"
+        for outcome, count in [
+            ("admitted", stats.admitted),
+            ("queued", stats.queued),
+            ("rejected", stats.rejected),
+        ]:
+            yield sample("admission_requests_total", {"outcome": outcome}, count)
+        yield "# TYPE admission_queue_wait_seconds_total counter"
+        yield sample("admission_queue_wait_seconds_total", {}, stats.queue_wait_seconds)
+
+        yield "# TYPE access_log_records_total counter"
+        with self.access_log_lock:
+            access_log_records = list(self.access_log_records.items())
+        for outcome, count in access_log_records:
+            yield sample("access_log_records_total", {"outcome": outcome}, count)
+
+        yield "# TYPE faults_injected_total counter"
+        for fault, count in asdict(fault_stats).items():
+            yield sample("faults_injected_total", {"fault": fault}, count)
+
+        for name, value in [
+            ("batches", purge_stats.batches),
+            ("purged", purge_stats.purged),
+            ("failures", purge_stats.failures),
+            ("seconds", purge_stats.seconds),
+        ]:
+            yield f"# TYPE expired_links_purge_{name}_total counter"
+            yield sample(f"expired_links_purge_{name}_total", {}, value)
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """Count and time requests by route and status."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            metrics.in_flight -= 1
+            # Set by the router once it matched a route.
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"],
+                route.path if route is not None else UNMATCHED,
+                status,
+                time.perf_counter() - start,
+            )
@@ -0,0 +1,306 @@
+"""
+Versioned schema migrations.
+
+Migrations are applied in order, once per shard, by `scripts/migrate.py` (or at
+startup with `MIGRATIONS.run_on_startup`), and recorded in the `schemamigration`
+table. Replicas get them through replication.
+
+A migration runs in a transaction along with its record, unless it isn't `atomic`:
+then each statement commits on its own, as `CREATE INDEX CONCURRENTLY` requires, and
+the migration is only recorded once all of them succeeded. Since it may then be
+retried after failing halfway, its statements must be safe to run again, e.g.::
+
+    Migration(
+        "0002_item_name",
+        lambda: [
+            # Left invalid by an interrupted build.
+            'DROP INDEX CONCURRENTLY IF EXISTS "idx_item_name"',
+            'CREATE INDEX CONCURRENTLY "idx_item_name" ON "item" ("name")',
+        ],
+        atomic=False,
+    )
+
+Partitioned tables can't be indexed concurrently as a whole, only partition by
+partition.
+
+The initial migration is the schema as it was when migrations were introduced,
+frozen, skipping what exists so that it also adopts databases created before them.
+Its one input is `PARTITIONS.count`, which only applies when the tables are created.
+Later migrations describe changes only, written out rather than built from the
+models, so that every database replays the same history; changes to the models need
+one too.
+"""
+
+from collections.abc import Callable
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from loguru import logger
+from tortoise.connection import connections
+
+from . import settings
+from .sharding import shard_settings
+
+
+@dataclass(frozen=True)
+class Migration:
+    name: str
+    # Built when the migration runs.
+    statements: Callable[[], list[str]]
+    atomic: bool = True
+
+
+# The initial schema, frozen as Tortoise generated it from the models then. With
+# partitions, items, sharing links and their access counters are created partitioned
+# before it, which it then skips, and their foreign keys to other tables added after
+# it (see `app.schema`). Every statement skips what exists, so that the migration
+# also adopts databases created before migrations.
+INITIAL_PARTITIONED_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS "item" (
+    "id" BIGINT NOT NULL,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "name" VARCHAR(255) NOT NULL,
+    "type" VARCHAR(64) NOT NULL,
+    "file_size" BIGINT NOT NULL DEFAULT 0,
+    "organization_id" BIGINT NOT NULL,
+    "owner_id" BIGINT NOT NULL,
+    "parent_id" BIGINT,
+    PRIMARY KEY ("organization_id", "id"),
+    CONSTRAINT "uid_item_parent_name" UNIQUE ("organization_id", "parent_id", "name"),
+    FOREIGN KEY ("organization_id", "parent_id")
+        REFERENCES "item" ("organization_id", "id") ON DELETE CASCADE
+) PARTITION BY HASH ("organization_id");
+-- For lookups by primary key alone, e.g. when the ORM saves an object.
+CREATE INDEX IF NOT EXISTS "idx_item_id" ON "item" ("id");
+CREATE TABLE IF NOT EXISTS "sharinglink" (
+    "id" BIGSERIAL NOT NULL,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "token" UUID NOT NULL,
+    "permission" VARCHAR(64) NOT NULL,
+    "expire_time" TIMESTAMPTZ,
+    "organization_id" BIGINT NOT NULL,
+    "item_id" BIGINT NOT NULL,
+    PRIMARY KEY ("organization_id", "id"),
+    CONSTRAINT "uid_sharinglink_token" UNIQUE ("organization_id", "token"),
+    FOREIGN KEY ("organization_id", "item_id")
+        REFERENCES "item" ("organization_id", "id") ON DELETE CASCADE
+) PARTITION BY HASH ("organization_id");
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_id" ON "sharinglink" ("id");
+-- Resolving a link only knows its token, so it checks this index in every partition.
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_token" ON "sharinglink" ("token");
+CREATE TABLE IF NOT EXISTS "sharinglinkaccess" (
+    "access_count" BIGINT NOT NULL DEFAULT 0,
+    "last_access_time" TIMESTAMPTZ NOT NULL,
+    "organization_id" BIGINT NOT NULL,
+    "sharing_link_id" BIGINT NOT NULL PRIMARY KEY,
+    FOREIGN KEY ("organization_id", "sharing_link_id")
+        REFERENCES "sharinglink" ("organization_id", "id") ON DELETE CASCADE
+);
+"""
+
+INITIAL_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS "{table}_p{remainder}" PARTITION OF "{table}"
+    FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder});
+"""
+
+INITIAL_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS "organization" (
+    "id" BIGINT NOT NULL PRIMARY KEY,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "name" VARCHAR(255) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "tombstone" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "kind" VARCHAR(64) NOT NULL,
+    "object_id" BIGINT NOT NULL,
+    "organization_id" BIGINT NOT NULL REFERENCES "organization" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_tombstone_organiz_2ce10a"
+    ON "tombstone" ("organization_id", "update_time", "id");
+COMMENT ON COLUMN "tombstone"."kind"
+    IS 'ITEM: item\\nUSER: user\\nSHARING_LINK: sharing_link';
+CREATE TABLE IF NOT EXISTS "user" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "username" VARCHAR(255) NOT NULL,
+    "email" VARCHAR(255) NOT NULL,
+    "active" BOOL NOT NULL DEFAULT True,
+    "role" VARCHAR(64) NOT NULL DEFAULT 'regular',
+    "first_name" VARCHAR(255) NOT NULL DEFAULT '',
+    "last_name" VARCHAR(255) NOT NULL DEFAULT '',
+    "organization_id" BIGINT NOT NULL
+        REFERENCES "organization" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_user_organiz_d49a66" UNIQUE ("organization_id", "username"),
+    CONSTRAINT "uid_user_organiz_00c04b" UNIQUE ("organization_id", "email")
+);
+CREATE INDEX IF NOT EXISTS "idx_user_organiz_963c7f"
+    ON "user" ("organization_id", "update_time", "id");
+COMMENT ON COLUMN "user"."role" IS 'REGULAR: regular\\nADMIN: admin';
+CREATE TABLE IF NOT EXISTS "item" (
+    "id" BIGINT NOT NULL PRIMARY KEY,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "name" VARCHAR(255) NOT NULL,
+    "type" VARCHAR(64) NOT NULL,
+    "file_size" BIGINT NOT NULL DEFAULT 0,
+    "organization_id" BIGINT NOT NULL
+        REFERENCES "organization" ("id") ON DELETE CASCADE,
+    "owner_id" BIGINT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE,
+    "parent_id" BIGINT REFERENCES "item" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_item_parent__8daad1" UNIQUE ("parent_id", "name")
+);
+CREATE INDEX IF NOT EXISTS "idx_item_parent__9a59b1"
+    ON "item" ("parent_id", "owner_id");
+CREATE INDEX IF NOT EXISTS "idx_item_owner_i_41113c" ON "item" ("owner_id", "type");
+CREATE INDEX IF NOT EXISTS "idx_item_organiz_349efa"
+    ON "item" ("organization_id", "update_time", "id");
+COMMENT ON COLUMN "item"."type" IS 'FILE: file\\nFOLDER: folder';
+CREATE TABLE IF NOT EXISTS "sharinglink" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "token" UUID NOT NULL UNIQUE,
+    "permission" VARCHAR(64) NOT NULL,
+    "expire_time" TIMESTAMPTZ,
+    "item_id" BIGINT NOT NULL REFERENCES "item" ("id") ON DELETE CASCADE,
+    "organization_id" BIGINT NOT NULL REFERENCES "organization" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_organiz_de6207"
+    ON "sharinglink" ("organization_id", "update_time", "id");
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_item_id_1e7bc2"
+    ON "sharinglink" ("item_id", "id");
+CREATE INDEX IF NOT EXISTS "sharinglink_expire_time"
+    ON "sharinglink" ("expire_time") WHERE expire_time IS NOT NULL;
+COMMENT ON COLUMN "sharinglink"."permission" IS 'READ: read\\nWRITE: write';
+CREATE TABLE IF NOT EXISTS "sharinglinkaccess" (
+    "access_count" BIGINT NOT NULL DEFAULT 0,
+    "last_access_time" TIMESTAMPTZ NOT NULL,
+    "organization_id" BIGINT NOT NULL
+        REFERENCES "organization" ("id") ON DELETE CASCADE,
+    "sharing_link_id" BIGINT NOT NULL PRIMARY KEY
+        REFERENCES "sharinglink" ("id") ON DELETE CASCADE
+);
+"""
+
+INITIAL_FOREIGN_KEYS_SQL = """
+DO $$ BEGIN
+    ALTER TABLE "item" ADD CONSTRAINT "fk_item_organization_id"
+        FOREIGN KEY ("organization_id")
+            REFERENCES "organization" ("id") ON DELETE CASCADE;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    ALTER TABLE "item" ADD CONSTRAINT "fk_item_owner_id"
+        FOREIGN KEY ("owner_id") REFERENCES "user" ("id") ON DELETE CASCADE;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    ALTER TABLE "sharinglink" ADD CONSTRAINT "fk_sharinglink_organization_id"
+        FOREIGN KEY ("organization_id")
+            REFERENCES "organization" ("id") ON DELETE CASCADE;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+    ALTER TABLE "sharinglinkaccess"
+        ADD CONSTRAINT "fk_sharinglinkaccess_organization_id"
+            FOREIGN KEY ("organization_id")
+            REFERENCES "organization" ("id") ON DELETE CASCADE;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+"""
+
+
+def initial_schema_sql(partitions: int) -> str:
+    """
+    Return the SQL of the initial schema, partitioning items and sharing links into
+    `partitions` hash partitions (0 for plain tables).
+    """
+    if not partitions:
+        return INITIAL_TABLES_SQL
+    partition_sql = "".join(
+        INITIAL_PARTITION_SQL.format(table=table, modulus=partitions, remainder=i)
+        for table in ("item", "sharinglink")
+        for i in range(partitions)
+    )
+    return (
+        INITIAL_PARTITIONED_TABLES_SQL
+        + partition_sql
+        + INITIAL_TABLES_SQL
+        + INITIAL_FOREIGN_KEYS_SQL
+    )
+
+
+MIGRATIONS = [
+    Migration(
+        "0001_initial",
+        lambda: [initial_schema_sql(settings.PARTITIONS.count)],
+    ),
+    Migration(
+        "0002_rate_limit_buckets",
+        lambda: [
+            """
+            CREATE TABLE IF NOT EXISTS "ratelimitbucket" (
+                "key" VARCHAR(255) NOT NULL PRIMARY KEY,
+                "rate" DOUBLE PRECISION NOT NULL,
+                "burst" DOUBLE PRECISION NOT NULL,
+                "tokens" DOUBLE PRECISION NOT NULL,
+                "update_time" TIMESTAMPTZ NOT NULL,
+                "allowed" BOOL NOT NULL
+            )
+            """
+        ],
+    ),
+]
+
+MIGRATION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS "schemamigration" (
+    "name" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "apply_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+APPLIED_SQL = 'SELECT "name" FROM "schemamigration"'
+
+RECORD_SQL = 'INSERT INTO "schemamigration" ("name") VALUES ($1)'
+
+# Held while migrating, so that concurrent runs apply each migration only once.
+LOCK_KEY = 0x5C07_1A4D
+
+
+async def migrate(shard: str, migrations: list[Migration] = MIGRATIONS) -> list[str]:
+    """Apply the pending migrations of a shard, returning their names."""
+    applied: list[str] = []
+    async with connections.get(shard).acquire_connection() as connection:
+        await connection.execute("SELECT pg_advisory_lock($1)", LOCK_KEY)
+        try:
+            await connection.execute(MIGRATION_TABLE_SQL)
+            done = {row["name"] for row in await connection.fetch(APPLIED_SQL)}
+            for migration in migrations:
+                if migration.name in done:
+                    continue
+                logger.info(f"Applying migration {migration.name} to {shard}.")
+                async with (
+                    connection.transaction() if migration.atomic else nullcontext()
+                ):
+                    for statement in migration.statements():
+                        await connection.execute(statement)
+                    await connection.execute(RECORD_SQL, migration.name)
+                applied.append(migration.name)
+        finally:
+            await connection.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+    return applied
+
+
+async def migrate_all() -> None:
+    """Apply the pending migrations of every shard."""
+    for shard in shard_settings():
+        await migrate(shard)
@@ -1,7 +1,21 @@
 from enum import StrEnum
+from typing import Any
 from uuid import uuid4
 
 from tortoise import fields, models
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.contrib.postgres.indexes import PostgreSQLIndex
+from tortoise.signals import pre_save
+
+from .ids import next_id
+
+
+class ConditionalIndex(PostgreSQLIndex):
+    """B-tree index restricted to the rows matching a raw SQL predicate."""
+
+    def __init__(self, *, fields: tuple[str, ...], name: str, where: str) -> None:
+        super().__init__(fields=fields, name=name)
+        self.extra = f" WHERE {where}"
 
 
 class BaseModel(models.Model):
@@ -13,10 +27,23 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class Organization(BaseModel):
+# IDs are generated by the application (see `app.ids`) rather than by a sequence, so
+# object graphs can be built with known IDs and inserted in bulk, and IDs are unique
+# across databases. They still grow with creation time.
+class SnowflakeModel(BaseModel):
+    id = fields.BigIntField(primary_key=True, generated=False, default=next_id)
+
+    class Meta:
+        abstract = True
+
+
+# Organizations are spread over shards (see `app.sharding`), so their IDs must not
+# come from a per-database sequence.
+class Organization(SnowflakeModel):
     name = fields.CharField(max_length=255)
 
     users: fields.ReverseRelation["User"]
+    tombstones: fields.ReverseRelation["Tombstone"]
 
     def __str__(self) -> str:
         return f"Organization: {self.name}"
@@ -46,16 +73,22 @@ class User(BaseModel):
             ("organization", "username"),
             ("organization", "email"),
         )
+        indexes = (("organization", "update_time", "id"),)
 
     def __str__(self) -> str:
         return f"User: {self.username}"
 
 
-class Item(BaseModel):
+class Item(SnowflakeModel):
     class Type(StrEnum):
         FILE = "file"
         FOLDER = "folder"
 
+    # Copied from the owner, so that items can be partitioned by organization.
+    organization: fields.ForeignKeyRelation[Organization] = fields.ForeignKeyField(
+        "models.Organization",
+        related_name=False,
+    )
     owner: fields.ForeignKeyRelation[User] = fields.ForeignKeyField(
         "models.User",
         related_name="items",
@@ -78,6 +111,7 @@ class Item(BaseModel):
         indexes = (
             ("parent", "owner"),
             ("owner", "type"),
+            ("organization", "update_time", "id"),
         )
 
     def __str__(self) -> str:
@@ -89,6 +123,11 @@ class SharingLink(BaseModel):
         READ = "read"
         WRITE = "write"
 
+    # Copied from the item, so that links can be partitioned by organization.
+    organization: fields.ForeignKeyRelation[Organization] = fields.ForeignKeyField(
+        "models.Organization",
+        related_name=False,
+    )
     item: fields.ForeignKeyRelation[Item] = fields.ForeignKeyField(
         "models.Item",
         related_name="sharing_links",
@@ -98,5 +137,105 @@ class SharingLink(BaseModel):
     permission = fields.CharEnumField(Permission, max_length=64)
     expire_time = fields.DatetimeField(null=True, default=None)
 
+    access: fields.BackwardOneToOneRelation["SharingLinkAccess"]
+
+    class Meta:
+        indexes = (
+            ("organization", "update_time", "id"),
+            # Links of an item in the order `paginate` walks them. Also backs the
+            # cascade from deleted items, which would otherwise scan the table once
+            # per deleted item.
+            ("item", "id"),
+            # Links that expire, in the order the purge job deletes them. Listing the
+            # active links of an item walks `(item, id)` instead, checking expiry
+            # row by row, which stays cheap as the purge keeps few expired links.
+            ConditionalIndex(
+                fields=("expire_time",),
+                name="sharinglink_expire_time",
+                where="expire_time IS NOT NULL",
+            ),
+        )
+
     def __str__(self) -> str:
         return f"Sharing Link: {self.token}"
+
+
+# Kept apart from `SharingLink` so that flushing access counters never rewrites the
+# link rows (nor bumps their `update_time`).
+class SharingLinkAccess(models.Model):
+    # Copied from the link, so that the link can be referenced when partitioned.
+    organization: fields.ForeignKeyRelation[Organization] = fields.ForeignKeyField(
+        "models.Organization",
+        related_name=False,
+    )
+    sharing_link: fields.OneToOneRelation[SharingLink] = fields.OneToOneField(
+        "models.SharingLink",
+        related_name="access",
+        primary_key=True,
+    )
+
+    access_count = fields.BigIntField(default=0)
+    last_access_time = fields.DatetimeField()
+
+    def __str__(self) -> str:
+        return f"Sharing Link Access: {self.access_count}"
+
+
+@pre_save(Item)
+async def set_item_organization(
+    sender: type[Item],  # noqa: ARG001
+    instance: Item,
+    using_db: BaseDBAsyncClient | None,  # noqa: ARG001
+    update_fields: Any,  # noqa: ARG001
+) -> None:
+    if instance.organization_id is None:  # type: ignore[attr-defined]
+        owner = await instance.owner
+        instance.organization_id = owner.organization_id  # type: ignore[attr-defined]
+
+
+@pre_save(SharingLink)
+async def set_sharing_link_organization(
+    sender: type[SharingLink],  # noqa: ARG001
+    instance: SharingLink,
+    using_db: BaseDBAsyncClient | None,  # noqa: ARG001
+    update_fields: Any,  # noqa: ARG001
+) -> None:
+    if instance.organization_id is None:  # type: ignore[attr-defined]
+        item = await instance.item
+        instance.organization_id = item.organization_id  # type: ignore[attr-defined]
+
+
+# Marks a deleted object so that the change feed can report the deletion.
+class Tombstone(BaseModel):
+    class Kind(StrEnum):
+        ITEM = "item"
+        USER = "user"
+        SHARING_LINK = "sharing_link"
+
+    organization: fields.ForeignKeyRelation[Organization] = fields.ForeignKeyField(
+        "models.Organization",
+        related_name="tombstones",
+    )
+
+    kind = fields.CharEnumField(Kind, max_length=64)
+    object_id = fields.BigIntField()
+
+    class Meta:
+        indexes = (("organization", "update_time", "id"),)
+
+    def __str__(self) -> str:
+        return f"Tombstone: {self.kind} {self.object_id}"
+
+
+# A token bucket of `app.rate_limits`, when they are shared by all processes.
+class RateLimitBucket(models.Model):
+    key = fields.CharField(max_length=255, primary_key=True)
+    rate = fields.FloatField()
+    burst = fields.FloatField()
+    tokens = fields.FloatField()
+    update_time = fields.DatetimeField()
+    # Whether the last request taken from the bucket was allowed.
+    allowed = fields.BooleanField()
+
+    def __str__(self) -> str:
+        return f"Rate Limit Bucket: {self.key}"
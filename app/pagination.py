@@ -2,13 +2,18 @@
 Pagination utilities for cursor-based paging of Tortoise ORM QuerySets.
 """
 
+import asyncio
+from itertools import chain
+from operator import attrgetter
 from typing import Annotated, Any, Generic, TypeVar
 
 from fastapi import Query
 from pydantic import BaseModel, Field
+from tortoise.connection import connections
 from tortoise.models import Model
 from tortoise.queryset import QuerySet
 
+from .sharding import read_connection, shard_settings
 from .types import Id
 
 T = TypeVar("T")
@@ -46,15 +51,57 @@ async def paginate(
     - **items**: list of fetched model instances.
     - **next_cursor**: the PK for the next page, or None if no further pages.
     """
+    items = await page_query(query, cursor, limit, pk_field)
+    return _page(items, limit, pk_field)
+
+
+async def paginate_shards(
+    query: QuerySet[ModelT],
+    cursor: Id | None = None,
+    limit: int = 10,
+    pk_field: str = "id",
+) -> Any:
+    """
+    Like `paginate`, but over the objects of `query` in every shard.
+
+    Each shard returns its own next page, and the pages are merged; primary keys must
+    therefore be unique across shards.
+    """
+    pages = await asyncio.gather(
+        *(
+            page_query(
+                query.using_db(connections.get(read_connection(shard))),
+                cursor,
+                limit,
+                pk_field,
+            )
+            for shard in shard_settings()
+        )
+    )
+    items = sorted(chain(*pages), key=attrgetter(pk_field), reverse=True)
+    return _page(items, limit, pk_field)
+
+
+def page_query(
+    query: QuerySet[ModelT],
+    cursor: Id | None,
+    limit: int,
+    pk_field: str,
+) -> QuerySet[ModelT]:
+    """
+    Return the query for the page of `query` at `cursor`, fetching one extra object
+    to tell whether another page follows.
+    """
     query = query.order_by(f"-{pk_field}")
     if cursor is not None:
         query = query.filter(**{f"{pk_field}__lte": cursor})
+    return query.limit(limit + 1)
 
-    items = await query.limit(limit + 1)
 
+def _page(items: list[ModelT], limit: int, pk_field: str) -> dict[str, Any]:
     next_cursor: str | None
     if len(items) > limit:
-        next_cursor = getattr(items[-1], pk_field)
+        next_cursor = getattr(items[limit], pk_field)
         items = items[:limit]
     else:
         next_cursor = None
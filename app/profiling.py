@@ -0,0 +1,124 @@
+"""
+On-demand profiling of single requests.
+
+With `PROFILING.enabled`, a request sending `PROFILING.token` in the `Profile-Token`
+header, or in the `profile_token` query parameter, is profiled by a sampling profiler
+until its response starts. The profile is written to `PROFILING.directory` as
+collapsed stacks, one line per stack with the number of times it was sampled, which
+flame graph tools (e.g. `flamegraph.pl`, speedscope) read. The response names the
+file in the `Profile` header.
+
+The profiler samples the stacks of every thread of the process, so the profile also
+shows whatever else the process was busy with, e.g. other requests on the event
+loop; threads that sit idle are left out. Only one request is profiled at a time.
+"""
+
+import asyncio
+import hmac
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import settings
+
+TOKEN_HEADER = "Profile-Token"  # noqa: S105
+TOKEN_PARAMETER = "profile_token"  # noqa: S105
+
+# Modules where threads wait for work.
+IDLE_MODULES = {"selectors", "threading", "queue"}
+
+
+def collapse(frame: FrameType) -> tuple[str, ...]:
+    """The stack of `frame`, outermost first."""
+    stack = []
+    current: FrameType | None = frame
+    while current is not None:
+        module = current.f_globals.get("__name__", "?")
+        stack.append(f"{module}:{current.f_code.co_qualname}")
+        current = current.f_back
+    return tuple(reversed(stack))
+
+
+class Sampler(threading.Thread):
+    """Sample the stacks of all other threads every `interval` seconds."""
+
+    def __init__(self, interval: float) -> None:
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                idle = frame.f_globals.get("__name__") in IDLE_MODULES
+                if thread_id == self.ident or idle:
+                    continue
+                thread = names.get(thread_id, str(thread_id))
+                self.stacks[(thread, *collapse(frame))] += 1
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.items()
+        )
+
+
+def is_profiled(scope: Scope) -> bool:
+    profiling = settings.PROFILING
+    if not profiling.enabled or not profiling.token:
+        return False
+    token = Headers(scope=scope).get(TOKEN_HEADER)
+    if token is None:
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        token = query.get(TOKEN_PARAMETER, [""])[0]
+    return hmac.compare_digest(token.encode(), profiling.token.encode())
+
+
+def write_profile(path: Path, profile: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profile)
+
+
+class ProfilingMiddleware:
+    """Profile the requests asking for it, one at a time."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.profiling or not is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}.collapsed"
+        sampler = Sampler(settings.PROFILING.interval_seconds)
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                sampler.stop()
+                MutableHeaders(scope=message).append("Profile", name)
+            await send(message)
+
+        self.profiling = True
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            sampler.stop()
+            self.profiling = False
+        path = Path(settings.PROFILING.directory) / name
+        await asyncio.to_thread(write_profile, path, sampler.collapsed())
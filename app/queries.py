@@ -0,0 +1,124 @@
+"""
+Accounting of the database queries run by each request.
+
+Every query run through Tortoise (see `app.db`) is counted, with the time it took, in
+the query logs open in its context. `QueryCountMiddleware` opens one per request, named
+after it, and reports it in `app.metrics` by route; other logs only count. Besides:
+
+- queries slower than `QUERIES.slow_query_seconds` are logged with their SQL;
+- a request running the same statement, up to its parameters, as many times as
+  `QUERIES.repeated_query_threshold` is logged as a likely N+1, once per statement.
+"""
+
+import re
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from loguru import logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import settings
+from .metrics import UNMATCHED, metrics
+
+# Parameters and literals, which don't make a statement differ.
+VALUE = re.compile(r"\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Lists of values, e.g. of `IN`, which only differ by their length.
+VALUES = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def statement(query: str) -> str:
+    """The statement of a query, with its values left out."""
+    return VALUES.sub("?", VALUE.sub("?", query))
+
+
+@dataclass
+class QueryLog:
+    # What ran the queries, to log its likely N+1 queries; none are looked for if
+    # empty.
+    name: str = ""
+    count: int = 0
+    seconds: float = 0
+    # Queries by statement, if counted.
+    statements: Counter[str] | None = None
+
+    def record(self, key: str | None, seconds: float) -> None:
+        """Count a query of the statement `key`, given if any open log needs it."""
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is None or key is None:
+            return
+        self.statements[key] += 1
+        if self.name and (
+            self.statements[key] == settings.QUERIES.repeated_query_threshold
+        ):
+            logger.warning(
+                "Possible N+1 query in {}, the same statement ran {} times: {}",
+                self.name,
+                self.statements[key],
+                key,
+            )
+
+
+# Query logs open in the current context, innermost last.
+query_logs: ContextVar[tuple[QueryLog, ...]] = ContextVar("query_logs", default=())
+
+
+@contextmanager
+def count_queries(name: str = "", *, statements: bool = False) -> Iterator[QueryLog]:
+    """
+    Count the queries run in the block, also in the logs already open, by statement
+    with `statements` or a `name`, which likely N+1 queries are logged with.
+    """
+    log = QueryLog(name, statements=Counter() if statements or name else None)
+    token = query_logs.set((*query_logs.get(), log))
+    try:
+        yield log
+    finally:
+        query_logs.reset(token)
+
+
+@contextmanager
+def timed(query: str) -> Iterator[None]:
+    """Count the query run in the block in the open logs."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if seconds >= settings.QUERIES.slow_query_seconds:
+            logger.warning("Slow query ({:.3f}s): {}", seconds, query)
+        logs = query_logs.get()
+        # Once for all the logs, and only if one counts statements.
+        key = None
+        if any(log.statements is not None for log in logs):
+            key = statement(query)
+        for log in logs:
+            log.record(key, seconds)
+
+
+class QueryCountMiddleware:
+    """Count the queries run by each request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries(f"{scope['method']} {scope['path']}") as log:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                route = scope.get("route")
+                metrics.observe_queries(
+                    scope["method"],
+                    route.path if route is not None else UNMATCHED,
+                    log.count,
+                    log.seconds,
+                )
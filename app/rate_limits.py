@@ -0,0 +1,191 @@
+"""
+Request rate limits per organization and per access token.
+
+Each organization and each token has a token bucket holding up to `burst` requests,
+refilled at `rate` requests per second. A request takes one from the bucket of its
+token, then from the one of its organization, and is rejected with a 429 when either
+is empty, so that a token over its limit doesn't use up its organization's.
+
+Buckets live in the memory of each process, or with `RATE_LIMITS.shared`, in the
+`ratelimitbucket` table of the default shard, where all processes share them. Full
+buckets are no different from missing ones, so a background job drops them.
+
+Responses carry the state of the emptiest bucket in `RateLimit-Limit`,
+`RateLimit-Remaining` and `RateLimit-Reset` (seconds until it is full again) headers,
+unless the endpoint returns a response of its own, e.g. a stream.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException, status
+from starlette.datastructures import MutableHeaders
+from tortoise.connection import connections
+
+from . import settings
+from .sharding import DEFAULT_SHARD
+
+# The tokens of a bucket when taking from it, refilled since it was last taken from.
+REFILLED = """LEAST(
+    EXCLUDED."burst",
+    "bucket"."tokens"
+    + extract(epoch FROM EXCLUDED."update_time" - "bucket"."update_time")
+    * EXCLUDED."rate"
+)"""
+
+# Refills and takes from a bucket in a single statement, so that concurrent processes
+# never both take the last request.
+TAKE_SQL = f"""
+INSERT INTO "ratelimitbucket" AS "bucket" (
+    "key", "rate", "burst", "tokens", "update_time", "allowed"
+)
+VALUES ($1, $2::float8, $3::float8, $3::float8 - 1, now(), TRUE)
+ON CONFLICT ("key") DO UPDATE SET
+    "rate" = EXCLUDED."rate",
+    "burst" = EXCLUDED."burst",
+    "tokens" = {REFILLED} - ({REFILLED} >= 1)::int,
+    "update_time" = EXCLUDED."update_time",
+    "allowed" = {REFILLED} >= 1
+RETURNING "tokens", "allowed"
+"""  # noqa: S608
+
+# Starts with `DELETE` for Tortoise to return the number of deleted rows.
+CLEANUP_SQL = """DELETE FROM "ratelimitbucket"
+WHERE "update_time" + make_interval(secs => ("burst" - "tokens") / "rate") <= now()
+"""
+
+
+@dataclass(slots=True)
+class Bucket:
+    rate: float
+    burst: float
+    tokens: float
+    update_time: float
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.update_time) * self.rate
+        )
+        self.update_time = now
+
+    def full_at(self) -> float:
+        return self.update_time + (self.burst - self.tokens) / self.rate
+
+
+@dataclass(frozen=True)
+class Take:
+    """The outcome of taking a request from a bucket."""
+
+    allowed: bool
+    burst: float
+    rate: float
+    # Left in the bucket afterwards.
+    tokens: float
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {
+            "RateLimit-Limit": str(int(self.burst)),
+            "RateLimit-Remaining": str(int(self.tokens)),
+            "RateLimit-Reset": str(math.ceil((self.burst - self.tokens) / self.rate)),
+        }
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds until the next request would be allowed."""
+        return max(1, math.ceil((1 - self.tokens) / self.rate))
+
+
+class MemoryBuckets:
+    """
+    Buckets in the memory of this process.
+
+    Nothing awaits while a bucket is updated, so no lock is needed.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, Bucket] = {}
+
+    async def take(self, key: str, rate: float, burst: float) -> Take:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket(rate, burst, burst, now)
+        else:
+            bucket.rate, bucket.burst = rate, burst
+            bucket.refill(now)
+        allowed = bucket.tokens >= 1
+        if allowed:
+            bucket.tokens -= 1
+        return Take(allowed, burst, rate, bucket.tokens)
+
+    async def cleanup(self) -> int:
+        now = time.monotonic()
+        full = [key for key, bucket in self.buckets.items() if bucket.full_at() <= now]
+        for key in full:
+            del self.buckets[key]
+        return len(full)
+
+
+class SharedBuckets:
+    """Buckets in the database, shared by all processes."""
+
+    async def take(self, key: str, rate: float, burst: float) -> Take:
+        _, rows = await connections.get(DEFAULT_SHARD).execute_query(
+            TAKE_SQL, [key, rate, burst]
+        )
+        return Take(rows[0]["allowed"], burst, rate, rows[0]["tokens"])
+
+    async def cleanup(self) -> int:
+        count, _ = await connections.get(DEFAULT_SHARD).execute_query(CLEANUP_SQL)
+        return count
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self.memory = MemoryBuckets()
+        self.shared = SharedBuckets()
+
+    @property
+    def buckets(self) -> MemoryBuckets | SharedBuckets:
+        return self.shared if settings.RATE_LIMITS.shared else self.memory
+
+    async def limit(
+        self,
+        organization_id: int,
+        token_id: str,
+        headers: MutableHeaders,
+    ) -> None:
+        """
+        Take a request of the token and its organization, and describe the emptiest
+        of their buckets in `headers`. Raise 429 if either is empty.
+        """
+        rate_limits = settings.RATE_LIMITS
+        if not rate_limits.enabled:
+            return
+
+        takes = []
+        for key, rate, burst in [
+            (f"token:{token_id}", rate_limits.token_rate, rate_limits.token_burst),
+            (
+                f"organization:{organization_id}",
+                rate_limits.organization_rate,
+                rate_limits.organization_burst,
+            ),
+        ]:
+            take = await self.buckets.take(key, rate, burst)
+            takes.append(take)
+            if not take.allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers={**take.headers, "Retry-After": str(take.retry_after)},
+                )
+        headers.update(min(takes, key=lambda take: take.tokens).headers)
+
+    async def cleanup(self) -> int:
+        """Drop full buckets; return how many."""
+        return await self.buckets.cleanup()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,110 @@
+"""
+Read replicas.
+
+Each database in `POSTGRES` and `SHARDS.databases` may list read-only replicas.
+During requests with a read-only method, model queries read from a replica of their
+shard, picked per query as set by `REPLICAS.selection`. Everything else, including
+writes, locking reads, transactions, background jobs and schema generation, uses the
+primary.
+
+A background job measures how far each replica lags behind. Replicas lagging more
+than `REPLICAS.max_lag_seconds`, or that couldn't be reached, are skipped until the
+next check says otherwise; with none left, reads fall back to the primary.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from math import inf
+
+from loguru import logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+from tortoise.connection import connections
+
+from . import settings
+
+READ_ONLY_METHODS = frozenset({"GET", "HEAD"})
+
+replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+
+# Zero once the replica has replayed everything it received, so that a replica of an
+# idle primary doesn't look like it is falling behind.
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+END AS "lag"
+"""
+
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    """Read from the primary in the block, even during read-only requests."""
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def busy_connections(name: str) -> int:
+    """Return the number of connections of a connection pool currently in use."""
+    # The asyncpg pool of the Tortoise client, created on its first query.
+    pool = getattr(connections.get(name), "_pool", None)
+    if pool is None:
+        return 0
+    return int(pool.get_size() - pool.get_idle_size())
+
+
+class ReplicaPool:
+    """The replicas of one shard, by connection name."""
+
+    def __init__(self, names: list[str]) -> None:
+        self.names = names
+        # Unknown until the first check, and then only for replicas that answered.
+        self.lags: dict[str, float] = {}
+        self.turn = 0
+
+    def available(self) -> list[str]:
+        max_lag = settings.REPLICAS.max_lag_seconds
+        return [name for name in self.names if self.lags.get(name, inf) <= max_lag]
+
+    def pick(self) -> str | None:
+        """Pick a replica to read from, or `None` if none is usable."""
+        available = self.available()
+        if not available:
+            return None
+        if settings.REPLICAS.selection == "least_busy":
+            return min(available, key=busy_connections)
+        self.turn += 1
+        return available[self.turn % len(available)]
+
+    async def check_lag(self) -> None:
+        """Measure the replication lag of every replica."""
+        for name in self.names:
+            try:
+                _, rows = await connections.get(name).execute_query(LAG_SQL)
+            except Exception:
+                self.lags.pop(name, None)
+                logger.exception(f"Failed to check the lag of replica {name}.")
+            else:
+                self.lags[name] = float(rows[0]["lag"])
+
+
+class ReplicaReadsMiddleware:
+    """Let requests with a read-only method read from replicas."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in READ_ONLY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        token = replica_reads.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            replica_reads.reset(token)
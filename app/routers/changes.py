@@ -0,0 +1,239 @@
+"""
+Endpoints for incrementally syncing the objects of an organization.
+"""
+
+import asyncio
+import base64
+import binascii
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from operator import itemgetter
+from typing import Annotated, Any
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from .. import settings
+from ..auth import OAuthRequestSource
+from ..changes import change_hub, feed_horizon
+from ..models import Item as ItemDB
+from ..models import SharingLink as SharingLinkDB
+from ..models import Tombstone
+from ..models import User as UserDB
+from ..replicas import primary_reads
+from ..timing import TimedRoute
+from ..types import Id
+from .items import Item, SharingLink
+from .users import User
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["Changes"],
+    route_class=TimedRoute,
+)
+
+Kind = Tombstone.Kind
+
+SCHEMAS: dict[Kind, type[Item | User | SharingLink]] = {
+    Kind.ITEM: Item,
+    Kind.USER: User,
+    Kind.SHARING_LINK: SharingLink,
+}
+
+
+class Change(BaseModel):
+    kind: Kind
+    id: Id
+    update_time: datetime
+    deleted: bool
+    data: Item | User | SharingLink | None = Field(
+        description="The current state of the object, or null if it was deleted.",
+    )
+
+
+class ChangePage(BaseModel):
+    items: list[Change]
+    next_cursor: str = Field(
+        description="Opaque cursor to pass back to fetch the changes after this page.",
+    )
+    has_more: bool = Field(
+        description="Whether more changes are available right away.",
+    )
+
+
+class Position(BaseModel):
+    update_time: datetime
+    id: int
+
+
+class Cursor(BaseModel):
+    """
+    Where the feed left off in each source table.
+
+    Every source is walked in `(update_time, id)` order on its own, so the cursor keeps
+    one position per source rather than a single position across tables.
+    """
+
+    objects: dict[Kind, Position] = {}
+    tombstones: Position | None = None
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "Cursor":
+        try:
+            return cls.model_validate_json(base64.urlsafe_b64decode(cursor))
+        except (binascii.Error, ValueError, ValidationError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid cursor.",
+            ) from e
+
+
+class ChangeParam(BaseModel):
+    cursor: str | None = Field(None, max_length=1024)
+    limit: int = Field(100, ge=1, le=1000)
+
+
+ChangeQuery = Annotated[ChangeParam, Query()]
+
+
+async def fetch_after(
+    query: QuerySet[Any],
+    position: Position | None,
+    horizon: datetime,
+    limit: int,
+) -> list[Any]:
+    """
+    Fetch up to `limit` rows of `query` after `position` and before `horizon` in
+    `(update_time, id)`.
+    """
+    query = query.filter(update_time__lt=horizon)
+    if position is not None:
+        query = query.filter(
+            Q(update_time__gt=position.update_time)
+            | Q(update_time=position.update_time, id__gt=position.id),
+            # Redundant, but lets the planner seek the `(update_time, id)` index.
+            update_time__gte=position.update_time,
+        )
+    return await query.order_by("update_time", "id").limit(limit)
+
+
+@router.get(
+    "/",
+    summary="List Changes",
+    description=(
+        "List items, users and sharing links of your organization created, updated "
+        "or deleted after the given cursor, oldest first. Omit the cursor to start "
+        "from the beginning; keep the returned cursor to resume later. Changes show "
+        "up once every transaction that started before them has ended."
+    ),
+    response_model=ChangePage,
+)
+async def list_changes(rs: OAuthRequestSource, change_query: ChangeQuery) -> Any:
+    organization_id = rs.organization_id
+    cursor = Cursor.decode(change_query.cursor) if change_query.cursor else Cursor()
+    limit = change_query.limit
+
+    sources: list[tuple[Kind | None, QuerySet[Any], Position | None]] = [
+        (
+            Kind.ITEM,
+            ItemDB.filter(organization_id=organization_id),
+            cursor.objects.get(Kind.ITEM),
+        ),
+        (
+            Kind.USER,
+            UserDB.filter(organization_id=organization_id),
+            cursor.objects.get(Kind.USER),
+        ),
+        (
+            Kind.SHARING_LINK,
+            SharingLinkDB.filter(organization_id=organization_id),
+            cursor.objects.get(Kind.SHARING_LINK),
+        ),
+        (
+            None,
+            Tombstone.filter(organization_id=organization_id),
+            cursor.tombstones,
+        ),
+    ]
+
+    # Merge the sources by `(update_time, id)`, with the source order breaking ties
+    # so that every source stays in its own cursor order. Replicas can't tell which
+    # transactions are still running on the primary, so the feed reads from it.
+    candidates: list[tuple[tuple[datetime, int, int], Kind | None, Any]] = []
+    with primary_reads():
+        horizon = await feed_horizon()
+        for rank, (kind, query, position) in enumerate(sources):
+            for row in await fetch_after(query, position, horizon, limit + 1):
+                candidates.append(((row.update_time, rank, row.id), kind, row))
+    candidates.sort(key=itemgetter(0))
+    page = candidates[:limit]
+
+    changes: list[Change] = []
+    for _, kind, row in page:
+        position = Position(update_time=row.update_time, id=row.id)
+        if kind is None:
+            cursor.tombstones = position
+            change = Change(
+                kind=row.kind,
+                id=row.object_id,
+                update_time=row.update_time,
+                deleted=True,
+                data=None,
+            )
+        else:
+            cursor.objects[kind] = position
+            change = Change(
+                kind=kind,
+                id=row.id,
+                update_time=row.update_time,
+                deleted=False,
+                data=SCHEMAS[kind].model_validate(row, from_attributes=True),
+            )
+        changes.append(change)
+
+    return ChangePage(
+        items=changes,
+        next_cursor=cursor.encode(),
+        has_more=len(candidates) > limit,
+    )
+
+
+async def change_events(organization_id: int) -> AsyncIterator[str]:
+    """Yield Server-Sent Events for changes in the organization, with keepalives."""
+    with change_hub.subscribe(organization_id) as queue:
+        yield ": connected\n\n"
+        while True:
+            try:
+                kind = await asyncio.wait_for(
+                    queue.get(),
+                    timeout=settings.CHANGES.keepalive_seconds,
+                )
+            except TimeoutError:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: change\ndata: {json.dumps({'kind': kind})}\n\n"
+
+
+@router.get(
+    "/stream",
+    summary="Stream Changes",
+    description=(
+        "Server-Sent Events stream with a `change` event whenever items, users or "
+        "sharing links of your organization change. Events only carry the kind of "
+        "the changed objects; fetch the details from the change feed."
+    ),
+    response_class=StreamingResponse,
+)
+async def stream_changes(rs: OAuthRequestSource) -> StreamingResponse:
+    return StreamingResponse(
+        change_events(rs.organization_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
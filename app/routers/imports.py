@@ -0,0 +1,263 @@
+"""
+Endpoint for bulk importing item trees.
+"""
+
+from typing import Annotated, Any
+
+import asyncpg  # type: ignore[import-untyped]
+from fastapi import APIRouter, HTTPException, Path, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+from tortoise.exceptions import IntegrityError
+
+from .. import settings
+from ..auth import OAuthRequestSource
+from ..bulk import ItemRows, insert_items
+from ..changes import Kind, notify_changes
+from ..ids import snowflake
+from ..models import Item as ItemDB
+from ..models import User as UserDB
+from ..sharding import in_shard_transaction
+from ..timing import TimedRoute
+from ..types import Id
+from ..utils import get_object_or_404
+
+router = APIRouter(
+    prefix="",
+    tags=["Items"],
+    route_class=TimedRoute,
+)
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+
+# Levels of folders a nested JSON import can have: the JSON parser rejects documents
+# nested deeper than 200 arrays and objects, and each level takes two. Deeper trees
+# can be imported as NDJSON, whose rows are flat.
+MAX_JSON_DEPTH = 100
+
+
+class ImportNode(BaseModel):
+    name: str = Field(min_length=1, max_length=255)
+    type: ItemDB.Type
+    file_size: int = Field(0, ge=0)
+    children: list["ImportNode"] = Field(
+        [],
+        description="Children of a folder, nested the same way.",
+    )
+
+
+class ImportRow(BaseModel):
+    ref: str = Field(
+        max_length=255,
+        description="Client-chosen reference to this node, unique in the import.",
+    )
+    parent_ref: str | None = Field(
+        None,
+        description="Reference of the parent folder, which must come earlier.",
+    )
+    name: str = Field(min_length=1, max_length=255)
+    type: ItemDB.Type
+    file_size: int = Field(0, ge=0)
+
+
+class ImportResult(BaseModel):
+    imported: int
+    root_ids: list[Id]
+
+
+import_nodes_adapter = TypeAdapter(list[ImportNode])
+
+
+def unprocessable(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail
+    )
+
+
+class TreeBuilder:
+    """
+    Collect imported nodes in parent-before-child order.
+
+    Parents are referenced by their index in the import (`-1` for top-level nodes)
+    until real IDs are allocated.
+    """
+
+    def __init__(self) -> None:
+        self.parents: list[int] = []
+        self.rows = ItemRows()
+        self.names_seen: set[tuple[int, str]] = set()
+
+    def add(self, parent: int, name: str, type_: ItemDB.Type, file_size: int) -> int:
+        index = len(self.parents)
+        if index >= settings.IMPORTS.max_nodes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {settings.IMPORTS.max_nodes} nodes per import.",
+            )
+        if parent >= 0 and self.rows.types[parent] != ItemDB.Type.FOLDER:
+            raise unprocessable(f"Parent of {name!r} is not a folder.")
+        if (parent, name) in self.names_seen:
+            raise unprocessable(f"Duplicate name {name!r} in the same folder.")
+        self.names_seen.add((parent, name))
+
+        self.parents.append(parent)
+        self.rows.names.append(name)
+        self.rows.types.append(type_)
+        self.rows.file_sizes.append(file_size if type_ == ItemDB.Type.FILE else 0)
+        return index
+
+    def resolve(self, ids: list[int], parent_id: int | None) -> ItemRows:
+        self.rows.ids = ids
+        self.rows.parent_ids = [
+            ids[parent] if parent >= 0 else parent_id for parent in self.parents
+        ]
+        return self.rows
+
+
+def parse_json(body: bytes) -> TreeBuilder:
+    try:
+        nodes = import_nodes_adapter.validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors()) from e
+
+    builder = TreeBuilder()
+    # Depth-first, so that parents come before their children.
+    stack = [(-1, node) for node in reversed(nodes)]
+    while stack:
+        parent, node = stack.pop()
+        index = builder.add(parent, node.name, node.type, node.file_size)
+        stack.extend((index, child) for child in reversed(node.children))
+    return builder
+
+
+def parse_ndjson(body: bytes) -> TreeBuilder:
+    builder = TreeBuilder()
+    refs: dict[str, int] = {}
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = ImportRow.model_validate_json(line)
+        except ValidationError as e:
+            raise RequestValidationError(
+                [
+                    {**error, "loc": ("body", line_number, *error["loc"])}
+                    for error in e.errors()
+                ]
+            ) from e
+        if row.ref in refs:
+            raise unprocessable(f"Duplicate ref {row.ref!r} on line {line_number}.")
+        parent = -1
+        if row.parent_ref is not None:
+            if row.parent_ref not in refs:
+                raise unprocessable(
+                    f"Unknown parent_ref {row.parent_ref!r} on line {line_number}."
+                )
+            parent = refs[row.parent_ref]
+        refs[row.ref] = builder.add(parent, row.name, row.type, row.file_size)
+    return builder
+
+
+async def read_body(request: Request) -> bytes:
+    """
+    Read the body of `request`, rejecting it as soon as it is known to be over
+    `IMPORTS.max_bytes`, from its `Content-Length` or while it streams in.
+    """
+    max_bytes = settings.IMPORTS.max_bytes
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"At most {max_bytes} bytes per import.",
+    )
+    if int(request.headers.get("Content-Length", 0)) > max_bytes:
+        raise too_large
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@router.post(
+    "/users/{user_id}/items/import",
+    summary="Import an Item Tree",
+    description=(
+        "Import a tree of folders and files for the given user in one transaction. "
+        f"Send either a JSON array of nested nodes (`{JSON}`), or one flat node per "
+        f"line (`{NDJSON}`) with each parent before its children. Nested JSON can be "
+        f"at most {MAX_JSON_DEPTH} folders deep."
+    ),
+    status_code=status.HTTP_201_CREATED,
+    response_model=ImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON: {"schema": import_nodes_adapter.json_schema()},
+                NDJSON: {"schema": ImportRow.model_json_schema()},
+            },
+        },
+    },
+)
+async def import_items(
+    request: Request,
+    rs: OAuthRequestSource,
+    user_id: Annotated[
+        Id,
+        Path(description="ID of the user who will own the imported items."),
+    ],
+    parent_id: Annotated[
+        Id | None,
+        Query(description="ID of the folder to import into; top level if omitted."),
+    ] = None,
+) -> Any:
+    match request.headers.get("Content-Type", "").partition(";")[0].strip():
+        case "application/json":
+            parse = parse_json
+        case "application/x-ndjson":
+            parse = parse_ndjson
+        case _:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    body = await read_body(request)
+
+    users = UserDB.filter(organization_id=rs.organization_id)
+    user = await get_object_or_404(users, id=user_id)
+    if parent_id is not None:
+        folders = ItemDB.filter(
+            organization_id=rs.organization_id,
+            owner=user,
+            type=ItemDB.Type.FOLDER,
+        )
+        await get_object_or_404(folders, id=parent_id)
+
+    # In a thread, as parsing a large import would block the event loop for seconds.
+    builder = await run_in_threadpool(parse, body)
+
+    count = len(builder.parents)
+    if not count:
+        return ImportResult(imported=0, root_ids=[])
+
+    ids = snowflake.next_ids(count)
+    rows = await run_in_threadpool(builder.resolve, ids, parent_id)
+    try:
+        async with in_shard_transaction():
+            await insert_items(
+                rs.organization_id, user.id, rows, settings.IMPORTS.batch_size
+            )
+            await notify_changes(Kind.ITEM, [rs.organization_id])
+    except IntegrityError as e:
+        # Other violations, e.g. of the parent folder being deleted meanwhile, are
+        # errors.
+        if not isinstance(e.args[0], asyncpg.UniqueViolationError):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An item with the same name already exists in the folder.",
+        ) from e
+
+    root_ids = [ids[i] for i, parent in enumerate(builder.parents) if parent < 0]
+    return ImportResult(imported=count, root_ids=root_ids)
@@ -1,49 +1,116 @@
 """
-Endpoints for listing items and their sharing links.
+Endpoints for items and their sharing links.
+
+Queries filter on the organization of items and links directly (rather than through
+the owner), so that partitioned tables are pruned to one partition.
 """
 
-from datetime import datetime
+from datetime import UTC, datetime
 from typing import Annotated, Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Path
-from pydantic import BaseModel
+from fastapi import APIRouter, Body, HTTPException, Path, Query, status
+from pydantic import AwareDatetime, BaseModel, Field
+from tortoise.expressions import Q
 
+from ..access_stats import sharing_link_access
 from ..auth import OAuthRequestSource
+from ..bulk import (
+    SharingLinkRows,
+    delete_subtree,
+    insert_sharing_links,
+    is_descendant,
+    move_subtree,
+)
+from ..changes import Kind, notify_changes
 from ..models import Item as ItemDB
 from ..models import SharingLink as SharingLinkDB
 from ..models import User as UserDB
-from ..pagination import Page, PaginationQuery, paginate
+from ..pagination import Page, PaginationParam, PaginationQuery, paginate
+from ..sharding import find_in_shards, in_shard_transaction
+from ..timing import TimedRoute
 from ..types import Id
 from ..utils import get_object_or_404
 
 router = APIRouter(
     prefix="",
     tags=["Items"],
+    route_class=TimedRoute,
 )
 
+MAX_SHARING_LINKS_PER_REQUEST = 1000
+
 
 class Item(BaseModel):
-    id: int
+    id: Id
     create_time: datetime
     update_time: datetime
-    owner_id: int
-    parent_id: int | None
+    owner_id: Id
+    parent_id: Id | None
     name: str
     type: ItemDB.Type
     file_size: int
 
 
 class SharingLink(BaseModel):
-    id: int
+    id: Id
     create_time: datetime
     update_time: datetime
-    item_id: int
+    item_id: Id
     token: UUID
     permission: SharingLinkDB.Permission
     expire_time: datetime | None
 
 
+class NewSharingLink(BaseModel):
+    item_id: Id
+    permission: SharingLinkDB.Permission
+    expire_time: AwareDatetime | None = Field(
+        None,
+        description="When the link stops working; never if omitted.",
+    )
+
+
+class ResolvedSharingLink(BaseModel):
+    token: UUID
+    permission: SharingLinkDB.Permission
+    expire_time: datetime | None
+    item: Item
+
+
+class MoveItem(BaseModel):
+    parent_id: Id | None = Field(
+        None,
+        description="ID of the destination folder; top level if omitted.",
+    )
+    owner_id: Id | None = Field(
+        None,
+        description=(
+            "ID of the new owner of the moved subtree. Defaults to the owner of the "
+            "destination folder, or the current owner for a top-level move."
+        ),
+    )
+
+
+class DeletedItems(BaseModel):
+    items: int
+    sharing_links: int
+
+
+class SharingLinkPaginationParam(PaginationParam):
+    active_only: bool = Field(
+        False,
+        description="Only return links that have not expired yet.",
+    )
+
+
+SharingLinkPaginationQuery = Annotated[SharingLinkPaginationParam, Query()]
+
+
+def active_q() -> Q:
+    return Q(expire_time=None) | Q(expire_time__gt=datetime.now(tz=UTC))
+
+
 @router.get(
     "/users/{user_id}/items/",
     summary="List a User's Top-Level Items",
@@ -61,7 +128,11 @@ async def list_user_items(
     users = UserDB.filter(organization_id=rs.organization_id)
     user = await get_object_or_404(users, id=user_id)
 
-    query = user.items.filter(parent=None)
+    query = ItemDB.filter(
+        organization_id=rs.organization_id,
+        owner=user,
+        parent=None,
+    )
     return await paginate(query, cursor=page_query.cursor, limit=page_query.limit)
 
 
@@ -79,13 +150,13 @@ async def list_folder_items(
     ],
     page_query: PaginationQuery,
 ) -> Any:
-    folders = ItemDB.filter(
-        owner__organization_id=rs.organization_id,
-        type=ItemDB.Type.FOLDER,
+    items = ItemDB.filter(organization_id=rs.organization_id)
+    folder = await get_object_or_404(
+        items.filter(type=ItemDB.Type.FOLDER),
+        id=folder_id,
     )
-    folder = await get_object_or_404(folders, id=folder_id)
 
-    query = folder.children.all()
+    query = items.filter(parent=folder)
     return await paginate(query, cursor=page_query.cursor, limit=page_query.limit)
 
 
@@ -98,10 +169,152 @@ async def list_folder_items(
 async def list_item_sharing_links(
     rs: OAuthRequestSource,
     item_id: Id,
-    page_query: PaginationQuery,
+    page_query: SharingLinkPaginationQuery,
 ) -> Any:
-    items = ItemDB.filter(owner__organization_id=rs.organization_id)
+    items = ItemDB.filter(organization_id=rs.organization_id)
     item = await get_object_or_404(items, id=item_id)
 
-    query = item.sharing_links.all()
+    query = SharingLinkDB.filter(organization_id=rs.organization_id, item=item)
+    if page_query.active_only:
+        query = query.filter(active_q())
     return await paginate(query, cursor=page_query.cursor, limit=page_query.limit)
+
+
+@router.post(
+    "/sharing-links/",
+    summary="Create Sharing Links",
+    description=(
+        "Create sharing links for many items at once. Every item must belong to the "
+        "organization; otherwise nothing is created."
+    ),
+    status_code=status.HTTP_201_CREATED,
+    response_model=list[SharingLink],
+)
+async def create_sharing_links(
+    rs: OAuthRequestSource,
+    links: Annotated[
+        list[NewSharingLink],
+        Body(min_length=1, max_length=MAX_SHARING_LINKS_PER_REQUEST),
+    ],
+) -> Any:
+    item_ids = {link.item_id for link in links}
+    items = ItemDB.filter(organization_id=rs.organization_id, id__in=item_ids)
+    missing = item_ids.difference(await items.values_list("id", flat=True))
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Items not found: {sorted(missing)}.",
+        )
+
+    rows = SharingLinkRows(
+        item_ids=[link.item_id for link in links],
+        tokens=[uuid4() for _ in links],
+        permissions=[link.permission for link in links],
+        expire_times=[link.expire_time for link in links],
+    )
+    async with in_shard_transaction():
+        created = await insert_sharing_links(
+            rs.organization_id, rows, MAX_SHARING_LINKS_PER_REQUEST
+        )
+        await notify_changes(Kind.SHARING_LINK, [rs.organization_id])
+    return created
+
+
+@router.get(
+    "/sharing-links/{token}",
+    summary="Resolve a Sharing Link",
+    description="Resolve an unexpired sharing link token to the item it shares.",
+    response_model=ResolvedSharingLink,
+)
+async def resolve_sharing_link(
+    token: Annotated[
+        UUID,
+        Path(description="Token of the sharing link to resolve."),
+    ],
+) -> Any:
+    # The organization isn't known here, so this is the one lookup that checks every
+    # shard, and every partition of a partitioned table.
+    links = SharingLinkDB.filter(active_q(), token=token).select_related("item")
+    link = await find_in_shards(links)
+    if link is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    sharing_link_access.record(link.id)
+    return link
+
+
+@router.post(
+    "/items/{item_id}/move",
+    summary="Move an Item",
+    description=(
+        "Move an item, together with everything under it, into another folder or to "
+        "the top level, possibly handing the whole subtree over to another user."
+    ),
+    response_model=Item,
+)
+async def move_item(
+    rs: OAuthRequestSource,
+    item_id: Annotated[
+        Id,
+        Path(description="ID of the item to move."),
+    ],
+    body: MoveItem,
+) -> Any:
+    items = ItemDB.filter(organization_id=rs.organization_id)
+    async with in_shard_transaction():
+        item = await get_object_or_404(items.select_for_update(), id=item_id)
+
+        owner_id = body.owner_id if body.owner_id is not None else item.owner_id  # type: ignore[attr-defined]
+        if body.parent_id is not None:
+            folders = items.filter(type=ItemDB.Type.FOLDER).select_for_update()
+            parent = await get_object_or_404(folders, id=body.parent_id)
+            if body.owner_id is not None and body.owner_id != parent.owner_id:  # type: ignore[attr-defined]
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="The destination folder belongs to another user.",
+                )
+            owner_id = parent.owner_id  # type: ignore[attr-defined]
+            if await is_descendant(rs.organization_id, item.id, parent.id):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Cannot move an item into itself or its descendants.",
+                )
+            siblings = items.filter(parent_id=parent.id, name=item.name)
+            if await siblings.exclude(id=item.id).exists():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="An item with the same name already exists in the folder.",
+                )
+        elif body.owner_id is not None:
+            users = UserDB.filter(organization_id=rs.organization_id)
+            await get_object_or_404(users, id=body.owner_id)
+
+        await move_subtree(item, owner_id, body.parent_id)
+        await notify_changes(Kind.ITEM, [rs.organization_id])
+
+    return await items.get(id=item.id)
+
+
+@router.delete(
+    "/items/{item_id}",
+    summary="Delete an Item",
+    description=(
+        "Delete an item together with all its descendants and their sharing links."
+    ),
+    response_model=DeletedItems,
+)
+async def delete_item(
+    rs: OAuthRequestSource,
+    item_id: Annotated[
+        Id,
+        Path(description="ID of the item to delete."),
+    ],
+) -> Any:
+    items = ItemDB.filter(organization_id=rs.organization_id)
+    async with in_shard_transaction():
+        item = await get_object_or_404(items.select_for_update(), id=item_id)
+        deleted_items, deleted_links = await delete_subtree(item.id, rs.organization_id)
+        await notify_changes(Kind.ITEM, [rs.organization_id])
+        if deleted_links:
+            await notify_changes(Kind.SHARING_LINK, [rs.organization_id])
+    return DeletedItems(items=deleted_items, sharing_links=deleted_links)
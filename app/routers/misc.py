@@ -2,13 +2,28 @@
 Miscellaneous utility endpoints.
 """
 
+import hmac
+import tracemalloc
+from dataclasses import asdict
 from datetime import UTC, datetime
+from typing import Annotated
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from .. import settings
+from ..admission import admission
+from ..memory import TOKEN_HEADER, AllocationSite, memory_tracer
+from ..metrics import metrics
+from ..timing import TimedRoute
+from ..warmup import readiness
 
 router = APIRouter(
     prefix="",
     tags=["Misc"],
+    route_class=TimedRoute,
 )
 
 
@@ -19,3 +34,150 @@ router = APIRouter(
 )
 def ping() -> datetime:
     return datetime.now(tz=UTC)
+
+
+@router.get(
+    "/ready",
+    summary="Check Readiness",
+    description=(
+        "Readiness probe; fails with 503 until the database connections are warmed "
+        "up after startup, and again once shutdown begins."
+    ),
+)
+def ready() -> str:
+    if not readiness.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return "OK"
+
+
+class Admission(BaseModel):
+    in_use: int
+    queue_depth: int
+    admitted: int
+    rejected: int
+    queued: int
+    queue_wait_seconds: float
+
+
+@router.get(
+    "/admission",
+    summary="Get Admission Statistics",
+    description=(
+        "Request slots in use and waiting requests of this process, and counts of "
+        "admitted and rejected requests and of the time spent waiting since it started."
+    ),
+)
+async def get_admission() -> Admission:
+    # Async, so that the admission state is read on the event loop that updates it.
+    return Admission(
+        in_use=admission.in_use,
+        queue_depth=len(admission.waiters),
+        **asdict(admission.stats),
+    )
+
+
+@router.get(
+    "/metrics",
+    summary="Get Metrics",
+    description=(
+        "Metrics of this process in the Prometheus text format: requests by route and "
+        "status and their latencies, database pool usage, authentication failures, "
+        "admission, injected faults and the purge of expired sharing links."
+    ),
+    response_class=PlainTextResponse,
+)
+async def get_metrics() -> PlainTextResponse:
+    # Async, so that the metrics are rendered on the event loop that updates them,
+    # rather than in the threadpool while it does.
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def verify_memory_profiling_token(
+    token: Annotated[str, Header(alias=TOKEN_HEADER)] = "",
+) -> None:
+    memory_profiling = settings.MEMORY_PROFILING
+    if not memory_profiling.enabled or not memory_profiling.token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not hmac.compare_digest(token.encode(), memory_profiling.token.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+MemoryProfilingAccess = Depends(verify_memory_profiling_token)
+
+
+class RouteMemory(BaseModel):
+    method: str
+    route: str
+    requests: int
+    max_peak_bytes: int
+    mean_peak_bytes: float
+
+
+class Memory(BaseModel):
+    tracing: bool
+    traced_bytes: int
+    peak_bytes: int
+    top: list[AllocationSite]
+    routes: list[RouteMemory]
+
+
+@router.get(
+    "/memory",
+    summary="Get Memory Profile",
+    description=(
+        "While memory allocations are traced: the memory traced now and at its peak, "
+        "the lines that allocated the most memory still in use, and the peak memory "
+        "of requests by route, largest first."
+    ),
+    dependencies=[MemoryProfilingAccess],
+)
+async def get_memory(
+    limit: Annotated[
+        int, Query(ge=1, le=100, description="Number of allocation sites.")
+    ] = 20,
+) -> Memory:
+    # The peaks are read on the event loop that updates them; only the snapshot of
+    # the traced allocations, which takes a while, is taken in the threadpool.
+    traced, peak = tracemalloc.get_traced_memory()
+    routes = [
+        RouteMemory(
+            method=method,
+            route=route,
+            requests=peaks.requests,
+            max_peak_bytes=peaks.max_bytes,
+            mean_peak_bytes=peaks.total_bytes / peaks.requests,
+        )
+        for (method, route), peaks in memory_tracer.routes.items()
+    ]
+    return Memory(
+        tracing=memory_tracer.tracing,
+        traced_bytes=traced,
+        peak_bytes=peak,
+        top=await run_in_threadpool(memory_tracer.top, limit),
+        routes=sorted(routes, key=lambda route: route.max_peak_bytes, reverse=True),
+    )
+
+
+@router.post(
+    "/memory/start",
+    summary="Start Tracing Memory",
+    description="Start tracing memory allocations in this process.",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[MemoryProfilingAccess],
+)
+async def start_memory_tracing() -> None:
+    memory_tracer.start()
+
+
+@router.post(
+    "/memory/stop",
+    summary="Stop Tracing Memory",
+    description="Stop tracing memory allocations, and forget those traced.",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[MemoryProfilingAccess],
+)
+async def stop_memory_tracing() -> None:
+    memory_tracer.stop()
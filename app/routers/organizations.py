@@ -5,22 +5,25 @@ Endpoints for listing and retrieving organizations.
 from datetime import datetime
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Path
+from fastapi import APIRouter, HTTPException, Path, status
 from pydantic import BaseModel
 
 from ..models import Organization as OrganizationDB
-from ..pagination import Page, PaginationQuery, paginate
+from ..pagination import Page, PaginationQuery, paginate_shards
+from ..sharding import shard_map, using_shard
+from ..timing import TimedRoute
 from ..types import Id
 from ..utils import get_object_or_404
 
 router = APIRouter(
     prefix="/organizations",
     tags=["Organizations"],
+    route_class=TimedRoute,
 )
 
 
 class Organization(BaseModel):
-    id: int
+    id: Id
     create_time: datetime
     update_time: datetime
     name: str
@@ -34,7 +37,9 @@ class Organization(BaseModel):
 )
 async def list_organizations(page_query: PaginationQuery) -> Any:
     query = OrganizationDB.all()
-    return await paginate(query, cursor=page_query.cursor, limit=page_query.limit)
+    return await paginate_shards(
+        query, cursor=page_query.cursor, limit=page_query.limit
+    )
 
 
 @router.get(
@@ -49,4 +54,8 @@ async def get_organization(
         Path(description="ID of the organization to retrieve."),
     ],
 ) -> Any:
-    return await get_object_or_404(OrganizationDB, id=organization_id)
+    shard = await shard_map.find(organization_id)
+    if shard is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    with using_shard(shard):
+        return await get_object_or_404(OrganizationDB, id=organization_id)
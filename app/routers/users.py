@@ -11,20 +11,22 @@ from pydantic import BaseModel, EmailStr
 from ..auth import OAuthRequestSource
 from ..models import User as UserDB
 from ..pagination import Page, PaginationQuery, paginate
+from ..timing import TimedRoute
 from ..types import Id
 from ..utils import get_object_or_404
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"],
+    route_class=TimedRoute,
 )
 
 
 class User(BaseModel):
-    id: int
+    id: Id
     create_time: datetime
     update_time: datetime
-    organization_id: int
+    organization_id: Id
     username: str
     email: EmailStr
     active: bool
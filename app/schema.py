@@ -0,0 +1,121 @@
+"""
+Database schema generation.
+
+With `PARTITIONS.count` set, items and sharing links (and the access counters that
+reference links) are hash-partitioned by organization. Tortoise can't declare such
+tables, so they are created here before Tortoise generates the rest of the schema,
+which then skips them but still adds their indexes and comments.
+
+Every shard (see `app.sharding`) gets the same schema. Outside of tests, databases
+get it through the migrations (see `app.migrations`), which tests check against it.
+
+Partitioned tables can only enforce uniqueness that includes the partition key, so
+their primary keys, unique constraints and the foreign keys between them all lead
+with `organization_id`.
+"""
+
+from tortoise import Tortoise
+from tortoise.utils import get_schema_sql
+
+from . import settings
+from .sharding import DEFAULT_SHARD, shard_settings
+
+PARTITIONED_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS "item" (
+    "id" BIGINT NOT NULL,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "name" VARCHAR(255) NOT NULL,
+    "type" VARCHAR(64) NOT NULL,
+    "file_size" BIGINT NOT NULL DEFAULT 0,
+    "organization_id" BIGINT NOT NULL,
+    "owner_id" BIGINT NOT NULL,
+    "parent_id" BIGINT,
+    PRIMARY KEY ("organization_id", "id"),
+    CONSTRAINT "uid_item_parent_name" UNIQUE ("organization_id", "parent_id", "name"),
+    FOREIGN KEY ("organization_id", "parent_id")
+        REFERENCES "item" ("organization_id", "id") ON DELETE CASCADE
+) PARTITION BY HASH ("organization_id");
+-- For lookups by primary key alone, e.g. when the ORM saves an object.
+CREATE INDEX IF NOT EXISTS "idx_item_id" ON "item" ("id");
+CREATE TABLE IF NOT EXISTS "sharinglink" (
+    "id" BIGSERIAL NOT NULL,
+    "create_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "update_time" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "token" UUID NOT NULL,
+    "permission" VARCHAR(64) NOT NULL,
+    "expire_time" TIMESTAMPTZ,
+    "organization_id" BIGINT NOT NULL,
+    "item_id" BIGINT NOT NULL,
+    PRIMARY KEY ("organization_id", "id"),
+    CONSTRAINT "uid_sharinglink_token" UNIQUE ("organization_id", "token"),
+    FOREIGN KEY ("organization_id", "item_id")
+        REFERENCES "item" ("organization_id", "id") ON DELETE CASCADE
+) PARTITION BY HASH ("organization_id");
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_id" ON "sharinglink" ("id");
+-- Resolving a link only knows its token, so it checks this index in every partition.
+CREATE INDEX IF NOT EXISTS "idx_sharinglink_token" ON "sharinglink" ("token");
+CREATE TABLE IF NOT EXISTS "sharinglinkaccess" (
+    "access_count" BIGINT NOT NULL DEFAULT 0,
+    "last_access_time" TIMESTAMPTZ NOT NULL,
+    "organization_id" BIGINT NOT NULL,
+    "sharing_link_id" BIGINT NOT NULL PRIMARY KEY,
+    FOREIGN KEY ("organization_id", "sharing_link_id")
+        REFERENCES "sharinglink" ("organization_id", "id") ON DELETE CASCADE
+);
+"""
+
+PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS "{table}_p{remainder}" PARTITION OF "{table}"
+    FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder});
+"""
+
+# Added once Tortoise has created the referenced tables.
+FOREIGN_KEYS = [
+    ("item", "organization_id", "organization"),
+    ("item", "owner_id", "user"),
+    ("sharinglink", "organization_id", "organization"),
+    ("sharinglinkaccess", "organization_id", "organization"),
+]
+
+FOREIGN_KEY_SQL = """
+DO $$ BEGIN
+    ALTER TABLE "{table}" ADD CONSTRAINT "fk_{table}_{column}"
+        FOREIGN KEY ("{column}") REFERENCES "{target}" ("id") ON DELETE CASCADE;
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+"""
+
+
+def partitioned_schema_sql(count: int) -> tuple[str, str]:
+    """Return the SQL to run before and after Tortoise generates the schema."""
+    partitions = "".join(
+        PARTITION_SQL.format(table=table, modulus=count, remainder=remainder)
+        for table in ("item", "sharinglink")
+        for remainder in range(count)
+    )
+    foreign_keys = "".join(
+        FOREIGN_KEY_SQL.format(table=table, column=column, target=target)
+        for table, column, target in FOREIGN_KEYS
+    )
+    return PARTITIONED_TABLES_SQL + partitions, foreign_keys
+
+
+def schema_sql(partitions: int | None = None) -> str:
+    """
+    Return the SQL creating missing tables, partitioning items and sharing links into
+    `partitions` hash partitions (`PARTITIONS.count` by default; 0 for plain tables).
+    """
+    if partitions is None:
+        partitions = settings.PARTITIONS.count
+    before, after = partitioned_schema_sql(partitions) if partitions else ("", "")
+    # Tortoise would only create the models' tables in the default connection.
+    schema = get_schema_sql(Tortoise.get_connection(DEFAULT_SHARD), safe=True)
+    return before + schema + after
+
+
+async def generate_schemas(partitions: int | None = None) -> None:
+    """Create missing tables in every shard (see `schema_sql`)."""
+    sql = schema_sql(partitions)
+    for shard in shard_settings():
+        await Tortoise.get_connection(shard).execute_script(sql)
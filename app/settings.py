@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,17 +12,45 @@ class PostgresSettings(BaseModel):
     database: str = "postgres"
     min_size: int = 1
     max_size: int = 100
+    # Read-only replicas of this database, by connection name (see `app.replicas`).
+    replicas: dict[str, "PostgresSettings"] = {}
 
     @property
-    def url(self) -> str:
+    def dsn(self) -> str:
         return (
             f"postgres://{self.user}:{self.password}"
             f"@{self.host}:{self.port}"
             f"/{self.database}"
-            f"?minsize={self.min_size}"
-            f"&maxsize={self.max_size}"
         )
 
+    @property
+    def url(self) -> str:
+        return f"{self.dsn}?minsize={self.min_size}&maxsize={self.max_size}"
+
+    def connection(self, workers: int = 1, *, listen: bool = False) -> dict[str, Any]:
+        """
+        The Tortoise connection config, on the instrumented engine of `app.db`, for
+        one of `workers` processes sharing the pool budget of `min_size`/`max_size`.
+
+        With `listen`, the budget also covers the `LISTEN` connection every process
+        holds outside the pool (see `app.changes`).
+        """
+        budget = self.max_size - workers if listen else self.max_size
+        max_size = max(1, budget // workers)
+        min_size = min(max_size, max(1, self.min_size // workers))
+        return {
+            "engine": "app.db",
+            "credentials": {
+                "host": self.host,
+                "port": self.port,
+                "user": self.user,
+                "password": self.password,
+                "database": self.database,
+                "minsize": min_size,
+                "maxsize": max_size,
+            },
+        }
+
     @property
     def test_database(self) -> str:
         return f"test_{self.database}"
@@ -33,6 +63,34 @@ class PostgresSettings(BaseModel):
             f"/{self.test_database}"
         )
 
+    @property
+    def test_connection(self) -> dict[str, Any]:
+        """The test database's connection config, with Tortoise's default pool size."""
+        connection = self.connection()
+        credentials = connection["credentials"]
+        credentials["database"] = self.test_database
+        del credentials["minsize"], credentials["maxsize"]
+        return connection
+
+
+class ShardSettings(BaseModel):
+    # Databases that organizations are spread over besides `POSTGRES`, by connection
+    # name. An organization lives entirely in one of them.
+    databases: dict[str, PostgresSettings] = {}
+
+
+class ReplicaSettings(BaseModel):
+    selection: Literal["round_robin", "least_busy"] = "round_robin"
+    # Replicas lagging further behind the primary are skipped until they catch up.
+    max_lag_seconds: float = 5
+    lag_check_interval_seconds: float = 1
+
+
+class ServerSettings(BaseModel):
+    # Processes serving requests (see `scripts/serve.py`), which split the pool
+    # budget of every database between them.
+    workers: int = Field(default=1, ge=1)
+
 
 class JWTSettings(BaseModel):
     secret_key: str = "secret-key"  # noqa: S105
@@ -45,33 +103,224 @@ class AuthSettings(BaseModel):
     refresh_token_expire_minutes: int = 60 * 24 * 3650  # 10 years
 
 
+class PartitionSettings(BaseModel):
+    # Number of hash partitions by organization for items and sharing links; 0 keeps
+    # plain tables. Only applies when the tables are created, by the initial
+    # migration.
+    count: int = Field(default=0, ge=0)
+
+
+class MigrationSettings(BaseModel):
+    # Apply pending migrations when the app starts, instead of with
+    # `scripts/migrate.py` before it does.
+    run_on_startup: bool = False
+
+
+class AdmissionSettings(BaseModel):
+    # Requests handled at once by the whole server, split between its workers like
+    # the pool budget; best kept within `POSTGRES.max_size`.
+    slots: int = Field(default=100, ge=1)
+    # Of which a single organization may hold at most.
+    organization_slots: int = Field(default=25, ge=1)
+    # Requests waiting for a slot in each worker, and for how long, before they are
+    # shed.
+    queue_size: int = Field(default=100, ge=0)
+    queue_timeout_seconds: float = 1
+    retry_after_seconds: int = 1
+
+    def split(self, workers: int = 1) -> "AdmissionSettings":
+        """These settings for one of `workers` processes sharing the slots."""
+        return self.model_copy(
+            update={
+                "slots": max(1, self.slots // workers),
+                "organization_slots": max(1, self.organization_slots // workers),
+            }
+        )
+
+
+class RateLimitSettings(BaseModel):
+    enabled: bool = True
+    # Requests per second, and how many may come at once, of an organization and of
+    # an access token.
+    organization_rate: float = Field(default=100, gt=0)
+    organization_burst: float = Field(default=200, ge=1)
+    token_rate: float = Field(default=20, gt=0)
+    token_burst: float = Field(default=50, ge=1)
+    # Keep the limits in Postgres, shared by all processes, instead of in memory.
+    shared: bool = False
+    cleanup_interval_seconds: float = 60
+
+
+class FaultSettings(BaseModel):
+    # Share of requests failed with a simulated 500, overall and by route path.
+    error_rate: float = Field(default=0.001, ge=0, le=1)
+    route_error_rates: dict[str, float] = {}
+    # Share of requests delayed, and how long for on average.
+    latency_rate: float = Field(default=0, ge=0, le=1)
+    latency_distribution: Literal["fixed", "uniform", "exponential"] = "exponential"
+    latency_mean_seconds: float = Field(default=0.1, gt=0)
+    # Share of requests held up by a slow database query, and how slow it is.
+    slow_db_rate: float = Field(default=0, ge=0, le=1)
+    slow_db_seconds: float = 0.5
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.error_rate
+            or self.route_error_rates
+            or self.latency_rate
+            or self.slow_db_rate
+        )
+
+
+class PurgeSettings(BaseModel):
+    enabled: bool = True
+    batch_size: int = 1000
+    batch_interval_seconds: float = 0.1
+    idle_interval_seconds: float = 60
+
+
+class AccessStatsSettings(BaseModel):
+    flush_interval_seconds: float = 5
+
+
+class ChangesSettings(BaseModel):
+    channel: str = "changes"
+    # How far the change feed stays behind its horizon, for timestamps taken by the
+    # app just before their transaction starts, and clock skew (see
+    # `app.changes.feed_horizon`).
+    safety_lag_seconds: float = Field(default=1, ge=0)
+    keepalive_seconds: float = 15
+    reconnect_seconds: float = 5
+    queue_size: int = 16
+
+
+class ImportSettings(BaseModel):
+    max_nodes: int = 500_000
+    # Bodies over this are rejected before being read in full.
+    max_bytes: int = 100 * 1024 * 1024
+    batch_size: int = 10_000
+
+
+class IdSettings(BaseModel):
+    # Must differ between processes that insert into the same database.
+    worker_id: int = Field(default=0, ge=0, lt=1024)
+
+
+class QuerySettings(BaseModel):
+    # Queries slower than this are logged with their SQL.
+    slow_query_seconds: float = 0.1
+    # A request running the same statement this many times is likely an N+1.
+    repeated_query_threshold: int = Field(default=10, ge=2)
+
+
+class ServerTimingSettings(BaseModel):
+    # Send the `Server-Timing` header with every response.
+    enabled: bool = False
+    # Or only to clients sending this in the `Server-Timing-Token` header.
+    token: str = ""
+
+
+class ProfilingSettings(BaseModel):
+    # Profile requests sending `token` (see `app.profiling`).
+    enabled: bool = False
+    token: str = ""
+    directory: str = "var/profiles"
+    interval_seconds: float = Field(default=0.005, gt=0)
+
+
+class LoopMonitorSettings(BaseModel):
+    # How often the event loop lag is measured, and over how long percentiles are.
+    interval_seconds: float = Field(default=0.1, gt=0)
+    window_seconds: float = Field(default=60, gt=0)
+    # Log what blocks the loop for longer than the threshold (see `app.loop_monitor`).
+    debug: bool = False
+    blocking_threshold_seconds: float = Field(default=0.1, gt=0)
+
+
+class ThreadpoolSettings(BaseModel):
+    # Run sync endpoints on the event loop instead of in the threadpool (see
+    # `app.threadpool`).
+    inline_sync_endpoints: bool = False
+    # Threads running sync code at once, AnyIO's default being 40.
+    size: int = Field(default=40, ge=1)
+
+
+class AccessLogSettings(BaseModel):
+    # Log every request as JSON (see `app.access_log`).
+    enabled: bool = True
+    # Records waiting to be written, beyond which new ones are dropped.
+    queue_size: int = Field(default=10_000, ge=1)
+    # Fraction of successful requests logged; the others always are.
+    success_sample_rate: float = Field(default=1, ge=0, le=1)
+
+
+class MemoryProfilingSettings(BaseModel):
+    # Let clients sending `token` trace memory allocations (see `app.memory`).
+    enabled: bool = False
+    token: str = ""
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_nested_delimiter="__")
 
     testing: bool = False
-    random_error_rate: float = 0.001
     postgres: PostgresSettings = PostgresSettings()
+    shards: ShardSettings = ShardSettings()
+    replicas: ReplicaSettings = ReplicaSettings()
+    server: ServerSettings = ServerSettings()
     jwt: JWTSettings = JWTSettings()
     auth: AuthSettings = AuthSettings()
+    partitions: PartitionSettings = PartitionSettings()
+    migrations: MigrationSettings = MigrationSettings()
+    admission: AdmissionSettings = AdmissionSettings()
+    rate_limits: RateLimitSettings = RateLimitSettings()
+    faults: FaultSettings = FaultSettings()
+    purge: PurgeSettings = PurgeSettings()
+    access_stats: AccessStatsSettings = AccessStatsSettings()
+    changes: ChangesSettings = ChangesSettings()
+    imports: ImportSettings = ImportSettings()
+    ids: IdSettings = IdSettings()
+    queries: QuerySettings = QuerySettings()
+    server_timing: ServerTimingSettings = ServerTimingSettings()
+    profiling: ProfilingSettings = ProfilingSettings()
+    loop_monitor: LoopMonitorSettings = LoopMonitorSettings()
+    threadpool: ThreadpoolSettings = ThreadpoolSettings()
+    access_log: AccessLogSettings = AccessLogSettings()
+    memory_profiling: MemoryProfilingSettings = MemoryProfilingSettings()
 
 
 settings = Settings()
 
 TESTING = settings.testing
 
-RANDOM_ERROR_RATE = settings.random_error_rate
-
 POSTGRES = settings.postgres
 
+SHARDS = settings.shards
+
+REPLICAS = settings.replicas
+
+SERVER = settings.server
+
 TORTOISE_ORM = {
     "connections": {
-        "default": POSTGRES.url,
+        "default": POSTGRES.connection(SERVER.workers, listen=True),
+        **{
+            name: shard.connection(SERVER.workers, listen=True)
+            for name, shard in SHARDS.databases.items()
+        },
+        **{
+            name: replica.connection(SERVER.workers)
+            for database in (POSTGRES, *SHARDS.databases.values())
+            for name, replica in database.replicas.items()
+        },
     },
     "apps": {
         "models": {
             "models": ["app.models"],
         },
     },
+    "routers": ["app.sharding.ShardRouter"],
     "use_tz": True,
     "timezone": "UTC",
 }
@@ -79,3 +328,37 @@ TORTOISE_ORM = {
 JWT = settings.jwt
 
 AUTH = settings.auth
+
+PARTITIONS = settings.partitions
+
+MIGRATIONS = settings.migrations
+
+ADMISSION = settings.admission.split(SERVER.workers)
+
+RATE_LIMITS = settings.rate_limits
+
+FAULTS = settings.faults
+
+PURGE = settings.purge
+
+ACCESS_STATS = settings.access_stats
+
+CHANGES = settings.changes
+
+IMPORTS = settings.imports
+
+IDS = settings.ids
+
+QUERIES = settings.queries
+
+SERVER_TIMING = settings.server_timing
+
+PROFILING = settings.profiling
+
+LOOP_MONITOR = settings.loop_monitor
+
+THREADPOOL = settings.threadpool
+
+ACCESS_LOG = settings.access_log
+
+MEMORY_PROFILING = settings.memory_profiling
@@ -0,0 +1,168 @@
+"""
+Tenant sharding: organizations are spread over several databases, the `default`
+connection (`POSTGRES`) and the connections in `SHARDS.databases`.
+
+An organization and everything in it live in a single shard. Each request resolves
+the shard of the organization it acts for into `current_shard`, and `ShardRouter`
+sends every model query there, so code further down doesn't need to know about
+shards. Organization IDs are generated by the application, so they are unique across
+shards.
+
+Reads may go to a replica of the shard instead (see `app.replicas`).
+"""
+
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from tortoise.backends.base.client import BaseDBAsyncClient, TransactionContext
+from tortoise.connection import connections
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
+
+from . import settings
+from .models import Organization
+from .replicas import ReplicaPool, replica_reads
+from .settings import PostgresSettings
+
+ModelT = TypeVar("ModelT", bound=Model)
+
+DEFAULT_SHARD = "default"
+
+current_shard: ContextVar[str] = ContextVar("current_shard", default=DEFAULT_SHARD)
+
+
+def shard_settings() -> dict[str, PostgresSettings]:
+    """Return the database settings of every shard, by connection name."""
+    return {DEFAULT_SHARD: settings.POSTGRES, **settings.SHARDS.databases}
+
+
+replica_pools: dict[str, ReplicaPool] = {}
+
+
+def shard_replicas(shard: str) -> ReplicaPool:
+    if shard not in replica_pools:
+        replica_pools[shard] = ReplicaPool(list(shard_settings()[shard].replicas))
+    return replica_pools[shard]
+
+
+def read_connection(shard: str) -> str:
+    """
+    Return the name of the connection to read a shard from: a usable replica in
+    requests that may read from replicas, the shard itself otherwise.
+    """
+    if replica_reads.get():
+        return shard_replicas(shard).pick() or shard
+    return shard
+
+
+class ShardRouter:
+    """Tortoise router that sends every model query to the current shard."""
+
+    def db_for_read(self, model: type[Model]) -> str:  # noqa: ARG002
+        return read_connection(current_shard.get())
+
+    def db_for_write(self, model: type[Model]) -> str:  # noqa: ARG002
+        return current_shard.get()
+
+
+def shard_db() -> BaseDBAsyncClient:
+    """Return the connection of the current shard, e.g. for raw SQL."""
+    return connections.get(current_shard.get())
+
+
+def in_shard_transaction() -> TransactionContext[Any]:
+    """Run the block in a transaction of the current shard."""
+    return in_transaction(current_shard.get())
+
+
+@contextmanager
+def using_shard(shard: str) -> Iterator[None]:
+    """Send model queries in the block to `shard`."""
+    token = current_shard.set(shard)
+    try:
+        yield
+    finally:
+        current_shard.reset(token)
+
+
+async def find_in_shards(query: QuerySet[ModelT]) -> ModelT | None:
+    """
+    Return the first object of `query` from whichever shard has one, querying all
+    shards at once, and switch to that shard.
+
+    Only for lookups that don't know the organization, e.g. by a globally unique key.
+    """
+    names = list(shard_settings())
+    if len(names) == 1:
+        return await query.first()
+
+    found = await asyncio.gather(
+        *(
+            query.using_db(connections.get(read_connection(name))).first()
+            for name in names
+        )
+    )
+    for name, obj in zip(names, found, strict=True):
+        if obj is not None:
+            current_shard.set(name)
+            return obj
+    return None
+
+
+class ShardMap:
+    """
+    Map organizations to the shards they live in.
+
+    The shard of an organization is looked up in all shards the first time it is
+    needed, then cached for the lifetime of the process since organizations never
+    move. With a single shard there is nothing to look up.
+    """
+
+    def __init__(self) -> None:
+        self.shards: dict[int, str] = {}
+
+    async def find(self, organization_id: int) -> str | None:
+        """Return the shard of an organization, or `None` if it doesn't exist."""
+        names = list(shard_settings())
+        if len(names) == 1:
+            return names[0]
+
+        if organization_id not in self.shards:
+            found = await asyncio.gather(
+                *(
+                    Organization.filter(id=organization_id)
+                    .using_db(connections.get(name))
+                    .exists()
+                    for name in names
+                )
+            )
+            for name, exists in zip(names, found, strict=True):
+                if exists:
+                    self.shards[organization_id] = name
+        return self.shards.get(organization_id)
+
+    async def pick(self) -> str:
+        """Pick the shard for a new organization: the one with the fewest."""
+        names = list(shard_settings())
+        counts = await asyncio.gather(
+            *(
+                Organization.all().using_db(connections.get(name)).count()
+                for name in names
+            )
+        )
+        return names[counts.index(min(counts))]
+
+
+shard_map = ShardMap()
+
+
+async def use_organization_shard(organization_id: int) -> None:
+    """
+    Send model queries for the rest of the current task to the organization's shard
+    (the default one if it doesn't exist).
+    """
+    current_shard.set(await shard_map.find(organization_id) or DEFAULT_SHARD)
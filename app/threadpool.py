@@ -0,0 +1,38 @@
+"""
+Where sync endpoints run.
+
+FastAPI runs sync (`def`) endpoints in AnyIO's threadpool, which runs at most
+`THREADPOOL.size` of them at once. With `THREADPOOL.inline_sync_endpoints`, they run
+right on the event loop instead, saving the hop to a thread and the wait for a free
+one. That suits endpoints that are quick and never block, as ours are: while one
+runs, every other request waits.
+"""
+
+from collections.abc import Callable
+from functools import wraps
+from typing import Any
+
+from anyio.to_thread import current_default_thread_limiter
+from starlette.concurrency import run_in_threadpool
+
+from . import settings
+
+
+def configure_threadpool() -> None:
+    """Size the threadpool as configured; must be called from the event loop."""
+    current_default_thread_limiter().total_tokens = settings.THREADPOOL.size
+
+
+def sync_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Make the sync endpoint `call` async, running it inline or in the threadpool as
+    configured at the time.
+    """
+
+    @wraps(call)
+    async def endpoint(*args: Any, **kwargs: Any) -> Any:
+        if settings.THREADPOOL.inline_sync_endpoints:
+            return call(*args, **kwargs)
+        return await run_in_threadpool(call, *args, **kwargs)
+
+    return endpoint
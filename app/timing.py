@@ -0,0 +1,151 @@
+"""
+`Server-Timing` response header breaking down where the time of a request went.
+
+Sent for every request with `SERVER_TIMING.enabled`, or for requests of trusted
+clients, which send `SERVER_TIMING.token` in the `Server-Timing-Token` header. It
+lists, in milliseconds:
+
+- `auth`: verifying tokens;
+- `db`: running database queries (see `app.queries`), with their count;
+- `app`: running the endpoint, including its queries;
+- `serialize`: validating and encoding the endpoint's response;
+- `total`: handling the whole request, until the response starts.
+
+Requests it isn't sent for aren't timed.
+"""
+
+import hmac
+import time
+from collections.abc import Awaitable, Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import settings
+from .queries import QueryLog, count_queries
+from .threadpool import sync_endpoint
+
+TOKEN_HEADER = "Server-Timing-Token"  # noqa: S105
+
+
+@dataclass
+class ServerTiming:
+    start: float = field(default_factory=time.perf_counter)
+    # Seconds spent in each phase.
+    phases: dict[str, float] = field(default_factory=dict)
+    endpoint_end: float | None = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def header(self, queries: QueryLog) -> str:
+        entries = [
+            f'db;desc="{queries.count} queries";dur={queries.seconds * 1000:.2f}',
+            *(
+                f"{phase};dur={seconds * 1000:.2f}"
+                for phase, seconds in self.phases.items()
+            ),
+            f"total;dur={(time.perf_counter() - self.start) * 1000:.2f}",
+        ]
+        return ", ".join(entries)
+
+
+# Timing of the current request, if it is timed.
+server_timing: ContextVar[ServerTiming | None] = ContextVar(
+    "server_timing", default=None
+)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Count the time spent in the block towards the phase `name`."""
+    timing = server_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def timed_endpoint(call: Callable[..., Awaitable[Any]]) -> Callable[..., Any]:
+    """Count the time the async endpoint `call` takes towards the `app` phase."""
+
+    @wraps(call)
+    async def endpoint(*args: Any, **kwargs: Any) -> Any:
+        timing = server_timing.get()
+        if timing is None:
+            return await call(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            timing.endpoint_end = time.perf_counter()
+            timing.add("app", timing.endpoint_end - start)
+
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    Route timing its endpoint, to tell its time apart from serialization, and
+    running it where `app.threadpool` says if it is sync.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        call = self.endpoint
+        if not iscoroutinefunction(call):
+            call = sync_endpoint(call)
+        # Called by the request handler, while `endpoint` is left as declared for
+        # the OpenAPI schema.
+        self.dependant.call = timed_endpoint(call)
+        return super().get_route_handler()
+
+
+def is_timed(scope: Scope) -> bool:
+    if settings.SERVER_TIMING.enabled:
+        return True
+    token = settings.SERVER_TIMING.token
+    return bool(token) and hmac.compare_digest(
+        Headers(scope=scope).get(TOKEN_HEADER, "").encode(), token.encode()
+    )
+
+
+class ServerTimingMiddleware:
+    """Add the `Server-Timing` header to the responses of timed requests."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not is_timed(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timing = ServerTiming()
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                if timing.endpoint_end is not None:
+                    timing.add("serialize", time.perf_counter() - timing.endpoint_end)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.header(queries))
+            await send(message)
+
+        token = server_timing.set(timing)
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_with_header)
+        finally:
+            server_timing.reset(token)
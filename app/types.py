@@ -1,7 +1,13 @@
 from typing import Annotated
 
-from pydantic import Field
+from pydantic import Field, PlainSerializer
 
 Token = Annotated[str, Field(max_length=1024)]
 
-Id = Annotated[int, Field(ge=0, le=1e15)]
+# Sent as a string in JSON, as IDs go beyond 2**53 (see `app.ids`), past which
+# JavaScript numbers lose precision. Read from either a string or a number.
+Id = Annotated[
+    int,
+    Field(ge=0, le=2**63 - 1),
+    PlainSerializer(str, return_type=str, when_used="json"),
+]
@@ -61,11 +61,7 @@ def with_tortoise(
 
     @wraps(func)
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
-        await Tortoise.init(
-            db_url=settings.POSTGRES.url,
-            modules={"models": ["app.models"]},
-        )
-        await Tortoise.generate_schemas()
+        await Tortoise.init(config=settings.TORTOISE_ORM)
 
         try:
             return await func(*args, **kwargs)
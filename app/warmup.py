@@ -0,0 +1,108 @@
+"""
+Connection pool warm-up at startup.
+
+Connection pools start out with few connections, and each connection parses and plans
+a statement the first time it runs it. So that the first requests after a deploy
+don't pay for either, the lifespan opens `min_size` connections of every pool and
+prepares the statements of the hottest read endpoints on each of them, before the app
+reports ready.
+"""
+
+import asyncio
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from loguru import logger
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.connection import connections
+from tortoise.queryset import QuerySet
+
+from .models import Item, Organization, SharingLink, User
+from .pagination import page_query
+from .routers.items import active_q
+
+
+@dataclass
+class Readiness:
+    ready: bool = False
+
+
+readiness = Readiness()
+
+
+def hot_queries() -> list[QuerySet[Any]]:
+    """
+    Return queries built like those of the hottest read endpoints, so that they
+    compile to the same statements. The values in them don't matter.
+    """
+    users = User.filter(organization_id=0)
+    items = Item.filter(organization_id=0)
+    folders = items.filter(type=Item.Type.FOLDER)
+    links = SharingLink.filter(organization_id=0, item_id=0)
+    gets: list[QuerySet[Any]] = [
+        Organization.filter(id=0),
+        users.filter(id=0),
+        items.filter(id=0),
+        folders.filter(id=0),
+    ]
+    pages: list[QuerySet[Any]] = [
+        Organization.all(),
+        users,
+        items.filter(owner_id=0, parent_id=None),
+        items.filter(parent_id=0),
+        links,
+        links.filter(active_q()),
+    ]
+    return [
+        # As in `get_object_or_404`.
+        *(query.limit(2) for query in gets),
+        *(
+            page_query(query, cursor, 10, "id")
+            for query in pages
+            for cursor in (None, 0)
+        ),
+        # As in `resolve_sharing_link`.
+        SharingLink.filter(active_q(), token=UUID(int=0))
+        .select_related("item")
+        .limit(1),
+    ]
+
+
+async def warm_up_client(client: BaseDBAsyncClient, statements: list[str]) -> int:
+    """
+    Open `min_size` connections of a client's pool and prepare `statements` on each.
+
+    Returns the number of connections warmed up.
+    """
+    async with AsyncExitStack() as stack:
+        # The first connection creates the pool, which opens `min_size` connections.
+        raw_connections = [await stack.enter_async_context(client.acquire_connection())]
+        min_size = client._pool.get_min_size()
+        for _ in range(min_size - 1):
+            raw_connections.append(
+                await stack.enter_async_context(client.acquire_connection())
+            )
+        for statement in statements:
+            # Prepare into the statement cache that `fetch` and friends look up, the
+            # way asyncpg itself does for cached statements.
+            await asyncio.gather(
+                *(
+                    connection._prepare(statement, use_cache=True)
+                    for connection in raw_connections
+                )
+            )
+        return len(raw_connections)
+
+
+async def warm_up() -> None:
+    """Warm up every configured connection, then report ready."""
+    statements = [query.sql() for query in hot_queries()]
+    for name in connections.db_config:
+        count = await warm_up_client(connections.get(name), statements)
+        logger.info(
+            f"Warmed up {count} connections of {name} with "
+            f"{len(statements)} statements."
+        )
+    readiness.ready = True
@@ -0,0 +1,119 @@
+"""
+Benchmark sharing link access counting under contention on a single hot link.
+
+Compares one upsert per access (write-through) with the in-memory `AccessCounter`
+flushed periodically (write-behind).
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from typing import Annotated
+
+import typer
+from loguru import logger
+
+from app.access_stats import UPSERT_SQL, AccessCounter
+from app.models import Item, Organization, SharingLink, SharingLinkAccess, User
+from app.utils import with_tortoise
+
+
+async def hammer(
+    access: Callable[[], Awaitable[None]],
+    concurrency: int,
+    accesses: int,
+) -> float:
+    """Perform `accesses` calls of `access` spread over `concurrency` tasks."""
+
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            await access()
+
+    per_worker, remainder = divmod(accesses, concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(worker(per_worker + (i < remainder)) for i in range(concurrency))
+    )
+    return time.perf_counter() - start
+
+
+def report(name: str, accesses: int, elapsed: float) -> None:
+    logger.info(
+        f"{name}: {accesses} accesses in {elapsed:.2f}s "
+        f"({accesses / elapsed:,.0f} accesses/s)."
+    )
+
+
+@logger.catch
+@with_tortoise
+async def run(concurrency: int, accesses: int, flush_interval: float) -> None:
+    org = await Organization.create(name="bench-access-counter")
+    try:
+        user = await User.create(organization=org, username="bench", email="bench")
+        item = await Item.create(owner=user, name="bench", type=Item.Type.FILE)
+        link = await SharingLink.create(
+            item=item,
+            permission=SharingLink.Permission.READ,
+        )
+
+        async def write_through() -> None:
+            await SharingLinkAccess._meta.db.execute_query(
+                UPSERT_SQL,
+                [[link.id], [1], [datetime.now(tz=UTC)]],
+            )
+
+        report(
+            "Write-through",
+            accesses,
+            await hammer(write_through, concurrency, accesses),
+        )
+
+        counter = AccessCounter()
+
+        async def write_behind() -> None:
+            counter.record(link.id)
+            await asyncio.sleep(0)  # Yield like a real request would.
+
+        async def flush_periodically() -> None:
+            while True:
+                await asyncio.sleep(flush_interval)
+                await counter.flush()
+
+        flusher = asyncio.create_task(flush_periodically())
+        elapsed = await hammer(write_behind, concurrency, accesses)
+        flusher.cancel()
+        await counter.flush()
+        report("Write-behind", accesses, elapsed)
+
+        access = await SharingLinkAccess.get(sharing_link=link)
+        logger.info(f"Counted {access.access_count} of {2 * accesses} accesses.")
+    finally:
+        await org.delete()
+
+
+def main(
+    concurrency: Annotated[
+        int,
+        typer.Option(help="Number of concurrent clients hitting the link."),
+    ] = 50,
+    accesses: Annotated[
+        int,
+        typer.Option(help="Total number of accesses per strategy."),
+    ] = 20_000,
+    flush_interval: Annotated[
+        float,
+        typer.Option(help="Write-behind flush interval in seconds."),
+    ] = 1,
+) -> None:
+    asyncio.run(
+        run(
+            concurrency=concurrency,
+            accesses=accesses,
+            flush_interval=flush_interval,
+        )
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,112 @@
+"""
+Benchmark the bulk item tree import endpoint in rows per second.
+"""
+
+import asyncio
+import json
+import time
+from datetime import timedelta
+from random import Random
+from typing import Annotated, Any
+
+import typer
+from httpx import ASGITransport, AsyncClient
+from loguru import logger
+
+from app.auth import TokenType, create_jwt
+from app.main import app
+from app.models import Organization, User
+from app.random import generate_poisson_tree
+from app.utils import with_tortoise
+
+
+def build_tree(random: Random, node_count: int, rate: float) -> list[dict[str, Any]]:
+    tree = generate_poisson_tree(random, node_count, rate)
+    nodes: dict[int, dict[str, Any]] = {}
+    for node, children in sorted(tree.items()):
+        nodes[node] = (
+            {"name": f"{node}", "type": "folder", "children": []}
+            if children
+            else {"name": f"{node}.bin", "type": "file", "file_size": node}
+        )
+    for node, children in tree.items():
+        for child in children:
+            nodes[node]["children"].append(nodes[child])
+    return [nodes[0]] if nodes else []
+
+
+@logger.catch
+@with_tortoise
+async def run(node_count: int, rate: float, ndjson: bool, seed: int) -> None:
+    tree = build_tree(Random(seed), node_count, rate)  # noqa: S311
+    if ndjson:
+        lines: list[str] = []
+        stack: list[tuple[str | None, dict[str, Any]]] = [(None, node) for node in tree]
+        while stack:
+            parent_ref, node = stack.pop()
+            ref = str(len(lines))
+            row = {k: v for k, v in node.items() if k != "children"}
+            lines.append(json.dumps({"ref": ref, "parent_ref": parent_ref, **row}))
+            stack.extend((ref, child) for child in node.get("children", []))
+        content = "\n".join(lines).encode()
+        content_type = "application/x-ndjson"
+    else:
+        content = json.dumps(tree).encode()
+        content_type = "application/json"
+    logger.info(f"Payload: {node_count} nodes, {len(content) / 2**20:.1f} MiB.")
+
+    org = await Organization.create(name="bench-import")
+    try:
+        user = await User.create(organization=org, username="bench", email="bench")
+        token = create_jwt(
+            data={"sub": str(org.id)},
+            expires_in=timedelta(minutes=5),
+            type_=TokenType.ACCESS_TOKEN,
+        )
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://bench",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=600,
+        ) as client:
+            start = time.perf_counter()
+            response = await client.post(
+                f"/users/{user.id}/items/import",
+                content=content,
+                headers={"Content-Type": content_type},
+            )
+            elapsed = time.perf_counter() - start
+        response.raise_for_status()
+
+        imported = response.json()["imported"]
+        logger.info(
+            f"Imported {imported} items in {elapsed:.2f}s "
+            f"({imported / elapsed:,.0f} rows/s)."
+        )
+    finally:
+        await org.delete()
+
+
+def main(
+    node_count: Annotated[
+        int,
+        typer.Option(help="Number of nodes in the imported tree."),
+    ] = 200_000,
+    rate: Annotated[
+        float,
+        typer.Option(help="Poisson rate of node depths; larger is deeper."),
+    ] = 4,
+    ndjson: Annotated[
+        bool,
+        typer.Option(help="Send NDJSON instead of nested JSON."),
+    ] = False,
+    seed: Annotated[
+        int,
+        typer.Option(help="Specify the seed for RNG."),
+    ] = 0,
+) -> None:
+    asyncio.run(run(node_count=node_count, rate=rate, ndjson=ndjson, seed=seed))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,106 @@
+"""
+Benchmark the overhead of the middlewares per request, compared with no middleware:
+fault injection, also against the `BaseHTTPMiddleware` it replaced, metrics, server
+timing and the access log, whose lines are discarded.
+
+Requests are sent straight to the ASGI app, which answers with a plain response, so
+only the middleware is measured.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Annotated, Any
+
+import typer
+from loguru import logger
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import settings
+from app.access_log import AccessLogMiddleware, access_log, configure_sinks
+from app.faults import FaultInjectionMiddleware
+from app.metrics import MetricsMiddleware
+from app.timing import ServerTimingMiddleware
+
+SCOPE: Scope = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/",
+    "raw_path": b"/",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [],
+    "client": ("127.0.0.1", 12345),
+    "server": ("127.0.0.1", 8000),
+}
+
+
+async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    await PlainTextResponse("OK")(scope, receive, send)
+
+
+async def random_error(
+    request: Request,
+    call_next: Callable[[Request], Awaitable[Response]],
+) -> Response:
+    """The middleware replaced by `FaultInjectionMiddleware`."""
+    if random.random() < settings.FAULTS.error_rate:  # noqa: S311
+        return PlainTextResponse("Error", status_code=500)
+    return await call_next(request)
+
+
+async def time_requests(app: ASGIApp, requests: int) -> float:
+    """Return the average time per request to `app`, in microseconds."""
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+async def run(requests: int) -> None:
+    configure_sinks(lambda _: None)
+    access_log.start()
+
+    baseline = await time_requests(endpoint, requests)
+    logger.info(f"No middleware: {baseline:.1f}µs per request.")
+
+    apps: list[tuple[str, Any, float]] = [
+        ("BaseHTTPMiddleware", BaseHTTPMiddleware(endpoint, random_error), 0.001),
+        ("Fault injection, disabled", FaultInjectionMiddleware(endpoint), 0),
+        ("Fault injection, enabled", FaultInjectionMiddleware(endpoint), 0.001),
+        ("Metrics", MetricsMiddleware(endpoint), 0),
+        ("Server timing, disabled", ServerTimingMiddleware(endpoint), 0),
+        ("Access log", AccessLogMiddleware(endpoint), 0),
+    ]
+    for name, app, error_rate in apps:
+        settings.FAULTS.error_rate = error_rate
+        elapsed = await time_requests(app, requests)
+        logger.info(f"{name}: {elapsed - baseline:+.1f}µs per request.")
+    access_log.stop()
+
+
+def main(
+    requests: Annotated[
+        int,
+        typer.Option(help="Number of requests per scenario."),
+    ] = 100_000,
+) -> None:
+    asyncio.run(run(requests=requests))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,71 @@
+"""
+Benchmark the database part of app startup, as it was with the schema generated on
+every start and as it is now with migrations, applied beforehand or on startup.
+
+Run against a database that is already up to date, as on a restart.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from statistics import median
+from typing import Annotated
+
+import typer
+from loguru import logger
+from tortoise import Tortoise
+
+from app import settings
+from app.migrations import migrate_all
+from app.schema import generate_schemas
+from app.sharding import DEFAULT_SHARD
+
+
+async def skip() -> None:
+    pass
+
+
+async def start(step: Callable[[], Awaitable[None]]) -> tuple[float, float]:
+    """
+    Initialize the ORM, open the connection pool and run `step`; return the time
+    taken by all of it, and by `step` alone.
+    """
+    start = time.perf_counter()
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    try:
+        await Tortoise.get_connection(DEFAULT_SHARD).execute_query("SELECT 1")
+        step_start = time.perf_counter()
+        await step()
+        end = time.perf_counter()
+        return end - start, end - step_start
+    finally:
+        await Tortoise.close_connections()
+
+
+@logger.catch
+async def run(repeat: int) -> None:
+    # Bring the database up to date first.
+    await start(migrate_all)
+
+    steps: list[tuple[str, Callable[[], Awaitable[None]]]] = [
+        ("Generate schema", generate_schemas),
+        ("Migrate on startup", migrate_all),
+        ("Migrated beforehand", skip),
+    ]
+    for name, step in steps:
+        timings = [await start(step) for _ in range(repeat)]
+        total, alone = (median(times) * 1000 for times in zip(*timings, strict=True))
+        logger.info(f"{name}: {total:.1f}ms, of which {alone:.1f}ms for the schema.")
+
+
+def main(
+    repeat: Annotated[
+        int,
+        typer.Option(help="Number of startups to time per scenario."),
+    ] = 20,
+) -> None:
+    asyncio.run(run(repeat=repeat))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,128 @@
+"""
+Benchmark moving a large subtree to another user and deleting it.
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+from random import Random
+from typing import Annotated
+
+import typer
+from httpx import ASGITransport, AsyncClient
+from loguru import logger
+
+from app import settings
+from app.auth import TokenType, create_jwt
+from app.bulk import ItemRows, insert_items
+from app.ids import snowflake
+from app.main import app
+from app.models import Item, Organization, SharingLink, User
+from app.random import generate_poisson_tree
+from app.utils import with_tortoise
+
+
+async def create_tree(owner: User, node_count: int, rate: float, seed: int) -> int:
+    """Insert a random tree of `node_count` items and return the ID of its root."""
+    tree = generate_poisson_tree(Random(seed), node_count, rate)  # noqa: S311
+    # Breadth-first, so that every parent is inserted before its children.
+    order = [0]
+    for node in order:
+        order.extend(tree.get(node, []))
+    parents = {child: node for node, children in tree.items() for child in children}
+    ids = dict(zip(order, snowflake.next_ids(len(order)), strict=True))
+    rows = ItemRows(
+        ids=[ids[node] for node in order],
+        parent_ids=[ids[parents[node]] if node in parents else None for node in order],
+        names=[f"{node}" if tree.get(node) else f"{node}.bin" for node in order],
+        types=[
+            Item.Type.FOLDER if tree.get(node) else Item.Type.FILE for node in order
+        ],
+        file_sizes=[0 if tree.get(node) else node for node in order],
+    )
+    await insert_items(
+        owner.organization_id,  # type: ignore[attr-defined]
+        owner.id,
+        rows,
+        settings.IMPORTS.batch_size,
+    )
+    return ids[0]
+
+
+@logger.catch
+@with_tortoise
+async def run(node_count: int, rate: float, link_every: int, seed: int) -> None:
+    org = await Organization.create(name="bench-subtree")
+    try:
+        user = await User.create(organization=org, username="bench", email="bench")
+        other = await User.create(organization=org, username="other", email="other")
+        root_id = await create_tree(user, node_count, rate, seed)
+        files = Item.filter(owner=user, type=Item.Type.FILE)
+        await SharingLink.bulk_create(
+            [
+                SharingLink(
+                    organization_id=org.id,
+                    item_id=item_id,
+                    permission=SharingLink.Permission.READ,
+                )
+                for item_id in (await files.values_list("id", flat=True))[::link_every]
+            ]
+        )
+        logger.info(f"Created a {node_count}-node tree.")
+
+        token = create_jwt(
+            data={"sub": str(org.id)},
+            expires_in=timedelta(minutes=5),
+            type_=TokenType.ACCESS_TOKEN,
+        )
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://bench",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=600,
+        ) as client:
+            start = time.perf_counter()
+            response = await client.post(
+                f"/items/{root_id}/move",
+                json={"owner_id": other.id},
+            )
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            logger.info(f"Moved {node_count} items to another user in {elapsed:.2f}s.")
+
+            start = time.perf_counter()
+            response = await client.delete(f"/items/{root_id}")
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            deleted = response.json()
+            logger.info(
+                f"Deleted {deleted['items']} items and {deleted['sharing_links']} "
+                f"sharing links in {elapsed:.2f}s."
+            )
+    finally:
+        await org.delete()
+
+
+def main(
+    node_count: Annotated[
+        int,
+        typer.Option(help="Number of nodes in the subtree."),
+    ] = 100_000,
+    rate: Annotated[
+        float,
+        typer.Option(help="Poisson rate of node depths; larger is deeper."),
+    ] = 4,
+    link_every: Annotated[
+        int,
+        typer.Option(help="Create a sharing link for every n-th file."),
+    ] = 10,
+    seed: Annotated[
+        int,
+        typer.Option(help="Specify the seed for RNG."),
+    ] = 0,
+) -> None:
+    asyncio.run(run(node_count=node_count, rate=rate, link_every=link_every, seed=seed))
+
+
+if __name__ == "__main__":
+    typer.run(main)
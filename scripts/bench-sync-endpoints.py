@@ -0,0 +1,82 @@
+"""
+Benchmark the throughput of the sync `/token` and `/me` endpoints, run in the
+threadpool and inline on the event loop, under concurrent requests.
+
+Requests are sent straight to the ASGI app, with rate limits and fault injection
+off. Neither endpoint queries the database, so none is needed.
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+from typing import Annotated
+
+import typer
+from httpx import ASGITransport, AsyncClient
+from loguru import logger
+
+from app import settings
+from app.auth import TokenType, create_jwt
+from app.main import app
+from app.threadpool import configure_threadpool
+
+
+async def throughput(
+    client: AsyncClient,
+    send: str,
+    requests: int,
+    concurrency: int,
+) -> float:
+    """Send `requests` requests with `concurrency` at once; return requests/s."""
+    auth_code = create_jwt({"sub": "1"}, timedelta(minutes=5), TokenType.AUTH_CODE)
+    access_token = create_jwt(
+        {"sub": "1"}, timedelta(minutes=5), TokenType.ACCESS_TOKEN
+    )
+
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            if send == "/token":
+                response = await client.post(
+                    "/token",
+                    data={"grant_type": "authorization_code", "code": auth_code},
+                )
+            else:
+                response = await client.get(
+                    "/me", headers={"Authorization": f"Bearer {access_token}"}
+                )
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return requests // concurrency * concurrency / (time.perf_counter() - start)
+
+
+@logger.catch
+async def run(requests: int, concurrency: int) -> None:
+    settings.RATE_LIMITS.enabled = False
+    settings.FAULTS.error_rate = 0
+    configure_threadpool()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        for endpoint in ("/token", "/me"):
+            for mode, inline in [("threadpool", False), ("inline", True)]:
+                settings.THREADPOOL.inline_sync_endpoints = inline
+                rate = await throughput(client, endpoint, requests, concurrency)
+                logger.info(f"{endpoint}, {mode}: {rate:,.0f} requests/s.")
+
+
+def main(
+    requests: Annotated[
+        int,
+        typer.Option(help="Number of requests per scenario."),
+    ] = 10_000,
+    concurrency: Annotated[
+        int,
+        typer.Option(help="Number of requests sent at once."),
+    ] = 20,
+) -> None:
+    asyncio.run(run(requests=requests, concurrency=concurrency))
+
+
+if __name__ == "__main__":
+    typer.run(main)
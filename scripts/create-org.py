@@ -1,19 +1,21 @@
 import asyncio
 import os
-from datetime import datetime
+from datetime import UTC, datetime
 from typing import Annotated
+from uuid import UUID
 
 import typer
 from faker import Faker, generator
 from loguru import logger
-from tortoise.transactions import atomic
 
+from app.bulk import SharingLinkRows, insert_sharing_links
 from app.models import Item, Organization, SharingLink, User
 from app.random import (
     allocate_by_dirichlet,
     generate_poisson_tree,
     sample_lambdas_by_node_count,
 )
+from app.sharding import in_shard_transaction, shard_map, using_shard
 from app.utils import with_tortoise
 
 FAKER_LOCALES = [
@@ -39,13 +41,28 @@ BULK_BATCH_SIZE = 1000
 
 @logger.catch
 @with_tortoise
-@atomic()
 async def run(
     name: str,
     user_count: int,
     items_count: int,
     sharing_link_count: int,
     seed: int | None,
+) -> None:
+    shard = await shard_map.pick()
+    logger.info(f"Creating new organization in shard {shard}.")
+    with using_shard(shard):
+        async with in_shard_transaction():
+            await create_organization(
+                name, user_count, items_count, sharing_link_count, seed
+            )
+
+
+async def create_organization(
+    name: str,
+    user_count: int,
+    items_count: int,
+    sharing_link_count: int,
+    seed: int | None,
 ) -> None:
     if seed is None:
         seed = int.from_bytes(os.urandom(8))
@@ -95,30 +112,34 @@ async def run(
             user_items_count,
             rate=item_tree_rate,
         )
+        # Item IDs are known before inserting, so the whole tree is built up front
+        # and inserted in bulk, parents first.
         parent_lookup: dict[int, int] = {}
         node_to_item_id: dict[int, int] = {}
+        items: list[Item] = []
         for node, children in sorted(tree.items()):
             for child in children:
                 parent_lookup[child] = node
             parent = parent_lookup.get(node, -1)
 
             is_file = not children
-            item = await Item.create(
+            item = Item(
+                organization_id=org.id,
                 owner_id=user_id,
                 parent_id=node_to_item_id.get(parent),
                 name=f"{node}-{fake.file_name() if is_file else fake.slug()}",
                 type=Item.Type.FILE if is_file else Item.Type.FOLDER,
                 file_size=fake.random_int(max=2**30) if is_file else 0,
             )
-
             node_to_item_id[node] = item.id
-            del item
+            items.append(item)
+        await Item.bulk_create(items, batch_size=BULK_BATCH_SIZE)
 
         logger.info(f"{user_items_count} items created for user {user_id}.")
 
     logger.info("Creating sharing links.")
     item_ids = (
-        await Item.filter(owner__organization_id=org.id)
+        await Item.filter(organization_id=org.id)
         .order_by("id")
         .values_list("id", flat=True)
     )
@@ -128,32 +149,23 @@ async def run(
         total=sharing_link_count,
         concentration=SHARING_LINK_ALPHA,
     )
+    rows = SharingLinkRows()
     for item_id, item_sharing_link_count in zip(
         item_ids,
         sharing_links_per_item,
         strict=True,
     ):
-        if not item_sharing_link_count:
-            continue
-        await SharingLink.bulk_create(
-            [
-                SharingLink(
-                    item_id=item_id,
-                    token=fake.uuid4(),
-                    permission=fake.random_element(SharingLink.Permission),
-                    expire_time=(
-                        fake.date_time(end_datetime=datetime(2099, 1, 1))
-                        if fake.boolean()
-                        else None
-                    ),
-                )
-                for _ in range(item_sharing_link_count)
-            ],
-            batch_size=BULK_BATCH_SIZE,
-        )
-        logger.info(
-            f"{item_sharing_link_count} sharing links created for item {item_id}."
-        )
+        for _ in range(item_sharing_link_count):
+            rows.item_ids.append(item_id)  # type: ignore[arg-type]
+            rows.tokens.append(UUID(fake.uuid4()))
+            rows.permissions.append(fake.random_element(SharingLink.Permission))
+            rows.expire_times.append(
+                fake.date_time(end_datetime=datetime(2099, 1, 1), tzinfo=UTC)
+                if fake.boolean()
+                else None
+            )
+    await insert_sharing_links(org.id, rows, batch_size=BULK_BATCH_SIZE)
+    logger.info(f"{len(rows)} sharing links created.")
 
 
 def main(
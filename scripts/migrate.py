@@ -0,0 +1,37 @@
+"""
+Apply the pending schema migrations (see `app.migrations`) to every shard, or to the
+given one.
+"""
+
+import asyncio
+from typing import Annotated
+
+import typer
+from loguru import logger
+
+from app.migrations import migrate, migrate_all
+from app.utils import with_tortoise
+
+
+# Re-raised so that the command fails, and with it the deploys waiting on it.
+@logger.catch(reraise=True)
+@with_tortoise
+async def run(shard: str | None) -> None:
+    if shard is None:
+        await migrate_all()
+    else:
+        await migrate(shard)
+    logger.info("Migrations applied.")
+
+
+def main(
+    shard: Annotated[
+        str | None,
+        typer.Option(help="Connection name of the shard to migrate."),
+    ] = None,
+) -> None:
+    asyncio.run(run(shard=shard))
+
+
+if __name__ == "__main__":
+    typer.run(main)
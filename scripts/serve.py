@@ -0,0 +1,109 @@
+"""
+Serve the app in production, in `SERVER.workers` processes sharing the listening
+socket, each on uvloop and httptools.
+
+Every worker opens its share of the connection pool budget of each database (see
+`PostgresSettings.connection`), so adding workers doesn't add connections, and gets
+its own snowflake worker ID, `IDS.worker_id` plus its number.
+
+A worker is recycled after about `--max-requests` requests: it stops accepting new
+ones, finishes those in flight and exits, and a fresh worker takes its place. Workers
+that die are replaced too. On SIGTERM or SIGINT, all workers shut down gracefully.
+"""
+
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+from multiprocessing.process import BaseProcess
+from typing import Annotated, Any
+
+import typer
+import uvicorn
+from loguru import logger
+
+from app import settings
+
+# Workers import the app from scratch, with the settings their environment gives.
+context = multiprocessing.get_context("spawn")
+
+
+def serve(config: uvicorn.Config, sockets: list[socket.socket]) -> None:
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+def main(
+    workers: Annotated[
+        int,
+        typer.Option(help="Number of worker processes."),
+    ] = settings.SERVER.workers,
+    host: Annotated[str, typer.Option(help="Address to listen on.")] = "0.0.0.0",  # noqa: S104
+    port: Annotated[int, typer.Option(help="Port to listen on.")] = 8000,
+    max_requests: Annotated[
+        int,
+        typer.Option(help="Requests after which a worker is recycled; 0 never."),
+    ] = 0,
+    max_requests_jitter: Annotated[
+        int,
+        typer.Option(help="Up to how many more, so that workers don't all recycle."),
+    ] = 0,
+    graceful_timeout: Annotated[
+        int,
+        typer.Option(help="Seconds to let workers finish requests when stopping."),
+    ] = 30,
+) -> None:
+    bind = uvicorn.Config("app.main:app", host=host, port=port)
+    sockets = [bind.bind_socket()]
+    stopping = threading.Event()
+
+    def start(number: int) -> BaseProcess:
+        limit = max_requests and max_requests + random.randint(  # noqa: S311
+            0, max_requests_jitter
+        )
+        config = uvicorn.Config(
+            "app.main:app",
+            loop="uvloop",
+            http="httptools",
+            limit_max_requests=limit or None,
+            timeout_graceful_shutdown=graceful_timeout,
+        )
+        # Inherited by the worker, which reads its settings from it.
+        os.environ["SERVER__WORKERS"] = str(workers)
+        os.environ["IDS__WORKER_ID"] = str(settings.IDS.worker_id + number)
+        process = context.Process(
+            target=serve,
+            args=(config, sockets),
+            name=f"worker-{number}",
+        )
+        process.start()
+        logger.info(f"Started worker {number} (pid {process.pid}).")
+        return process
+
+    def stop(*_: Any) -> None:
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = {number: start(number) for number in range(workers)}
+    logger.info(f"Listening on http://{host}:{port} with {workers} workers.")
+    while not stopping.wait(0.5):
+        for number, process in processes.items():
+            if not process.is_alive():
+                code = process.exitcode
+                logger.info(f"Worker {number} exited with code {code}, replacing it.")
+                processes[number] = start(number)
+
+    logger.info("Shutting down workers.")
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(graceful_timeout)
+        if process.is_alive():
+            process.kill()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -6,6 +6,7 @@ transactions, and providing an HTTPX client.
 import contextlib
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from typing import Any
 
 import asyncpg  # type: ignore[import-untyped]
 import pytest
@@ -14,13 +15,33 @@ from asyncpg import Connection
 from httpx import ASGITransport, AsyncClient
 from pytest_mock import MockerFixture
 from tortoise import Tortoise
+from tortoise.connection import connections
 from tortoise.transactions import in_transaction
+from tortoise.utils import get_schema_sql
 
-from app import settings
+from app import settings, sharding
 from app.main import app
+from app.schema import generate_schemas
+from app.settings import PostgresSettings
+from app.sharding import ShardRouter, shard_map
 
 postgres_settings = settings.POSTGRES
 
+# The test database is partitioned, so that queries are checked against the stricter
+# schema.
+TEST_PARTITIONS = 4
+
+# Sharded tests put the second shard in another database of the same server.
+TEST_SHARD = "shard_1"
+test_shard_settings = postgres_settings.model_copy(update={"database": TEST_SHARD})
+
+# Replicated tests stand in another database of the same server for a replica of the
+# default one. Nothing is replicated, so tests write to either as needed.
+TEST_REPLICA = "replica_1"
+test_replica_settings = postgres_settings.model_copy(update={"database": TEST_REPLICA})
+
+ROUTERS: list[str | type] = [ShardRouter]
+
 
 @asynccontextmanager
 async def admin_conn() -> AsyncGenerator[Connection]:
@@ -32,10 +53,8 @@ async def admin_conn() -> AsyncGenerator[Connection]:
         await conn.close()
 
 
-@pytest_asyncio.fixture(scope="session", loop_scope="session")
-async def init_test_db() -> AsyncGenerator[None]:
-    test_database = postgres_settings.test_database
-
+@asynccontextmanager
+async def create_test_database(test_database: str) -> AsyncGenerator[None]:
     async with admin_conn() as conn:
         await conn.execute(f'DROP DATABASE IF EXISTS "{test_database}";')
         await conn.execute(f'CREATE DATABASE "{test_database}";')
@@ -46,13 +65,39 @@ async def init_test_db() -> AsyncGenerator[None]:
         await conn.execute(f'DROP DATABASE IF EXISTS "{test_database}";')
 
 
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def init_test_db() -> AsyncGenerator[None]:
+    async with create_test_database(postgres_settings.test_database):
+        yield
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def init_test_shard_db() -> AsyncGenerator[None]:
+    async with create_test_database(test_shard_settings.test_database):
+        yield
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def init_test_replica_db() -> AsyncGenerator[None]:
+    async with create_test_database(test_replica_settings.test_database):
+        yield
+
+
+def tortoise_config(**databases: PostgresSettings) -> dict[str, Any]:
+    """Tortoise config connecting to the test databases of `databases`, by name."""
+    return {
+        "connections": {
+            name: database.test_connection for name, database in databases.items()
+        },
+        "apps": {"models": {"models": ["app.models"]}},
+        "routers": ROUTERS,
+    }
+
+
 @pytest_asyncio.fixture
 async def init_tortoise(init_test_db: None) -> AsyncGenerator[None]:  # noqa: ARG001
-    await Tortoise.init(
-        db_url=postgres_settings.test_url,
-        modules={"models": ["app.models"]},
-    )
-    await Tortoise.generate_schemas()
+    await Tortoise.init(config=tortoise_config(default=postgres_settings))
+    await generate_schemas(partitions=TEST_PARTITIONS)
 
     yield
 
@@ -65,18 +110,75 @@ class Rollback(Exception):
 
 @pytest_asyncio.fixture
 async def db(init_tortoise: None) -> AsyncGenerator[None]:  # noqa: ARG001
+    await Tortoise.init(config=tortoise_config(default=postgres_settings))
+    await generate_schemas(partitions=TEST_PARTITIONS)
+
+    with contextlib.suppress(Rollback):
+        async with in_transaction():
+            yield
+            raise Rollback
+
+    await Tortoise.close_connections()
+
+
+@pytest_asyncio.fixture
+async def sharded_db(
+    mocker: MockerFixture,
+    init_test_db: None,  # noqa: ARG001
+    init_test_shard_db: None,  # noqa: ARG001
+) -> AsyncGenerator[None]:
+    """Like `db`, with a second shard named `TEST_SHARD`."""
+    mocker.patch.object(settings.SHARDS, "databases", {TEST_SHARD: test_shard_settings})
+    mocker.patch.object(shard_map, "shards", {})
     await Tortoise.init(
-        db_url=postgres_settings.test_url,
-        modules={"models": ["app.models"]},
+        config=tortoise_config(
+            default=postgres_settings, **{TEST_SHARD: test_shard_settings}
+        )
     )
-    await Tortoise.generate_schemas()
+    await generate_schemas(partitions=TEST_PARTITIONS)
 
     with contextlib.suppress(Rollback):
-        async with in_transaction():
+        async with in_transaction("default"), in_transaction(TEST_SHARD):
+            yield
+            raise Rollback
+
+    await Tortoise.close_connections()
+    # Tortoise keeps the configuration of closed connections and merges it into
+    # later ones, which would then need a connection name for every transaction.
+    connections.db_config.pop(TEST_SHARD)
+
+
+@pytest_asyncio.fixture
+async def replicated_db(
+    mocker: MockerFixture,
+    init_test_db: None,  # noqa: ARG001
+    init_test_replica_db: None,  # noqa: ARG001
+) -> AsyncGenerator[None]:
+    """
+    Like `db`, with a replica of the default database named `TEST_REPLICA`, which
+    starts out with no lag.
+    """
+    mocker.patch.object(
+        settings.POSTGRES, "replicas", {TEST_REPLICA: test_replica_settings}
+    )
+    mocker.patch.object(sharding, "replica_pools", {})
+    await Tortoise.init(
+        config=tortoise_config(
+            default=postgres_settings, **{TEST_REPLICA: test_replica_settings}
+        )
+    )
+    await generate_schemas(partitions=TEST_PARTITIONS)
+    replica = connections.get(TEST_REPLICA)
+    await replica.execute_script(get_schema_sql(connections.get("default"), safe=True))
+    sharding.shard_replicas("default").lags[TEST_REPLICA] = 0
+
+    with contextlib.suppress(Rollback):
+        async with in_transaction("default"), in_transaction(TEST_REPLICA):
             yield
             raise Rollback
 
     await Tortoise.close_connections()
+    connections.db_config.pop(TEST_REPLICA)
 
 
 @pytest_asyncio.fixture
@@ -89,5 +191,5 @@ async def client() -> AsyncGenerator[AsyncClient]:
 
 
 @pytest.fixture(autouse=True)
-def disable_random_error(mocker: MockerFixture) -> None:
-    mocker.patch.object(settings, "RANDOM_ERROR_RATE", 0)
+def disable_faults(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.FAULTS, "error_rate", 0)
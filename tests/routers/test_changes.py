@@ -0,0 +1,268 @@
+import json
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import asyncpg  # type: ignore[import-untyped]
+import pytest
+from faker import Faker
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app import settings
+from app.auth import RequestSource
+from app.changes import change_hub
+from app.jobs import purge_expired_sharing_links
+from app.models import Item, Organization, SharingLink, Tombstone, User
+from app.routers.changes import ChangeParam, list_changes, stream_changes
+from tests.shorthands import any_dict, any_str, uses_db
+
+url = "/changes/"
+
+
+@pytest.fixture(autouse=True)
+def no_safety_lag(mocker: MockerFixture) -> None:
+    # Changes made by the tests are read right away.
+    mocker.patch.object(settings.CHANGES, "safety_lag_seconds", 0)
+
+
+@pytest.fixture
+async def user(faker: Faker, organization: Organization) -> User:
+    return await User.create(
+        organization=organization,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+
+
+@pytest.fixture
+async def file(faker: Faker, user: User) -> Item:
+    return await Item.create(
+        owner=user,
+        parent=None,
+        name=faker.file_name(),
+        type=Item.Type.FILE,
+    )
+
+
+@pytest.fixture
+async def sharing_link(file: Item) -> SharingLink:
+    return await SharingLink.create(item=file, permission=SharingLink.Permission.READ)
+
+
+@pytest.fixture
+async def user_other_org(faker: Faker) -> User:
+    other_org = await Organization.create(name=faker.company())
+    return await User.create(
+        organization=other_org,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+
+
+async def list_all_changes(
+    client: AsyncClient,
+    cursor: str | None = None,
+    limit: int = 100,
+) -> tuple[list[dict[str, Any]], str]:
+    changes: list[dict[str, Any]] = []
+    params: dict[str, Any] = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    while True:
+        response = await client.get(url, params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= limit
+        changes.extend(data["items"])
+        params["cursor"] = data["next_cursor"]
+        if not data["has_more"]:
+            return changes, params["cursor"]
+
+
+def summarize(changes: list[dict[str, Any]]) -> list[tuple[str, str, bool]]:
+    return [(change["kind"], change["id"], change["deleted"]) for change in changes]
+
+
+@uses_db
+class TestListChanges:
+    async def test_smoke(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        file: Item,
+        sharing_link: SharingLink,
+        user_other_org: User,  # noqa: ARG002
+    ) -> None:
+        response = await authed_client.get(url)
+        assert response.status_code == 200
+        data = response.json()
+        assert data == {
+            "items": [
+                {
+                    "kind": "user",
+                    "id": str(user.id),
+                    "update_time": any_str,
+                    "deleted": False,
+                    "data": any_dict,
+                },
+                {
+                    "kind": "item",
+                    "id": str(file.id),
+                    "update_time": any_str,
+                    "deleted": False,
+                    "data": any_dict,
+                },
+                {
+                    "kind": "sharing_link",
+                    "id": str(sharing_link.id),
+                    "update_time": any_str,
+                    "deleted": False,
+                    "data": any_dict,
+                },
+            ],
+            "next_cursor": any_str,
+            "has_more": False,
+        }
+        assert data["items"][0]["data"]["username"] == user.username
+        assert data["items"][1]["data"]["name"] == file.name
+        assert data["items"][2]["data"]["token"] == str(sharing_link.token)
+
+        response = await authed_client.get(url, params={"cursor": data["next_cursor"]})
+        assert response.status_code == 200
+        assert response.json() == {
+            "items": [],
+            "next_cursor": data["next_cursor"],
+            "has_more": False,
+        }
+
+    @pytest.mark.parametrize("limit", [1, 2, 3])
+    async def test_pagination(
+        self,
+        faker: Faker,
+        authed_client: AsyncClient,
+        user: User,
+        file: Item,
+        limit: int,
+    ) -> None:
+        links = [
+            await SharingLink.create(item=file, permission=SharingLink.Permission.READ)
+            for _ in range(3)
+        ]
+        folder = await Item.create(
+            owner=user,
+            parent=None,
+            name=faker.word(),
+            type=Item.Type.FOLDER,
+        )
+
+        changes, _ = await list_all_changes(authed_client, limit=limit)
+        assert summarize(changes) == [
+            ("user", str(user.id), False),
+            ("item", str(file.id), False),
+            *[("sharing_link", str(link.id), False) for link in links],
+            ("item", str(folder.id), False),
+        ]
+
+    async def test_updates_and_deletions(
+        self,
+        authed_client: AsyncClient,
+        user: User,  # noqa: ARG002
+        file: Item,
+        sharing_link: SharingLink,
+    ) -> None:
+        _, cursor = await list_all_changes(authed_client)
+
+        sharing_link.expire_time = datetime.now(tz=UTC) - timedelta(minutes=1)
+        await sharing_link.save()
+        file.name = "renamed"
+        await file.save()
+        changes, cursor = await list_all_changes(authed_client, cursor)
+        assert summarize(changes) == [
+            ("sharing_link", str(sharing_link.id), False),
+            ("item", str(file.id), False),
+        ]
+        assert changes[1]["data"]["name"] == "renamed"
+
+        await purge_expired_sharing_links(batch_size=10)
+        changes, cursor = await list_all_changes(authed_client, cursor)
+        assert changes == [
+            {
+                "kind": "sharing_link",
+                "id": str(sharing_link.id),
+                "update_time": any_str,
+                "deleted": True,
+                "data": None,
+            },
+        ]
+
+        changes, _ = await list_all_changes(authed_client, cursor)
+        assert changes == []
+
+    @pytest.mark.parametrize("cursor", ["foobar", "e30", "eyJ0b21ic3RvbmVzIjoxfQ=="])
+    async def test_cursor_invalid(
+        self,
+        authed_client: AsyncClient,
+        cursor: str,
+    ) -> None:
+        response = await authed_client.get(url, params={"cursor": cursor})
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("limit", ["0", "1001", "foobar"])
+    async def test_limit_invalid(self, authed_client: AsyncClient, limit: str) -> None:
+        response = await authed_client.get(url, params={"limit": limit})
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("init_tortoise")
+class TestListChangesConcurrently:
+    async def test_open_transaction(self, faker: Faker) -> None:
+        organization = await Organization.create(name=faker.company())
+        rs = RequestSource(organization_id=organization.id)
+        conn = await asyncpg.connect(settings.POSTGRES.test_url)
+        try:
+            # E.g. a long import, whose rows are stamped with its start time.
+            async with conn.transaction():
+                await conn.execute(
+                    "INSERT INTO tombstone "
+                    "(create_time, update_time, organization_id, kind, object_id) "
+                    "VALUES (now(), now(), $1, 'item', 1)",
+                    organization.id,
+                )
+                await Tombstone.create(
+                    organization=organization,
+                    kind=Tombstone.Kind.ITEM,
+                    object_id=2,
+                )
+                page = await list_changes(rs, ChangeParam(cursor=None, limit=100))
+                assert page.items == []
+
+            page = await list_changes(
+                rs, ChangeParam(cursor=page.next_cursor, limit=100)
+            )
+            assert [change.id for change in page.items] == [1, 2]
+        finally:
+            await conn.close()
+            await organization.delete()
+
+
+class TestStreamChanges:
+    async def test_smoke(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings.CHANGES, "keepalive_seconds", 0.01)
+        response = await stream_changes(RequestSource(organization_id=1))
+        assert response.media_type == "text/event-stream"
+
+        events = aiter(response.body_iterator)
+        assert await anext(events) == ": connected\n\n"
+        assert change_hub.subscribers.keys() == {1}
+        assert await anext(events) == ": keepalive\n\n"
+
+        payload = json.dumps({"organization_id": 1, "kind": "item"})
+        change_hub.dispatch(None, 0, settings.CHANGES.channel, payload)
+        assert await anext(events) == 'event: change\ndata: {"kind": "item"}\n\n'
+
+        await events.aclose()  # type: ignore[attr-defined]
+        assert change_hub.subscribers == {}
+
+    async def test_unauthorized(self, client: AsyncClient) -> None:
+        response = await client.get("/changes/stream")
+        assert response.status_code == 401
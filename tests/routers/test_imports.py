@@ -0,0 +1,339 @@
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import asyncpg  # type: ignore[import-untyped]
+import pytest
+from faker import Faker
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.exceptions import IntegrityError
+
+from app import settings
+from app.models import Item, Organization, User
+from app.routers.imports import MAX_JSON_DEPTH
+from tests.shorthands import any_list, uses_db
+
+
+@pytest.fixture
+async def user(faker: Faker, organization: Organization) -> User:
+    return await User.create(
+        organization=organization,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+
+
+@pytest.fixture
+async def user_other_org(faker: Faker) -> User:
+    other_org = await Organization.create(name=faker.company())
+    return await User.create(
+        organization=other_org,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+
+
+@pytest.fixture
+async def folder(faker: Faker, user: User) -> Item:
+    return await Item.create(
+        owner=user,
+        parent=None,
+        name=faker.word(),
+        type=Item.Type.FOLDER,
+    )
+
+
+tree: list[dict[str, Any]] = [
+    {
+        "name": "docs",
+        "type": "folder",
+        "children": [
+            {"name": "a.txt", "type": "file", "file_size": 10},
+            {
+                "name": "drafts",
+                "type": "folder",
+                "children": [{"name": "b.txt", "type": "file", "file_size": 20}],
+            },
+        ],
+    },
+    {"name": "c.txt", "type": "file", "file_size": 30},
+]
+
+rows: list[dict[str, Any]] = [
+    {"ref": "1", "name": "docs", "type": "folder"},
+    {"ref": "2", "parent_ref": "1", "name": "a.txt", "type": "file", "file_size": 10},
+    {"ref": "3", "parent_ref": "1", "name": "drafts", "type": "folder"},
+    {"ref": "4", "parent_ref": "3", "name": "b.txt", "type": "file", "file_size": 20},
+    {"ref": "5", "name": "c.txt", "type": "file", "file_size": 30},
+]
+
+
+def url(user: User) -> str:
+    return f"/users/{user.id}/items/import"
+
+
+def ndjson(lines: list[dict[str, Any]]) -> str:
+    return "\n".join(json.dumps(line) for line in lines) + "\n"
+
+
+def nested(depth: int) -> list[dict[str, Any]]:
+    """A tree of `depth` folders, each in the one before."""
+    tree: list[dict[str, Any]] = []
+    for level in range(depth):
+        tree = [{"name": f"{level}", "type": "folder", "children": tree}]
+    return tree
+
+
+async def dump_tree(user: User, parent: Item | None = None) -> list[dict[str, Any]]:
+    children = await Item.filter(owner=user, parent=parent).order_by("id")
+    return [
+        {
+            "name": child.name,
+            "type": child.type,
+            **({"file_size": child.file_size} if child.type == Item.Type.FILE else {}),
+            **(
+                {"children": await dump_tree(user, child)}
+                if child.type == Item.Type.FOLDER
+                else {}
+            ),
+        }
+        for child in children
+    ]
+
+
+@uses_db
+class TestImportItems:
+    async def test_json(self, authed_client: AsyncClient, user: User) -> None:
+        response = await authed_client.post(url(user), json=tree)
+        assert response.status_code == 201
+        data = response.json()
+        assert data == {"imported": 5, "root_ids": any_list}
+
+        roots = await Item.filter(owner=user, parent=None).order_by("id")
+        assert data["root_ids"] == [str(root.id) for root in roots]
+        assert await dump_tree(user) == tree
+
+    async def test_ndjson(self, authed_client: AsyncClient, user: User) -> None:
+        response = await authed_client.post(
+            url(user),
+            content=ndjson(rows) + "\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 201
+        assert response.json() == {"imported": 5, "root_ids": any_list}
+        assert await dump_tree(user) == tree
+
+    async def test_into_folder(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        folder: Item,
+    ) -> None:
+        response = await authed_client.post(
+            url(user),
+            params={"parent_id": folder.id},
+            json=tree,
+        )
+        assert response.status_code == 201
+        assert await dump_tree(user, folder) == tree
+
+    async def test_batches(
+        self,
+        mocker: MockerFixture,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        mocker.patch.object(settings.IMPORTS, "batch_size", 2)
+        response = await authed_client.post(url(user), json=tree)
+        assert response.status_code == 201
+        assert await dump_tree(user) == tree
+
+    async def test_empty(self, authed_client: AsyncClient, user: User) -> None:
+        response = await authed_client.post(url(user), json=[])
+        assert response.status_code == 201
+        assert response.json() == {"imported": 0, "root_ids": []}
+
+    async def test_conflict(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        folder: Item,
+    ) -> None:
+        await Item.create(owner=user, parent=folder, name="c.txt", type=Item.Type.FILE)
+        response = await authed_client.post(
+            url(user),
+            params={"parent_id": folder.id},
+            json=tree,
+        )
+        assert response.status_code == 409
+        assert await Item.filter(owner=user).count() == 2
+
+    async def test_conflict_other_error(
+        self,
+        mocker: MockerFixture,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        mocker.patch(
+            "app.routers.imports.insert_items",
+            side_effect=IntegrityError(asyncpg.ForeignKeyViolationError()),
+        )
+        with pytest.raises(IntegrityError):
+            await authed_client.post(url(user), json=tree)
+
+    @pytest.mark.parametrize(
+        ("depth", "status_code"),
+        [(MAX_JSON_DEPTH, 201), (MAX_JSON_DEPTH + 1, 422)],
+    )
+    async def test_json_depth(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        depth: int,
+        status_code: int,
+    ) -> None:
+        response = await authed_client.post(url(user), json=nested(depth))
+        assert response.status_code == status_code
+        if status_code == 422:
+            assert "recursion limit exceeded" in response.text
+
+    async def test_ndjson_depth(self, authed_client: AsyncClient, user: User) -> None:
+        depth = MAX_JSON_DEPTH * 5
+        lines = [
+            {
+                "ref": str(level),
+                "parent_ref": str(level - 1) if level else None,
+                "name": "a",
+                "type": "folder",
+            }
+            for level in range(depth)
+        ]
+        response = await authed_client.post(
+            url(user),
+            content=ndjson(lines),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 201
+        assert response.json()["imported"] == depth
+
+    async def test_too_many_bytes(
+        self,
+        mocker: MockerFixture,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        mocker.patch.object(settings.IMPORTS, "max_bytes", 100)
+        response = await authed_client.post(url(user), json=tree)
+        assert response.status_code == 413
+
+        async def chunks() -> AsyncIterator[bytes]:
+            for _ in range(3):
+                yield json.dumps(tree).encode()
+
+        # Without `Content-Length`, as the body is streamed.
+        response = await authed_client.post(
+            url(user),
+            content=chunks(),
+            headers={"Content-Type": "application/json"},
+        )
+        assert response.status_code == 413
+        assert not await Item.exists()
+
+    async def test_too_many_nodes(
+        self,
+        mocker: MockerFixture,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        mocker.patch.object(settings.IMPORTS, "max_nodes", 4)
+        response = await authed_client.post(url(user), json=tree)
+        assert response.status_code == 413
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            [
+                {
+                    "name": "a",
+                    "type": "file",
+                    "children": [{"name": "b", "type": "file"}],
+                }
+            ],
+            [{"name": "a", "type": "file"}, {"name": "a", "type": "folder"}],
+            [{"name": "", "type": "file"}],
+            [{"name": "a", "type": "link"}],
+            [{"name": "a", "type": "file", "file_size": -1}],
+            {"name": "a", "type": "file"},
+        ],
+    )
+    async def test_json_invalid(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        body: Any,
+    ) -> None:
+        response = await authed_client.post(url(user), json=body)
+        assert response.status_code == 422
+        assert not await Item.exists()
+
+    @pytest.mark.parametrize(
+        "lines",
+        [
+            [
+                {"ref": "1", "name": "a", "type": "file"},
+                {"ref": "1", "name": "b", "type": "file"},
+            ],
+            [{"ref": "1", "parent_ref": "2", "name": "a", "type": "file"}],
+            [
+                {"ref": "1", "name": "a", "type": "file"},
+                {"ref": "2", "parent_ref": "1", "name": "b", "type": "file"},
+            ],
+            [{"ref": "1", "name": "a"}],
+        ],
+    )
+    async def test_ndjson_invalid(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        lines: list[dict[str, Any]],
+    ) -> None:
+        response = await authed_client.post(
+            url(user),
+            content=ndjson(lines),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
+        assert not await Item.exists()
+
+    async def test_unsupported_media_type(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        response = await authed_client.post(
+            url(user),
+            content="docs",
+            headers={"Content-Type": "text/plain"},
+        )
+        assert response.status_code == 415
+
+    async def test_other_org(
+        self,
+        authed_client: AsyncClient,
+        user_other_org: User,
+    ) -> None:
+        response = await authed_client.post(url(user_other_org), json=tree)
+        assert response.status_code == 404
+
+    async def test_parent_not_found(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+    ) -> None:
+        response = await authed_client.post(
+            url(user),
+            params={"parent_id": 1},
+            json=tree,
+        )
+        assert response.status_code == 404
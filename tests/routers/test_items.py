@@ -1,11 +1,16 @@
+from datetime import UTC, datetime, timedelta
 from typing import Any
 
 import pytest
 from faker import Faker
 from httpx import AsyncClient
+from pytest_mock import MockerFixture
 
-from app.models import Item, Organization, SharingLink, User
-from tests.shorthands import any_str, uses_db
+from app.access_stats import sharing_link_access
+from app.models import Item, Organization, SharingLink, Tombstone, User
+from app.sharding import using_shard
+from tests.conftest import TEST_SHARD
+from tests.shorthands import any_str, max_queries, uses_db, uses_sharded_db
 
 
 @pytest.fixture
@@ -113,10 +118,10 @@ async def sharing_link(faker: Faker, file: Item) -> SharingLink:
 @pytest.fixture
 def serialized_folder(user: User, folder: Item) -> dict[str, Any]:
     return {
-        "id": folder.id,
+        "id": str(folder.id),
         "create_time": any_str,
         "update_time": any_str,
-        "owner_id": user.id,
+        "owner_id": str(user.id),
         "parent_id": None,
         "name": folder.name,
         "type": folder.type,
@@ -131,11 +136,11 @@ def serialized_file(
     file: Item,
 ) -> dict[str, Any]:
     return {
-        "id": file.id,
+        "id": str(file.id),
         "create_time": any_str,
         "update_time": any_str,
-        "owner_id": user.id,
-        "parent_id": folder.id,
+        "owner_id": str(user.id),
+        "parent_id": str(folder.id),
         "name": file.name,
         "type": file.type,
         "file_size": file.file_size,
@@ -145,10 +150,10 @@ def serialized_file(
 @pytest.fixture
 def serialized_sharing_link(file: Item, sharing_link: SharingLink) -> dict[str, Any]:
     return {
-        "id": sharing_link.id,
+        "id": str(sharing_link.id),
         "create_time": any_str,
         "update_time": any_str,
-        "item_id": file.id,
+        "item_id": str(file.id),
         "token": str(sharing_link.token),
         "permission": sharing_link.permission,
         "expire_time": None,
@@ -166,7 +171,8 @@ class TestListUserItems:
         file: Item,  # noqa: ARG002
         serialized_folder: dict[str, Any],
     ) -> None:
-        response = await authed_client.get(f"/users/{user.id}/items/")
+        with max_queries(2):
+            response = await authed_client.get(f"/users/{user.id}/items/")
         assert response.status_code == 200
         assert response.json() == {
             "items": [serialized_folder],
@@ -196,7 +202,8 @@ class TestListFolderItems:
         file_other_folder: Item,  # noqa: ARG002,
         serialized_file: dict[str, Any],
     ) -> None:
-        response = await authed_client.get(f"/folders/{folder.id}/items/")
+        with max_queries(2):
+            response = await authed_client.get(f"/folders/{folder.id}/items/")
         assert response.status_code == 200
         assert response.json() == {
             "items": [serialized_file],
@@ -232,6 +239,43 @@ class TestListItemSharingLinks:
             "next_cursor": None,
         }
 
+    async def test_active_only(
+        self,
+        faker: Faker,
+        authed_client: AsyncClient,
+        file: Item,
+        sharing_link: SharingLink,
+    ) -> None:
+        now = datetime.now(tz=UTC)
+        expired_link = await SharingLink.create(
+            item=file,
+            permission=faker.random_element(SharingLink.Permission),
+            expire_time=now - timedelta(minutes=1),
+        )
+        expiring_link = await SharingLink.create(
+            item=file,
+            permission=faker.random_element(SharingLink.Permission),
+            expire_time=now + timedelta(minutes=1),
+        )
+
+        response = await authed_client.get(f"/items/{file.id}/sharing-links/")
+        assert response.status_code == 200
+        assert [link["id"] for link in response.json()["items"]] == [
+            str(expiring_link.id),
+            str(expired_link.id),
+            str(sharing_link.id),
+        ]
+
+        response = await authed_client.get(
+            f"/items/{file.id}/sharing-links/",
+            params={"active_only": True},
+        )
+        assert response.status_code == 200
+        assert [link["id"] for link in response.json()["items"]] == [
+            str(expiring_link.id),
+            str(sharing_link.id),
+        ]
+
     async def test_other_org(
         self,
         authed_client: AsyncClient,
@@ -243,3 +287,372 @@ class TestListItemSharingLinks:
     async def test_not_found(self, authed_client: AsyncClient) -> None:
         response = await authed_client.get("/items/1/sharing-links/")
         assert response.status_code == 404
+
+
+@uses_db
+class TestResolveSharingLink:
+    async def test_smoke(
+        self,
+        mocker: MockerFixture,
+        client: AsyncClient,
+        sharing_link: SharingLink,
+        serialized_file: dict[str, Any],
+    ) -> None:
+        record = mocker.patch.object(sharing_link_access, "record")
+        response = await client.get(f"/sharing-links/{sharing_link.token}")
+        assert response.status_code == 200
+        assert response.json() == {
+            "token": str(sharing_link.token),
+            "permission": sharing_link.permission,
+            "expire_time": None,
+            "item": serialized_file,
+        }
+        record.assert_called_once_with(sharing_link.id)
+
+    async def test_expired(
+        self,
+        mocker: MockerFixture,
+        client: AsyncClient,
+        sharing_link: SharingLink,
+    ) -> None:
+        record = mocker.patch.object(sharing_link_access, "record")
+        sharing_link.expire_time = datetime.now(tz=UTC) - timedelta(minutes=1)
+        await sharing_link.save()
+
+        response = await client.get(f"/sharing-links/{sharing_link.token}")
+        assert response.status_code == 404
+        record.assert_not_called()
+
+    async def test_not_found(self, faker: Faker, client: AsyncClient) -> None:
+        response = await client.get(f"/sharing-links/{faker.uuid4()}")
+        assert response.status_code == 404
+
+
+@uses_sharded_db
+class TestResolveSharingLinkSharded:
+    async def test_smoke(
+        self,
+        mocker: MockerFixture,
+        faker: Faker,
+        client: AsyncClient,
+    ) -> None:
+        mocker.patch.object(sharing_link_access, "counters", {})
+        with using_shard(TEST_SHARD):
+            organization = await Organization.create(name=faker.company())
+            user = await User.create(
+                organization=organization,
+                username=faker.user_name(),
+                email=faker.email(),
+            )
+            file = await Item.create(
+                owner=user,
+                parent=None,
+                name=faker.file_name(),
+                type=Item.Type.FILE,
+            )
+            link = await SharingLink.create(
+                item=file,
+                permission=SharingLink.Permission.READ,
+            )
+
+        response = await client.get(f"/sharing-links/{link.token}")
+        assert response.status_code == 200
+        assert response.json()["item"]["id"] == str(file.id)
+        assert list(sharing_link_access.counters) == [TEST_SHARD]
+        assert list(sharing_link_access.counters[TEST_SHARD].pending) == [link.id]
+
+    async def test_not_found(self, faker: Faker, client: AsyncClient) -> None:
+        response = await client.get(f"/sharing-links/{faker.uuid4()}")
+        assert response.status_code == 404
+
+
+@uses_db
+class TestMoveItem:
+    async def test_into_folder(
+        self,
+        faker: Faker,
+        authed_client: AsyncClient,
+        user: User,
+        file: Item,
+    ) -> None:
+        target = await Item.create(
+            owner=user,
+            parent=None,
+            name=faker.word(),
+            type=Item.Type.FOLDER,
+        )
+        response = await authed_client.post(
+            f"/items/{file.id}/move",
+            json={"parent_id": target.id},
+        )
+        assert response.status_code == 200
+        assert response.json()["parent_id"] == str(target.id)
+        await file.refresh_from_db()
+        assert file.parent_id == target.id  # type: ignore[attr-defined]
+        assert file.owner_id == user.id  # type: ignore[attr-defined]
+
+    async def test_to_top_level(
+        self,
+        authed_client: AsyncClient,
+        file: Item,
+        serialized_file: dict[str, Any],
+    ) -> None:
+        response = await authed_client.post(f"/items/{file.id}/move", json={})
+        assert response.status_code == 200
+        assert response.json() == {**serialized_file, "parent_id": None}
+
+    async def test_to_other_user(
+        self,
+        authed_client: AsyncClient,
+        folder: Item,
+        file: Item,
+        folder_other_user: Item,
+    ) -> None:
+        other_user_id = folder_other_user.owner_id  # type: ignore[attr-defined]
+        response = await authed_client.post(
+            f"/items/{folder.id}/move",
+            json={"parent_id": folder_other_user.id, "owner_id": other_user_id},
+        )
+        assert response.status_code == 200
+        assert response.json()["owner_id"] == str(other_user_id)
+        await file.refresh_from_db()
+        assert file.parent_id == folder.id  # type: ignore[attr-defined]
+        assert file.owner_id == other_user_id  # type: ignore[attr-defined]
+
+    async def test_to_other_user_top_level(
+        self,
+        authed_client: AsyncClient,
+        folder: Item,
+        file: Item,
+        folder_other_user: Item,
+    ) -> None:
+        other_user_id = folder_other_user.owner_id  # type: ignore[attr-defined]
+        response = await authed_client.post(
+            f"/items/{folder.id}/move",
+            json={"owner_id": other_user_id},
+        )
+        assert response.status_code == 200
+        assert response.json()["parent_id"] is None
+        await file.refresh_from_db()
+        assert file.owner_id == other_user_id  # type: ignore[attr-defined]
+
+    async def test_owner_mismatch(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        file: Item,
+        folder_other_user: Item,
+    ) -> None:
+        response = await authed_client.post(
+            f"/items/{file.id}/move",
+            json={"parent_id": folder_other_user.id, "owner_id": user.id},
+        )
+        assert response.status_code == 422
+
+    async def test_cycle(
+        self,
+        faker: Faker,
+        authed_client: AsyncClient,
+        user: User,
+        folder: Item,
+    ) -> None:
+        subfolder = await Item.create(
+            owner=user,
+            parent=folder,
+            name=faker.word(),
+            type=Item.Type.FOLDER,
+        )
+        for target in (folder, subfolder):
+            response = await authed_client.post(
+                f"/items/{folder.id}/move",
+                json={"parent_id": target.id},
+            )
+            assert response.status_code == 422
+        await folder.refresh_from_db()
+        assert folder.parent_id is None  # type: ignore[attr-defined]
+
+    async def test_name_conflict(
+        self,
+        authed_client: AsyncClient,
+        user: User,
+        file: Item,
+        file_other_folder: Item,
+    ) -> None:
+        await Item.create(
+            owner=user,
+            parent_id=file_other_folder.parent_id,  # type: ignore[attr-defined]
+            name=file.name,
+            type=Item.Type.FILE,
+        )
+        response = await authed_client.post(
+            f"/items/{file.id}/move",
+            json={"parent_id": file_other_folder.parent_id},  # type: ignore[attr-defined]
+        )
+        assert response.status_code == 409
+
+    async def test_parent_not_a_folder(
+        self,
+        authed_client: AsyncClient,
+        folder: Item,
+        file_other_folder: Item,
+    ) -> None:
+        response = await authed_client.post(
+            f"/items/{folder.id}/move",
+            json={"parent_id": file_other_folder.id},
+        )
+        assert response.status_code == 404
+
+    async def test_other_org(
+        self,
+        authed_client: AsyncClient,
+        user_other_org: User,
+        folder: Item,
+        file_other_org: Item,
+        folder_other_org: Item,
+    ) -> None:
+        for item_id, body in [
+            (file_other_org.id, {}),
+            (folder.id, {"parent_id": folder_other_org.id}),
+            (folder.id, {"owner_id": user_other_org.id}),
+        ]:
+            response = await authed_client.post(f"/items/{item_id}/move", json=body)
+            assert response.status_code == 404
+
+    async def test_not_found(self, authed_client: AsyncClient) -> None:
+        response = await authed_client.post("/items/1/move", json={})
+        assert response.status_code == 404
+
+
+@uses_db
+class TestDeleteItem:
+    async def test_smoke(
+        self,
+        authed_client: AsyncClient,
+        organization: Organization,
+        folder: Item,
+        file: Item,
+        file_other_folder: Item,
+        sharing_link: SharingLink,
+    ) -> None:
+        response = await authed_client.delete(f"/items/{folder.id}")
+        assert response.status_code == 200
+        assert response.json() == {"items": 2, "sharing_links": 1}
+
+        assert await Item.filter(id__in=[folder.id, file.id]).count() == 0
+        assert not await SharingLink.exists()
+        assert await Item.filter(id=file_other_folder.id).exists()
+
+        tombstones = await Tombstone.filter(organization=organization).values_list(
+            "kind", "object_id"
+        )
+        assert sorted(tombstones) == sorted(
+            [
+                (Tombstone.Kind.ITEM, folder.id),
+                (Tombstone.Kind.ITEM, file.id),
+                (Tombstone.Kind.SHARING_LINK, sharing_link.id),
+            ]
+        )
+
+    async def test_file(
+        self,
+        authed_client: AsyncClient,
+        file_other_folder: Item,
+    ) -> None:
+        response = await authed_client.delete(f"/items/{file_other_folder.id}")
+        assert response.status_code == 200
+        assert response.json() == {"items": 1, "sharing_links": 0}
+
+    async def test_other_org(
+        self,
+        authed_client: AsyncClient,
+        folder_other_org: Item,
+    ) -> None:
+        response = await authed_client.delete(f"/items/{folder_other_org.id}")
+        assert response.status_code == 404
+        assert await Item.filter(id=folder_other_org.id).exists()
+
+    async def test_not_found(self, authed_client: AsyncClient) -> None:
+        response = await authed_client.delete("/items/1")
+        assert response.status_code == 404
+
+
+@uses_db
+class TestCreateSharingLinks:
+    async def test_smoke(
+        self,
+        authed_client: AsyncClient,
+        folder: Item,
+        file: Item,
+    ) -> None:
+        expire_time = datetime(2099, 1, 1, tzinfo=UTC)
+        response = await authed_client.post(
+            "/sharing-links/",
+            json=[
+                {"item_id": file.id, "permission": "read"},
+                {
+                    "item_id": folder.id,
+                    "permission": "write",
+                    "expire_time": expire_time.isoformat(),
+                },
+                {"item_id": file.id, "permission": "write"},
+            ],
+        )
+        assert response.status_code == 201
+        data = response.json()
+        assert [(link["item_id"], link["permission"]) for link in data] == [
+            (str(file.id), "read"),
+            (str(folder.id), "write"),
+            (str(file.id), "write"),
+        ]
+
+        links = {str(link.id): link for link in await SharingLink.all()}
+        assert len(links) == 3
+        for i, link in enumerate(data):
+            assert link == {
+                "id": str(links[link["id"]].id),
+                "create_time": any_str,
+                "update_time": any_str,
+                "item_id": str(links[link["id"]].item_id),  # type: ignore[attr-defined]
+                "token": str(links[link["id"]].token),
+                "permission": links[link["id"]].permission,
+                "expire_time": any_str if i == 1 else None,
+            }
+        assert links[data[1]["id"]].expire_time == expire_time
+        assert links[data[2]["id"]].expire_time is None
+
+    async def test_other_org(
+        self,
+        authed_client: AsyncClient,
+        file: Item,
+        file_other_org: Item,
+    ) -> None:
+        response = await authed_client.post(
+            "/sharing-links/",
+            json=[
+                {"item_id": file.id, "permission": "read"},
+                {"item_id": file_other_org.id, "permission": "read"},
+            ],
+        )
+        assert response.status_code == 404
+        assert response.json() == {"detail": f"Items not found: [{file_other_org.id}]."}
+        assert not await SharingLink.exists()
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            [],
+            [{"item_id": 1, "permission": "admin"}],
+            [{"item_id": 1, "permission": "read", "expire_time": "2099-01-01T00:00"}],
+            [{"item_id": 1, "permission": "read"}] * 1001,
+        ],
+    )
+    async def test_invalid(self, authed_client: AsyncClient, body: Any) -> None:
+        response = await authed_client.post("/sharing-links/", json=body)
+        assert response.status_code == 422
+
+    async def test_unauthorized(self, client: AsyncClient, file: Item) -> None:
+        response = await client.post(
+            "/sharing-links/",
+            json=[{"item_id": file.id, "permission": "read"}],
+        )
+        assert response.status_code == 401
@@ -1,5 +1,10 @@
+import threading
+
 from httpx import AsyncClient
+from pytest_mock import MockerFixture
 
+from app import warmup
+from app.metrics import metrics
 from tests.shorthands import approx_now
 
 
@@ -7,3 +12,47 @@ async def test_ping(client: AsyncClient) -> None:
     response = await client.get("/")
     assert response.status_code == 200
     assert response.json() == approx_now()
+
+
+async def test_ready(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(warmup.readiness, "ready", False)
+    response = await client.get("/ready")
+    assert response.status_code == 503
+
+    warmup.readiness.ready = True
+    response = await client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == "OK"
+
+
+async def test_get_admission(client: AsyncClient) -> None:
+    response = await client.get("/admission")
+    assert response.status_code == 200
+    assert response.json().keys() == {
+        "in_use",
+        "queue_depth",
+        "admitted",
+        "rejected",
+        "queued",
+        "queue_wait_seconds",
+    }
+
+
+async def test_get_metrics(client: AsyncClient) -> None:
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert (
+        response.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    )
+    assert "# TYPE http_requests_total counter\n" in response.text
+
+
+async def test_get_metrics_on_loop(mocker: MockerFixture, client: AsyncClient) -> None:
+    # Not in the threadpool, where the metrics would change while being rendered.
+    mocker.patch.object(
+        metrics,
+        "render",
+        side_effect=lambda: threading.current_thread().name,
+    )
+    response = await client.get("/metrics")
+    assert response.text == threading.current_thread().name
@@ -7,7 +7,9 @@ from faker import Faker
 from httpx import AsyncClient
 
 from app.models import Organization
-from tests.shorthands import any_str, uses_db
+from app.sharding import DEFAULT_SHARD, using_shard
+from tests.conftest import TEST_SHARD
+from tests.shorthands import any_str, uses_db, uses_sharded_db
 
 
 @pytest.fixture
@@ -18,7 +20,7 @@ async def organization(faker: Faker) -> Organization:
 @pytest.fixture
 def serialized_organization(organization: Organization) -> dict[str, Any]:
     return {
-        "id": organization.id,
+        "id": str(organization.id),
         "create_time": any_str,
         "update_time": any_str,
         "name": organization.name,
@@ -53,6 +55,54 @@ class TestGetOrganization:
         assert response.status_code == 200
         assert response.json() == serialized_organization
 
+    async def test_not_found(self, client: AsyncClient) -> None:
+        response = await client.get("/organizations/1")
+        assert response.status_code == 404
+
+
+@uses_sharded_db
+class TestSharded:
+    @pytest.fixture
+    async def organizations(self, faker: Faker) -> list[Organization]:
+        organizations = []
+        for i in range(10):
+            with using_shard(TEST_SHARD if i % 3 else DEFAULT_SHARD):
+                organizations.append(await Organization.create(name=faker.company()))
+        organizations.sort(key=attrgetter("id"), reverse=True)
+        return organizations
+
+    async def test_list(
+        self,
+        client: AsyncClient,
+        organizations: list[Organization],
+    ) -> None:
+        ids: list[str] = []
+        params = {"limit": 3}
+        while True:
+            response = await client.get("/organizations/", params=params)
+            assert response.status_code == 200
+            data = response.json()
+            ids.extend(obj["id"] for obj in data["items"])
+            if not data["next_cursor"]:
+                break
+            params["cursor"] = data["next_cursor"]
+
+        assert ids == [str(organization.id) for organization in organizations]
+
+    async def test_get(
+        self,
+        client: AsyncClient,
+        organizations: list[Organization],
+    ) -> None:
+        for organization in organizations:
+            response = await client.get(f"/organizations/{organization.id}")
+            assert response.status_code == 200
+            assert response.json()["name"] == organization.name
+
+    async def test_get_not_found(self, client: AsyncClient) -> None:
+        response = await client.get("/organizations/1")
+        assert response.status_code == 404
+
 
 @uses_db
 class TestPagination:
@@ -95,7 +145,7 @@ class TestPagination:
             organizations,
             strict=True,
         ):
-            assert obj["id"] == organization.id
+            assert obj["id"] == str(organization.id)
             assert obj["name"] == organization.name
 
     @pytest.mark.parametrize("cursor", ["", "foobar", "1" * 1000])
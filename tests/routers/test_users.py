@@ -34,10 +34,10 @@ async def user_other_org(faker: Faker) -> User:
 @pytest.fixture
 def serialized_user(organization: Organization, user: User) -> dict[str, Any]:
     return {
-        "id": user.id,
+        "id": str(user.id),
         "create_time": any_str,
         "update_time": any_str,
-        "organization_id": organization.id,
+        "organization_id": str(organization.id),
         "username": user.username,
         "email": user.email,
         "active": user.active,
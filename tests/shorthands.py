@@ -1,10 +1,13 @@
-from contextlib import suppress
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
 from dataclasses import dataclass, field
 from datetime import UTC, datetime, timedelta
 from typing import Any, TypeVar, cast
 
 import pytest
 
+from app.queries import QueryLog, count_queries
+
 T = TypeVar("T")
 
 
@@ -14,6 +17,31 @@ def uses_db(func: T) -> T:
     return cast(T, decorator(func))
 
 
+def uses_replicated_db(func: T) -> T:
+    """Decorator to mark a test as using the replicated database fixture."""
+    decorator = pytest.mark.usefixtures("replicated_db")
+    return cast(T, decorator(func))
+
+
+def uses_sharded_db(func: T) -> T:
+    """Decorator to mark a test as using the sharded database fixture."""
+    decorator = pytest.mark.usefixtures("sharded_db")
+    return cast(T, decorator(func))
+
+
+@contextmanager
+def max_queries(count: int) -> Iterator[QueryLog]:
+    """Context manager asserting that at most `count` database queries run in it,
+    e.g. for the requests to an endpoint."""
+    with count_queries(statements=True) as log:
+        yield log
+    assert log.statements is not None
+    statements = "\n".join(f"{n} x {sql}" for sql, n in log.statements.items())
+    assert log.count <= count, (
+        f"{log.count} queries ran, expected at most {count}:\n{statements}"
+    )
+
+
 class AnyValue:
     """Helper class for asserting the type of the given value.
 
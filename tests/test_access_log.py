@@ -0,0 +1,151 @@
+import io
+import json
+import queue
+import sys
+import threading
+from collections.abc import Iterator
+from datetime import timedelta
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger as loguru_logger
+from pytest_mock import MockerFixture
+
+from app import settings
+from app.access_log import AccessLog, access_log, annotate, configure_sinks
+from app.auth import TokenType, create_jwt
+from app.metrics import metrics
+from tests.shorthands import any_number, any_str
+
+
+@pytest.fixture(autouse=True)
+def counts(mocker: MockerFixture) -> None:
+    mocker.patch.object(metrics, "access_log_records", {})
+
+
+@pytest.fixture
+def logger(mocker: MockerFixture) -> Iterator[MagicMock]:
+    logger = mocker.patch("app.access_log.logger")
+    access_log.start()
+    yield logger
+    access_log.stop()
+
+
+def records(logger: MagicMock) -> list[dict[str, Any]]:
+    """The records logged, once the writer logged all of them."""
+    access_log.stop()
+    access_log.start()
+    info = logger.bind.return_value.info
+    return [json.loads(call.args[0]) for call in info.call_args_list]
+
+
+async def test_logged(logger: MagicMock, client: AsyncClient) -> None:
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert records(logger) == [
+        {
+            "time": any_str,
+            "method": "GET",
+            "route": "/",
+            "path": "/",
+            "status": 200,
+            "duration_ms": any_number,
+            "db_queries": 0,
+            "db_ms": 0,
+            "response_bytes": len(response.content),
+        }
+    ]
+    logger.bind.assert_called_with(access=True)
+    assert metrics.access_log_records == {"written": 1}
+
+
+async def test_organization(logger: MagicMock, client: AsyncClient) -> None:
+    token = create_jwt(
+        data={"sub": "1"},
+        expires_in=timedelta(minutes=5),
+        type_=TokenType.ACCESS_TOKEN,
+    )
+    response = await client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    [record] = records(logger)
+    assert record["route"] == "/me"
+    assert record["organization_id"] == 1
+
+
+async def test_unmatched(logger: MagicMock, client: AsyncClient) -> None:
+    response = await client.get("/nowhere")
+    assert response.status_code == 404
+    [record] = records(logger)
+    assert record["route"] is None
+    assert record["path"] == "/nowhere"
+    assert record["status"] == 404
+
+
+async def test_sampling(
+    mocker: MockerFixture,
+    logger: MagicMock,
+    client: AsyncClient,
+) -> None:
+    mocker.patch.object(settings.ACCESS_LOG, "success_sample_rate", 0)
+    await client.get("/")
+    await client.get("/nowhere")
+    assert [record["status"] for record in records(logger)] == [404]
+    assert metrics.access_log_records == {"sampled_out": 1, "written": 1}
+
+
+async def test_disabled(
+    mocker: MockerFixture,
+    logger: MagicMock,
+    client: AsyncClient,
+) -> None:
+    mocker.patch.object(settings.ACCESS_LOG, "enabled", False)
+    await client.get("/")
+    assert records(logger) == []
+
+
+def test_dropped() -> None:
+    log = AccessLog()
+    log.put({})  # Not started.
+    log.stop()
+    log.records = queue.Queue(1)
+    log.put({"n": 1})
+    log.put({"n": 2})
+    assert log.records.get_nowait() == {"n": 1}
+    assert metrics.access_log_records == {"dropped": 1}
+
+
+def test_annotate_outside_request() -> None:
+    annotate(organization_id=1)
+
+
+def test_counted_across_threads() -> None:
+    def count() -> None:
+        for _ in range(1000):
+            metrics.access_log_record("written")
+            metrics.access_log_record(f"other-{threading.get_ident()}")
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        metrics.render()
+    for thread in threads:
+        thread.join()
+    assert metrics.access_log_records["written"] == 4000
+
+
+def test_sinks(capsys: pytest.CaptureFixture[str]) -> None:
+    lines = io.StringIO()
+    configure_sinks(lines)
+    try:
+        loguru_logger.bind(access=True).info(json.dumps({"status": 200}))
+        loguru_logger.info("Other.")
+    finally:
+        loguru_logger.remove()
+        loguru_logger.add(sys.stderr)
+    assert lines.getvalue() == '{"status": 200}\n'
+    stderr = capsys.readouterr().err
+    assert "Other." in stderr
+    assert "status" not in stderr
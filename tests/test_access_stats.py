@@ -0,0 +1,150 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from faker import Faker
+from pytest_mock import MockerFixture
+
+from app.access_stats import AccessCounter, ShardedAccessCounter
+from app.models import Item, Organization, SharingLink, SharingLinkAccess, User
+from app.sharding import DEFAULT_SHARD, using_shard
+from tests.conftest import TEST_SHARD
+from tests.shorthands import approx_now, uses_db, uses_sharded_db
+
+
+@pytest.fixture
+async def sharing_links(faker: Faker) -> list[SharingLink]:
+    return await create_sharing_links(faker)
+
+
+async def create_sharing_links(faker: Faker) -> list[SharingLink]:
+    """Create two links to an item in a new organization of the current shard."""
+    organization = await Organization.create(name=faker.company())
+    user = await User.create(
+        organization=organization,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+    item = await Item.create(
+        owner=user,
+        parent=None,
+        name=faker.file_name(),
+        type=Item.Type.FILE,
+    )
+    return [
+        await SharingLink.create(item=item, permission=SharingLink.Permission.READ)
+        for _ in range(2)
+    ]
+
+
+def pending_counts(counter: AccessCounter) -> dict[int, int]:
+    return {key: count for key, (count, _) in counter.pending.items()}
+
+
+def test_record() -> None:
+    counter = AccessCounter()
+    counter.record(1)
+    counter.record(2)
+    counter.record(1)
+    assert pending_counts(counter) == {1: 2, 2: 1}
+    assert all(time == approx_now() for _, time in counter.pending.values())
+
+
+@uses_db
+class TestFlush:
+    async def test_smoke(self, sharing_links: list[SharingLink]) -> None:
+        link_1, link_2 = sharing_links
+        counter = AccessCounter()
+        counter.record(link_1.id)
+        counter.record(link_1.id)
+        assert await counter.flush() == 1
+
+        counter.record(link_1.id)
+        counter.record(link_2.id)
+        assert await counter.flush() == 2
+        assert counter.pending == {}
+
+        access_1 = await SharingLinkAccess.get(sharing_link=link_1)
+        assert access_1.access_count == 3
+        assert access_1.last_access_time == approx_now()
+        access_2 = await SharingLinkAccess.get(sharing_link=link_2)
+        assert access_2.access_count == 1
+
+    async def test_empty(self) -> None:
+        assert await AccessCounter().flush() == 0
+
+    async def test_keeps_latest_access_time(
+        self,
+        sharing_links: list[SharingLink],
+    ) -> None:
+        link, _ = sharing_links
+        now = datetime.now(tz=UTC)
+        counter = AccessCounter()
+        counter.pending[link.id] = (1, now)
+        await counter.flush()
+        counter.pending[link.id] = (1, now - timedelta(days=1))
+        await counter.flush()
+
+        access = await SharingLinkAccess.get(sharing_link=link)
+        assert access.access_count == 2
+        assert access.last_access_time == now
+
+    async def test_deleted_link(self, sharing_links: list[SharingLink]) -> None:
+        link, _ = sharing_links
+        counter = AccessCounter()
+        counter.record(link.id)
+        await link.delete()
+
+        await counter.flush()
+        assert not await SharingLinkAccess.exists()
+
+    async def test_failure(self, mocker: MockerFixture) -> None:
+        counter = AccessCounter()
+        counter.record(1)
+        counter.record(2)
+
+        async def execute_query(*_: object) -> None:
+            counter.record(1)
+            raise RuntimeError
+
+        mocker.patch.object(
+            SharingLinkAccess._meta.db,
+            "execute_query",
+            side_effect=execute_query,
+        )
+        with pytest.raises(RuntimeError):
+            await counter.flush()
+        assert pending_counts(counter) == {1: 2, 2: 1}
+
+
+class TestShardedAccessCounter:
+    def test_record(self) -> None:
+        counter = ShardedAccessCounter()
+        counter.record(1)
+        with using_shard(TEST_SHARD):
+            counter.record(1)
+            counter.record(2)
+        assert {
+            shard: pending_counts(shard_counter)
+            for shard, shard_counter in counter.counters.items()
+        } == {DEFAULT_SHARD: {1: 1}, TEST_SHARD: {1: 1, 2: 1}}
+        assert counter.counters[TEST_SHARD].shard == TEST_SHARD
+
+    @uses_sharded_db
+    async def test_flush(
+        self,
+        faker: Faker,
+        sharing_links: list[SharingLink],
+    ) -> None:
+        link, _ = sharing_links
+        with using_shard(TEST_SHARD):
+            shard_links = await create_sharing_links(faker)
+        counter = ShardedAccessCounter()
+        counter.record(link.id)
+        with using_shard(TEST_SHARD):
+            for shard_link in shard_links:
+                counter.record(shard_link.id)
+
+        assert await counter.flush() == 3
+        assert await SharingLinkAccess.filter(access_count=1).count() == 1
+        with using_shard(TEST_SHARD):
+            assert await SharingLinkAccess.filter(access_count=1).count() == 2
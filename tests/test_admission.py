@@ -0,0 +1,101 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app import settings
+from app.admission import AdmissionController, admission
+from app.auth import TokenType, create_jwt
+
+
+@pytest.fixture
+def controller(mocker: MockerFixture) -> AdmissionController:
+    mocker.patch.object(settings.ADMISSION, "slots", 2)
+    mocker.patch.object(settings.ADMISSION, "organization_slots", 1)
+    mocker.patch.object(settings.ADMISSION, "queue_size", 2)
+    mocker.patch.object(settings.ADMISSION, "queue_timeout_seconds", 0.05)
+    return AdmissionController()
+
+
+async def test_admit(mocker: MockerFixture, controller: AdmissionController) -> None:
+    mocker.patch.object(settings.ADMISSION, "organization_slots", 2)
+    async with controller.admit(1), controller.admit(1):
+        assert controller.in_use == 2
+        assert controller.organizations == {1: 2}
+    assert controller.in_use == 0
+    assert controller.organizations == {}
+    assert controller.stats.admitted == 2
+
+
+async def test_organization_share(controller: AdmissionController) -> None:
+    await controller.acquire(1)
+    waiting = asyncio.create_task(controller.acquire(1))
+    await asyncio.sleep(0)
+    # Another organization still gets the free slot, ahead of the waiting request.
+    await controller.acquire(2)
+    assert len(controller.waiters) == 1
+
+    controller.release(2)
+    assert not waiting.done()
+    controller.release(1)
+    await waiting
+    assert controller.organizations == {1: 1}
+    assert controller.stats.queued == 1
+    assert controller.stats.queue_wait_seconds > 0
+
+
+async def test_queue_full(controller: AdmissionController) -> None:
+    await controller.acquire(1)
+    waiting = [asyncio.create_task(controller.acquire(1)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await controller.acquire(1)
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers == {"Retry-After": "1"}
+    assert controller.stats.rejected == 1
+
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+    assert not controller.waiters
+
+
+async def test_queue_timeout(controller: AdmissionController) -> None:
+    await controller.acquire(1)
+    with pytest.raises(HTTPException):
+        await controller.acquire(1)
+    assert not controller.waiters
+    assert controller.stats.rejected == 1
+
+
+async def test_admitted_while_giving_up(controller: AdmissionController) -> None:
+    await controller.acquire(1)
+    waiting = asyncio.create_task(controller.acquire(1))
+    await asyncio.sleep(0)
+    # Admitted, but cancelled before it got to run.
+    controller.release(1)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert controller.in_use == 0
+
+
+async def test_rejected_request(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.ADMISSION, "organization_slots", 1)
+    mocker.patch.object(settings.ADMISSION, "queue_size", 0)
+    token = create_jwt(
+        data={"sub": "1"},
+        expires_in=timedelta(minutes=5),
+        type_=TokenType.ACCESS_TOKEN,
+    )
+    async with admission.admit(1):
+        response = await client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    response = await client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
@@ -273,7 +273,7 @@ class TestGetMe:
             headers={"Authorization": f"Bearer {access_token}"},
         )
         assert response.status_code == 200
-        assert response.json() == {"organization_id": int(client_id)}
+        assert response.json() == {"organization_id": client_id}
 
     def test_expired(self, get_token_credentials: TokenCredentialsFactory) -> None:
         access_token, _ = get_token_credentials(expired=True)
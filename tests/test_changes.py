@@ -0,0 +1,129 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+
+import asyncpg  # type: ignore[import-untyped]
+import pytest
+import pytest_asyncio
+from pytest_mock import MockerFixture
+
+from app import settings
+from app.changes import ChangeHub, Kind, notify_changes
+from app.models import Tombstone
+from tests.shorthands import uses_db
+
+postgres_settings = settings.POSTGRES
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest_asyncio.fixture
+async def listening_hub(init_test_db: None) -> AsyncGenerator[ChangeHub]:  # noqa: ARG001
+    hub = ChangeHub()
+    task = asyncio.create_task(hub.listen_once(postgres_settings.test_url))
+    # Wait for `LISTEN` to be issued.
+    async with asyncpg.create_pool(postgres_settings.test_url) as pool:
+        for _ in range(100):
+            listening = await pool.fetchval(
+                "SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'LISTEN %'"
+            )
+            if listening:
+                break
+            await asyncio.sleep(0.01)
+    yield hub
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def notify(organization_id: int, kind: Kind) -> None:
+    conn = await asyncpg.connect(postgres_settings.test_url)
+    try:
+        await conn.execute(
+            "SELECT pg_notify($1, $2)",
+            settings.CHANGES.channel,
+            json.dumps({"organization_id": organization_id, "kind": kind}),
+        )
+    finally:
+        await conn.close()
+
+
+@uses_db
+class TestNotifyChanges:
+    async def test_smoke(self, mocker: MockerFixture) -> None:
+        execute_query = mocker.patch.object(Tombstone._meta.db, "execute_query")
+        await notify_changes(Kind.ITEM, [1, 2, 1])
+
+        execute_query.assert_called_once()
+        channel, payloads = execute_query.call_args.args[1]
+        assert channel == settings.CHANGES.channel
+        assert sorted(map(json.loads, payloads), key=str) == [
+            {"organization_id": 1, "kind": "item"},
+            {"organization_id": 2, "kind": "item"},
+        ]
+
+    async def test_empty(self, mocker: MockerFixture) -> None:
+        execute_query = mocker.patch.object(Tombstone._meta.db, "execute_query")
+        await notify_changes(Kind.ITEM, [])
+        execute_query.assert_not_called()
+
+
+class TestChangeHub:
+    def test_subscribe(self) -> None:
+        hub = ChangeHub()
+        with hub.subscribe(1) as queue_1, hub.subscribe(1) as queue_2:
+            with hub.subscribe(2) as queue_3:
+                assert hub.subscribers == {1: {queue_1, queue_2}, 2: {queue_3}}
+            assert hub.subscribers == {1: {queue_1, queue_2}}
+        assert hub.subscribers == {}
+
+    def test_dispatch(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(settings.CHANGES, "queue_size", 1)
+        hub = ChangeHub()
+        payload = json.dumps({"organization_id": 1, "kind": "user"})
+        with hub.subscribe(1) as queue, hub.subscribe(2) as queue_other_org:
+            hub.dispatch(None, 0, settings.CHANGES.channel, payload)
+            hub.dispatch(None, 0, settings.CHANGES.channel, payload)
+            assert queue.qsize() == 1
+            assert queue.get_nowait() == Kind.USER
+            assert queue_other_org.empty()
+
+    async def test_listen_once(self, listening_hub: ChangeHub) -> None:
+        with listening_hub.subscribe(1) as queue:
+            await notify(1, Kind.SHARING_LINK)
+            kind = await asyncio.wait_for(queue.get(), timeout=5)
+        assert kind == Kind.SHARING_LINK
+
+    async def test_listen_once_connection_lost(self, init_test_db: None) -> None:  # noqa: ARG002
+        hub = ChangeHub()
+        task = asyncio.create_task(hub.listen_once(postgres_settings.test_url))
+        conn = await asyncpg.connect(postgres_settings.test_url)
+        try:
+            for _ in range(100):
+                terminated = await conn.fetchval(
+                    "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE query LIKE 'LISTEN %'"
+                )
+                if terminated:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await conn.close()
+        await asyncio.wait_for(task, timeout=5)
+
+    async def test_listen(self, mocker: MockerFixture) -> None:
+        hub = ChangeHub()
+        listen_once = mocker.patch.object(
+            hub,
+            "listen_once",
+            side_effect=[None, OSError],
+        )
+        sleep = mocker.patch("asyncio.sleep", side_effect=[None, Stop])
+
+        with pytest.raises(Stop):
+            await hub.listen(postgres_settings.test_url)
+
+        assert listen_once.call_count == 2
+        assert sleep.call_count == 2
@@ -0,0 +1,80 @@
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+
+from app import settings
+from app.faults import fault_stats, latency
+from app.sharding import DEFAULT_SHARD
+from tests.shorthands import approx_now, uses_db
+
+
+@pytest.fixture(autouse=True)
+def stats(mocker: MockerFixture) -> None:
+    mocker.patch.multiple(fault_stats, errors=0, delays=0, slow_db=0)
+
+
+async def test_disabled(mocker: MockerFixture, client: AsyncClient) -> None:
+    random = mocker.patch("random.random")
+    response = await client.get("/")
+    assert response.status_code == 200
+    random.assert_not_called()
+
+
+async def test_error(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.FAULTS, "error_rate", 1)
+    response = await client.get("/")
+    assert response.status_code == 500
+    assert response.json() == "This is a simulated error. Please try again."
+    assert fault_stats.errors == 1
+
+
+async def test_route_error(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(
+        settings.FAULTS, "route_error_rates", {"/users/{user_id}": 1, "/": 0}
+    )
+    response = await client.get("/users/1")
+    assert response.status_code == 500
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert response.json() == approx_now()
+
+
+async def test_latency(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.FAULTS, "latency_rate", 1)
+    mocker.patch.object(settings.FAULTS, "latency_distribution", "fixed")
+    sleep = mocker.patch("asyncio.sleep")
+    response = await client.get("/")
+    assert response.status_code == 200
+    sleep.assert_awaited_once_with(settings.FAULTS.latency_mean_seconds)
+    assert fault_stats.delays == 1
+
+
+@pytest.mark.parametrize(
+    ("distribution", "function", "args"),
+    [
+        ("uniform", "random.uniform", (0, 0.2)),
+        ("exponential", "random.expovariate", (10,)),
+    ],
+)
+def test_latency_distribution(
+    mocker: MockerFixture,
+    distribution: str,
+    function: str,
+    args: tuple[float, ...],
+) -> None:
+    mocker.patch.object(settings.FAULTS, "latency_distribution", distribution)
+    draw = mocker.patch(function, return_value=0.05)
+    assert latency() == 0.05
+    draw.assert_called_once_with(*args)
+
+
+@uses_db
+async def test_slow_db(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.FAULTS, "slow_db_rate", 1)
+    mocker.patch.object(settings.FAULTS, "slow_db_seconds", 0.01)
+    execute_query = mocker.spy(connections.get(DEFAULT_SHARD), "acquire_connection")
+    response = await client.get("/")
+    assert response.status_code == 200
+    execute_query.assert_called_once_with()
+    assert fault_stats.slow_db == 1
@@ -0,0 +1,87 @@
+from datetime import UTC, datetime
+
+import pytest
+from pydantic import TypeAdapter
+
+from app.ids import (
+    EPOCH,
+    MAX_SEQUENCE,
+    MAX_WORKER_ID,
+    SnowflakeGenerator,
+    id_time,
+    next_id,
+)
+from app.types import Id
+
+
+class Clock:
+    def __init__(self, time: datetime) -> None:
+        self.seconds = time.timestamp()
+
+    def __call__(self) -> float:
+        return self.seconds
+
+
+def test_layout() -> None:
+    generator = SnowflakeGenerator(5, Clock(EPOCH))
+    assert generator.next_ids(2) == [5 << 12, 5 << 12 | 1]
+
+
+def test_time_ordered() -> None:
+    now = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=UTC)
+    clock = Clock(now)
+    generator = SnowflakeGenerator(MAX_WORKER_ID, clock)
+    first = generator.next_id()
+    assert id_time(first) == now
+
+    clock.seconds += 0.001
+    second = generator.next_id()
+    assert second > first
+    assert id_time(second) > now
+    assert second & MAX_SEQUENCE == 0
+
+    # Another worker in the same millisecond sorts after the earlier ID.
+    assert SnowflakeGenerator(0, Clock(now)).next_id() < second
+
+
+def test_sequence_exhausted() -> None:
+    clock = Clock(EPOCH)
+    generator = SnowflakeGenerator(0, clock)
+    ids = generator.next_ids(MAX_SEQUENCE + 2)
+    assert ids == sorted(set(ids))
+    assert ids[-1] == 1 << 22
+
+    # The clock catches up with the borrowed millisecond without reusing IDs.
+    clock.seconds += 0.001
+    assert generator.next_id() == 1 << 22 | 1
+
+
+def test_clock_backwards() -> None:
+    clock = Clock(datetime(2026, 1, 1, tzinfo=UTC))
+    generator = SnowflakeGenerator(0, clock)
+    first = generator.next_id()
+    clock.seconds -= 10
+    assert generator.next_id() == first + 1
+
+
+@pytest.mark.parametrize("worker_id", [-1, MAX_WORKER_ID + 1])
+def test_worker_id_invalid(worker_id: int) -> None:
+    with pytest.raises(ValueError, match="Worker ID"):
+        SnowflakeGenerator(worker_id)
+
+
+def test_next_id() -> None:
+    assert next_id() < next_id()
+
+
+def test_json_string() -> None:
+    # Past 2**53, which JavaScript numbers can't hold exactly.
+    id_ = SnowflakeGenerator(
+        MAX_WORKER_ID, Clock(datetime(2026, 1, 1, tzinfo=UTC))
+    ).next_id()
+    assert id_ > 2**53
+    adapter = TypeAdapter(Id)
+    assert adapter.dump_json(id_) == f'"{id_}"'.encode()
+    assert adapter.dump_python(id_) == id_
+    assert adapter.validate_json(f'"{id_}"') == id_
+    assert adapter.validate_json(str(id_)) == id_
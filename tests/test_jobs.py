@@ -0,0 +1,246 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from faker import Faker
+from pytest_mock import MockerFixture
+
+from app import jobs, settings, warmup
+from app.access_stats import sharing_link_access
+from app.changes import change_hub
+from app.loop_monitor import loop_lag
+from app.main import app, lifespan
+from app.models import Item, Organization, SharingLink, User
+from app.rate_limits import rate_limiter
+from app.sharding import using_shard
+from tests.conftest import (
+    TEST_REPLICA,
+    TEST_SHARD,
+    test_replica_settings,
+    test_shard_settings,
+)
+from tests.shorthands import uses_db, uses_sharded_db
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest.fixture
+async def item(faker: Faker) -> Item:
+    return await create_item(faker)
+
+
+async def create_item(faker: Faker) -> Item:
+    organization = await Organization.create(name=faker.company())
+    user = await User.create(
+        organization=organization,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+    return await Item.create(
+        owner=user,
+        parent=None,
+        name=faker.file_name(),
+        type=Item.Type.FILE,
+    )
+
+
+async def create_links(item: Item, count: int, expire_time: datetime | None) -> None:
+    await SharingLink.bulk_create(
+        [
+            SharingLink(
+                organization_id=item.organization_id,  # type: ignore[attr-defined]
+                item=item,
+                permission=SharingLink.Permission.READ,
+                expire_time=expire_time,
+            )
+            for _ in range(count)
+        ]
+    )
+
+
+@uses_db
+class TestPurgeExpiredSharingLinks:
+    async def test_smoke(self, item: Item) -> None:
+        now = datetime.now(tz=UTC)
+        await create_links(item, 3, now - timedelta(days=1))
+        await create_links(item, 2, now + timedelta(days=1))
+        await create_links(item, 1, None)
+
+        assert await jobs.purge_expired_sharing_links(batch_size=2) == 2
+        assert await jobs.purge_expired_sharing_links(batch_size=2) == 1
+        assert await jobs.purge_expired_sharing_links(batch_size=2) == 0
+        assert await SharingLink.filter(item=item).count() == 3
+
+
+@uses_db
+class TestRunPurgeJob:
+    async def test_smoke(self, mocker: MockerFixture, item: Item) -> None:
+        mocker.patch.object(settings.PURGE, "batch_size", 2)
+        mocker.patch.object(jobs, "purge_stats", jobs.PurgeStats())
+        sleep = mocker.patch("asyncio.sleep", side_effect=[None, Stop])
+        await create_links(item, 3, datetime.now(tz=UTC) - timedelta(days=1))
+
+        with pytest.raises(Stop):
+            await jobs.run_purge_job()
+
+        assert jobs.purge_stats.batches == 2
+        assert jobs.purge_stats.purged == 3
+        assert jobs.purge_stats.failures == 0
+        assert [call.args for call in sleep.call_args_list] == [
+            (settings.PURGE.batch_interval_seconds,),
+            (settings.PURGE.idle_interval_seconds,),
+        ]
+
+    async def test_failure(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(jobs, "purge_stats", jobs.PurgeStats())
+        mocker.patch.object(
+            jobs,
+            "purge_expired_sharing_links",
+            side_effect=RuntimeError,
+        )
+        mocker.patch("asyncio.sleep", side_effect=Stop)
+
+        with pytest.raises(Stop):
+            await jobs.run_purge_job()
+
+        assert jobs.purge_stats.batches == 0
+        assert jobs.purge_stats.failures == 1
+
+
+@uses_sharded_db
+class TestRunPurgeJobSharded:
+    async def test_smoke(self, mocker: MockerFixture, faker: Faker) -> None:
+        mocker.patch.object(jobs, "purge_stats", jobs.PurgeStats())
+        mocker.patch("asyncio.sleep", side_effect=Stop)
+        expired = datetime.now(tz=UTC) - timedelta(days=1)
+        await create_links(await create_item(faker), 1, expired)
+        with using_shard(TEST_SHARD):
+            await create_links(await create_item(faker), 2, expired)
+
+        with pytest.raises(Stop):
+            await jobs.run_purge_job()
+
+        assert jobs.purge_stats.batches == 2
+        assert jobs.purge_stats.purged == 3
+
+
+class TestRunAccessFlushJob:
+    async def test_smoke(self, mocker: MockerFixture) -> None:
+        flush = mocker.patch.object(sharing_link_access, "flush")
+        mocker.patch("asyncio.sleep", side_effect=[None, None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_access_flush_job()
+
+        assert flush.call_count == 2
+
+    async def test_failure(self, mocker: MockerFixture) -> None:
+        flush = mocker.patch.object(
+            sharing_link_access,
+            "flush",
+            side_effect=RuntimeError,
+        )
+        mocker.patch("asyncio.sleep", side_effect=[None, None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_access_flush_job()
+
+        assert flush.call_count == 2
+
+
+class TestRunRateLimitCleanupJob:
+    async def test_smoke(self, mocker: MockerFixture) -> None:
+        cleanup = mocker.patch.object(rate_limiter, "cleanup")
+        mocker.patch("asyncio.sleep", side_effect=[None, None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_rate_limit_cleanup_job()
+
+        assert cleanup.call_count == 2
+
+    async def test_failure(self, mocker: MockerFixture) -> None:
+        cleanup = mocker.patch.object(rate_limiter, "cleanup", side_effect=OSError)
+        mocker.patch("asyncio.sleep", side_effect=[None, None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_rate_limit_cleanup_job()
+
+        assert cleanup.call_count == 2
+
+
+class TestRunLoopMonitorJob:
+    @pytest.mark.parametrize("debug", [True, False])
+    async def test_smoke(self, mocker: MockerFixture, debug: bool) -> None:
+        mocker.patch.object(settings.LOOP_MONITOR, "debug", debug)
+        mocker.patch.object(loop_lag, "count", 0)
+        watchdog = mocker.patch.object(jobs, "Watchdog")
+        mocker.patch("asyncio.sleep", side_effect=[None, None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_loop_monitor_job()
+
+        assert loop_lag.count == 2
+        assert loop_lag.samples.maxlen == 600
+        assert watchdog.return_value.beat.call_count == (2 if debug else 0)
+        assert watchdog.return_value.stop.called == debug
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+async def test_lifespan(mocker: MockerFixture, enabled: bool) -> None:
+    mocker.patch.object(settings.PURGE, "enabled", enabled)
+    mocker.patch.object(settings.RATE_LIMITS, "enabled", enabled)
+    run_purge_job = mocker.patch.object(jobs, "run_purge_job")
+    run_rate_limit_cleanup_job = mocker.patch.object(jobs, "run_rate_limit_cleanup_job")
+    run_access_flush_job = mocker.patch.object(jobs, "run_access_flush_job")
+    run_loop_monitor_job = mocker.patch.object(jobs, "run_loop_monitor_job")
+    warm_up = mocker.patch.object(warmup, "warm_up")
+    flush = mocker.patch.object(sharing_link_access, "flush")
+    listen = mocker.patch.object(change_hub, "listen")
+
+    async with lifespan(app):
+        warm_up.assert_awaited_once_with()
+        warmup.readiness.ready = True
+
+    assert not warmup.readiness.ready
+    listen.assert_called_once_with(settings.POSTGRES.dsn)
+
+    assert run_purge_job.called == enabled
+    assert run_rate_limit_cleanup_job.called == enabled
+    assert run_access_flush_job.called
+    assert run_loop_monitor_job.called
+    flush.assert_called_once_with()
+
+
+async def test_lifespan_sharded(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.SHARDS, "databases", {TEST_SHARD: test_shard_settings})
+    mocker.patch.object(jobs, "run_purge_job")
+    mocker.patch.object(jobs, "run_access_flush_job")
+    mocker.patch.object(warmup, "warm_up")
+    mocker.patch.object(sharing_link_access, "flush")
+    listen = mocker.patch.object(change_hub, "listen")
+
+    async with lifespan(app):
+        pass
+
+    assert [call.args for call in listen.call_args_list] == [
+        (settings.POSTGRES.dsn,),
+        (test_shard_settings.dsn,),
+    ]
+
+
+async def test_lifespan_replicated(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        settings.POSTGRES, "replicas", {TEST_REPLICA: test_replica_settings}
+    )
+    mocker.patch.object(jobs, "run_purge_job")
+    mocker.patch.object(jobs, "run_access_flush_job")
+    mocker.patch.object(warmup, "warm_up")
+    mocker.patch.object(sharing_link_access, "flush")
+    mocker.patch.object(change_hub, "listen")
+    run_replica_lag_job = mocker.patch.object(jobs, "run_replica_lag_job")
+
+    async with lifespan(app):
+        pass
+
+    run_replica_lag_job.assert_called_once_with()
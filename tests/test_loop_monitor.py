@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.loop_monitor import LoopLag, Watchdog, loop_stats
+
+
+@pytest.fixture(autouse=True)
+def stats(mocker: MockerFixture) -> None:
+    mocker.patch.object(loop_stats, "blocked", 0)
+
+
+def test_loop_lag() -> None:
+    lag = LoopLag()
+    assert lag.percentile(0.99) == 0
+    lag.resize(100)
+    for i in range(1, 201):
+        lag.observe(i / 1000)
+    assert lag.count == 200
+    assert lag.sum == pytest.approx(20.1)
+    # The last 100 only.
+    assert lag.percentile(0.5) == 0.15
+    assert lag.percentile(0.99) == 0.199
+    assert lag.percentile(1) == 0.2
+    assert lag.percentile(0) == 0.101
+
+
+def test_watchdog(mocker: MockerFixture) -> None:
+    logger = mocker.patch("app.loop_monitor.logger")
+    watchdog = Watchdog(interval=0.01, threshold=0.02)
+    watchdog.check()
+    logger.warning.assert_not_called()
+
+    watchdog.last_beat -= 1
+    watchdog.check()
+    watchdog.check()
+    logger.warning.assert_called_once()
+    assert "test_watchdog" in logger.warning.call_args.args[2]
+    assert loop_stats.blocked == 1
+
+    watchdog.beat()
+    watchdog.last_beat -= 1
+    watchdog.check()
+    assert loop_stats.blocked == 2
+
+
+def test_watchdog_thread(mocker: MockerFixture) -> None:
+    logger = mocker.patch("app.loop_monitor.logger")
+    watchdog = Watchdog(interval=0.001, threshold=0.01)
+    watchdog.start()
+    time.sleep(0.1)  # Blocking, as if on the loop.
+    watchdog.stop()
+    logger.warning.assert_called_once()
+    assert "test_watchdog_thread" in logger.warning.call_args.args[2]
+
+
+def test_watchdog_lost_thread(mocker: MockerFixture) -> None:
+    logger = mocker.patch("app.loop_monitor.logger")
+    watchdog = Watchdog(interval=0.01, threshold=0.02)
+    watchdog.loop_thread_id = -1
+    watchdog.last_beat -= 1
+    watchdog.check()
+    assert logger.warning.call_args.args[2] == ""
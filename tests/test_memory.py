@@ -0,0 +1,121 @@
+import threading
+import tracemalloc
+from collections.abc import Iterator
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app import settings
+from app.memory import memory_tracer
+from tests.shorthands import any_number, any_str
+
+HEADERS = {"Memory-Profiling-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def memory_profiling(mocker: MockerFixture) -> Iterator[None]:
+    mocker.patch.object(settings.MEMORY_PROFILING, "enabled", True)
+    mocker.patch.object(settings.MEMORY_PROFILING, "token", "secret")
+    mocker.patch.object(memory_tracer, "routes", {})
+    yield
+    tracemalloc.stop()
+
+
+@pytest.mark.parametrize(
+    ("enabled", "headers", "status_code"),
+    [
+        (False, HEADERS, 404),
+        (True, {}, 403),
+        (True, {"Memory-Profiling-Token": "wrong"}, 403),
+    ],
+)
+async def test_access(
+    mocker: MockerFixture,
+    client: AsyncClient,
+    enabled: bool,
+    headers: dict[str, str],
+    status_code: int,
+) -> None:
+    mocker.patch.object(settings.MEMORY_PROFILING, "enabled", enabled)
+    for method, url in [("GET", "/memory"), ("POST", "/memory/start")]:
+        response = await client.request(method, url, headers=headers)
+        assert response.status_code == status_code
+    assert not tracemalloc.is_tracing()
+
+
+async def test_not_tracing(client: AsyncClient) -> None:
+    response = await client.get("/memory", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json() == {
+        "tracing": False,
+        "traced_bytes": 0,
+        "peak_bytes": 0,
+        "top": [],
+        "routes": [],
+    }
+
+
+async def test_tracing(client: AsyncClient) -> None:
+    response = await client.post("/memory/start", headers=HEADERS)
+    assert response.status_code == 204
+    assert tracemalloc.is_tracing()
+
+    await client.get("/")
+    await client.get("/")
+    await client.get("/nowhere")
+
+    response = await client.get("/memory", headers=HEADERS, params={"limit": 3})
+    assert response.status_code == 200
+    memory = response.json()
+    assert memory["tracing"]
+    assert memory["peak_bytes"] >= memory["traced_bytes"] > 0
+    assert (
+        memory["top"]
+        == [{"site": any_str, "size_bytes": any_number, "count": any_number}] * 3
+    )
+    routes = {(route["method"], route["route"]): route for route in memory["routes"]}
+    # Not the request starting to trace.
+    assert routes.keys() == {("GET", "/"), ("GET", "<unmatched>")}
+    assert routes["GET", "/"]["requests"] == 2
+    assert routes["GET", "/"]["max_peak_bytes"] > 0
+    assert [route["max_peak_bytes"] for route in memory["routes"]] == sorted(
+        (route["max_peak_bytes"] for route in memory["routes"]), reverse=True
+    )
+
+    response = await client.post("/memory/stop", headers=HEADERS)
+    assert response.status_code == 204
+    assert not tracemalloc.is_tracing()
+    # Nor the one stopping it.
+    assert ("POST", "/memory/stop") not in memory_tracer.routes
+
+
+async def test_overlapping(mocker: MockerFixture, client: AsyncClient) -> None:
+    memory_tracer.start()
+    reset_peak = mocker.spy(tracemalloc, "reset_peak")
+    # Another request running, whose peak is kept.
+    mocker.patch.object(memory_tracer, "in_flight", 1)
+    await client.get("/")
+    reset_peak.assert_not_called()
+    assert memory_tracer.in_flight == 1
+    assert memory_tracer.routes["GET", "/"].requests == 1
+
+
+async def test_threads(mocker: MockerFixture, client: AsyncClient) -> None:
+    threads: list[threading.Thread] = []
+
+    def record_thread(*_: object) -> list[object]:
+        threads.append(threading.current_thread())
+        return []
+
+    mocker.patch.object(memory_tracer, "start", side_effect=record_thread)
+    mocker.patch.object(
+        memory_tracer, "top", side_effect=record_thread, return_value=[]
+    )
+    await client.post("/memory/start", headers=HEADERS)
+    await client.get("/memory", headers=HEADERS)
+    # Starting swaps the peaks on the event loop, which updates them; the snapshot is
+    # taken in the threadpool.
+    loop_thread = threading.current_thread()
+    assert threads[0] is loop_thread
+    assert threads[1] is not loop_thread
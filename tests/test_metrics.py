@@ -0,0 +1,129 @@
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+
+from app.faults import fault_stats
+from app.jobs import purge_stats
+from app.metrics import UNMATCHED, Histogram, MetricsMiddleware, metrics
+
+
+@pytest.fixture(autouse=True)
+def reset(mocker: MockerFixture) -> None:
+    mocker.patch.multiple(
+        metrics,
+        in_flight=0,
+        routes={},
+        pool_waits={},
+        auth_failures={},
+        access_log_records={},
+        pools={},
+    )
+
+
+def test_histogram() -> None:
+    histogram = Histogram()
+    for value in [0.003, 0.005, 0.2, 20]:
+        histogram.observe(value)
+    lines = list(histogram.lines("latency", {"route": "/"}))
+    assert 'latency_bucket{route="/",le="0.001"} 0' in lines
+    assert 'latency_bucket{route="/",le="0.005"} 2' in lines
+    assert 'latency_bucket{route="/",le="0.1"} 2' in lines
+    assert 'latency_bucket{route="/",le="0.25"} 3' in lines
+    assert 'latency_bucket{route="/",le="10"} 3' in lines
+    assert 'latency_bucket{route="/",le="+Inf"} 4' in lines
+    assert 'latency_sum{route="/"} 20.208' in lines
+    assert 'latency_count{route="/"} 4' in lines
+
+
+async def test_requests(client: AsyncClient) -> None:
+    await client.get("/")
+    await client.get("/")
+    await client.get("/users/abc")
+    await client.get("/nowhere")
+    assert metrics.in_flight == 0
+
+    assert metrics.routes.keys() == {
+        ("GET", "/"),
+        ("GET", "/users/{user_id}"),
+        ("GET", UNMATCHED),
+    }
+    assert metrics.routes["GET", "/"].statuses == {200: 2}
+    assert metrics.routes["GET", "/"].duration.counts[-1] == 0
+    assert sum(metrics.routes["GET", "/"].duration.counts) == 2
+    assert metrics.routes["GET", "/users/{user_id}"].statuses == {401: 1}
+    assert metrics.routes["GET", UNMATCHED].statuses == {404: 1}
+
+
+async def test_in_flight(mocker: MockerFixture) -> None:
+    async def app(*_: object) -> None:
+        assert metrics.in_flight == 1
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await MetricsMiddleware(app)(
+            {"type": "http", "method": "GET"}, mocker.AsyncMock(), mocker.AsyncMock()
+        )
+    assert metrics.in_flight == 0
+    # Failed before responding.
+    assert metrics.routes["GET", UNMATCHED].statuses == {500: 1}
+
+
+async def test_not_http(mocker: MockerFixture) -> None:
+    app = mocker.AsyncMock()
+    scope = {"type": "lifespan"}
+    await MetricsMiddleware(app)(
+        scope, receive := mocker.AsyncMock(), send := mocker.AsyncMock()
+    )
+    app.assert_awaited_once_with(scope, receive, send)
+    assert metrics.routes == {}
+
+
+async def test_auth_failures(client: AsyncClient) -> None:
+    await client.get("/users/abc", headers={"Authorization": "Bearer invalid"})
+    await client.post("/token", data={"grant_type": "authorization_code", "code": ""})
+    assert metrics.auth_failures == {"invalid_token": 1, "invalid_grant": 1}
+
+
+@pytest.mark.usefixtures("init_tortoise")
+async def test_pool_wait() -> None:
+    histogram = metrics.pool_wait("default")
+    count = sum(histogram.counts)
+    async with connections.get("default").acquire_connection():
+        pass
+    assert sum(histogram.counts) == count + 1
+
+
+@pytest.mark.usefixtures("init_tortoise")
+async def test_render(mocker: MockerFixture) -> None:
+    mocker.patch.object(fault_stats, "errors", 3)
+    mocker.patch.object(purge_stats, "failures", 2)
+    metrics.observe_request("GET", '/"quoted"', 200, 0.01)
+    metrics.auth_failure("invalid_token")
+    metrics.access_log_record("dropped")
+
+    # Holding the only connection of the pool.
+    async with connections.get("default").acquire_connection():
+        lines = metrics.render().splitlines()
+
+    assert (
+        'http_requests_total{method="GET",route="/\\"quoted\\"",status="200"} 1'
+        in lines
+    )
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/\\"quoted\\""} 1'
+        in lines
+    )
+    assert "http_requests_in_flight 0" in lines
+    assert any(
+        line.startswith('event_loop_lag_seconds{quantile="0.99"} ') for line in lines
+    )
+    assert 'db_pool_connections{connection="default",state="idle"} 0' in lines
+    assert 'db_pool_connections{connection="default",state="busy"} 1' in lines
+    assert any(line.startswith("db_pool_wait_seconds_count{") for line in lines)
+    assert 'auth_failures_total{reason="invalid_token"} 1' in lines
+    assert any(line.startswith("admission_requests_total{") for line in lines)
+    assert 'access_log_records_total{outcome="dropped"} 1' in lines
+    assert 'faults_injected_total{fault="errors"} 3' in lines
+    assert "expired_links_purge_failures_total 2" in lines
+    assert any(line.startswith("expired_links_purge_purged_total ") for line in lines)
@@ -0,0 +1,131 @@
+import asyncio
+from collections.abc import AsyncGenerator
+
+import asyncpg  # type: ignore[import-untyped]
+import pytest
+import pytest_asyncio
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+
+from app import migrations, settings
+from app.migrations import MIGRATIONS, Migration, migrate, migrate_all
+from app.schema import schema_sql
+from app.sharding import DEFAULT_SHARD
+from tests.conftest import TEST_PARTITIONS, create_test_database
+
+NAMES = [migration.name for migration in MIGRATIONS]
+
+
+async def query(sql: str) -> list[dict[str, object]]:
+    return await connections.get(DEFAULT_SHARD).execute_query_dict(sql)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def cleanup(init_tortoise: None) -> AsyncGenerator[None]:  # noqa: ARG001
+    yield
+    await connections.get(DEFAULT_SHARD).execute_script(
+        'DROP TABLE IF EXISTS "schemamigration", "migrationtest";'
+        'DROP INDEX IF EXISTS "idx_organization_name";'
+    )
+
+
+async def test_migrate() -> None:
+    assert await migrate(DEFAULT_SHARD) == NAMES
+    assert await migrate(DEFAULT_SHARD) == []
+    assert await query('SELECT "name" FROM "schemamigration"') == [
+        {"name": name} for name in NAMES
+    ]
+
+
+async def test_concurrent_runs() -> None:
+    results = await asyncio.gather(migrate(DEFAULT_SHARD), migrate(DEFAULT_SHARD))
+    assert sorted(results) == [[], NAMES]
+
+
+async def test_not_atomic() -> None:
+    migration = Migration(
+        "0003_organization_name",
+        lambda: [
+            'CREATE INDEX CONCURRENTLY "idx_organization_name" '
+            'ON "organization" ("name")'
+        ],
+        atomic=False,
+    )
+    assert await migrate(DEFAULT_SHARD, [*MIGRATIONS, migration]) == [
+        *NAMES,
+        "0003_organization_name",
+    ]
+    rows = await query(
+        "SELECT indisvalid FROM pg_index "
+        "WHERE indexrelid = 'idx_organization_name'::regclass"
+    )
+    assert rows == [{"indisvalid": True}]
+
+
+async def test_failure() -> None:
+    migration = Migration(
+        "0003_broken",
+        lambda: ['CREATE TABLE "migrationtest" ()', "SELECT nonsense"],
+    )
+    with pytest.raises(asyncpg.UndefinedColumnError):
+        await migrate(DEFAULT_SHARD, [*MIGRATIONS, migration])
+
+    # Rolled back and not recorded, while the migrations before it stay applied.
+    assert await query("SELECT to_regclass('migrationtest') AS \"table\"") == [
+        {"table": None}
+    ]
+    assert await query('SELECT "name" FROM "schemamigration"') == [
+        {"name": name} for name in NAMES
+    ]
+
+
+CATALOG_SQL = [
+    """
+    SELECT table_name, column_name, data_type, is_nullable, column_default
+    FROM information_schema.columns
+    WHERE table_schema = 'public'
+    ORDER BY table_name, column_name
+    """,
+    """
+    SELECT conrelid::regclass::text AS "table", conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE connamespace = 'public'::regnamespace
+    ORDER BY "table", conname
+    """,
+    """
+    SELECT tablename, indexname, indexdef
+    FROM pg_indexes
+    WHERE schemaname = 'public'
+    ORDER BY tablename, indexname
+    """,
+]
+
+
+async def catalog(database: str, statements: list[str]) -> list[list[asyncpg.Record]]:
+    """The tables, constraints and indexes of a new database, once built."""
+    async with create_test_database(database):
+        url = settings.POSTGRES.model_copy(update={"database": database}).dsn
+        conn = await asyncpg.connect(url)
+        try:
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute('DROP TABLE IF EXISTS "schemamigration"')
+            return [await conn.fetch(sql) for sql in CATALOG_SQL]
+        finally:
+            await conn.close()
+
+
+@pytest.mark.parametrize("partitions", [0, TEST_PARTITIONS])
+async def test_matches_models(mocker: MockerFixture, partitions: int) -> None:
+    mocker.patch.object(settings.PARTITIONS, "count", partitions)
+    migrated = await catalog(
+        "test_migrated",
+        [statement for migration in MIGRATIONS for statement in migration.statements()],
+    )
+    assert migrated == await catalog("test_generated", [schema_sql(partitions)])
+
+
+async def test_migrate_all(mocker: MockerFixture) -> None:
+    migrate = mocker.patch.object(migrations, "migrate")
+    await migrate_all()
+    migrate.assert_awaited_once_with(DEFAULT_SHARD)
@@ -1,7 +1,17 @@
 import pytest
 from faker import Faker
 
-from app.models import Item, Organization, SharingLink, User
+from app.ids import id_time
+from app.models import (
+    Item,
+    Organization,
+    RateLimitBucket,
+    SharingLink,
+    SharingLinkAccess,
+    Tombstone,
+    User,
+)
+from tests.shorthands import approx_now
 
 
 class TestOrganization:
@@ -29,9 +39,35 @@ class TestItem:
             case Item.Type.FOLDER:
                 assert str(item) == f"Folder: {name}"
 
+    def test_id(self) -> None:
+        first, second = Item(), Item()
+        assert first.id is not None
+        assert first.id < second.id
+        assert id_time(first.id) == approx_now()
+
 
 class TestSharingLink:
     def test_str(self, faker: Faker) -> None:
         token = faker.uuid4()
         sharing_link = SharingLink(token=token)
         assert str(sharing_link) == f"Sharing Link: {token}"
+
+
+class TestSharingLinkAccess:
+    def test_str(self, faker: Faker) -> None:
+        access_count = faker.random_int()
+        access = SharingLinkAccess(access_count=access_count)
+        assert str(access) == f"Sharing Link Access: {access_count}"
+
+
+class TestTombstone:
+    def test_str(self, faker: Faker) -> None:
+        object_id = faker.random_int()
+        tombstone = Tombstone(kind=Tombstone.Kind.ITEM, object_id=object_id)
+        assert str(tombstone) == f"Tombstone: item {object_id}"
+
+
+class TestRateLimitBucket:
+    def test_str(self) -> None:
+        bucket = RateLimitBucket(key="organization:1")
+        assert str(bucket) == "Rate Limit Bucket: organization:1"
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from starlette.responses import PlainTextResponse
+from starlette.types import Receive, Scope, Send
+
+from app import settings
+from app.profiling import ProfilingMiddleware, Sampler
+
+
+@pytest.fixture(autouse=True)
+def profiling(mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch.object(settings.PROFILING, "enabled", True)
+    mocker.patch.object(settings.PROFILING, "token", "secret")
+    mocker.patch.object(settings.PROFILING, "directory", str(tmp_path))
+    mocker.patch.object(settings.PROFILING, "interval_seconds", 0.001)
+
+
+def test_sampler() -> None:
+    sampler = Sampler(0.001)
+    sampler.start()
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+    sampler.stop()
+    assert any(
+        stack[-1] == "tests.test_profiling:test_sampler" for stack in sampler.stacks
+    )
+    assert "tests.test_profiling:test_sampler " in sampler.collapsed()
+
+
+@pytest.mark.parametrize(
+    ("url", "headers"),
+    [
+        ("/", {"Profile-Token": "secret"}),
+        ("/?profile_token=secret", {}),
+    ],
+)
+async def test_profile(
+    client: AsyncClient,
+    tmp_path: Path,
+    url: str,
+    headers: dict[str, str],
+) -> None:
+    response = await client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert (tmp_path / response.headers["Profile"]).is_file()
+
+
+@pytest.mark.parametrize(
+    ("enabled", "headers"),
+    [
+        (True, {}),
+        (True, {"Profile-Token": "wrong"}),
+        (False, {"Profile-Token": "secret"}),
+    ],
+)
+async def test_not_profiled(
+    mocker: MockerFixture,
+    client: AsyncClient,
+    tmp_path: Path,
+    enabled: bool,
+    headers: dict[str, str],
+) -> None:
+    mocker.patch.object(settings.PROFILING, "enabled", enabled)
+    response = await client.get("/", headers=headers)
+    assert response.status_code == 200
+    assert "Profile" not in response.headers
+    assert not any(tmp_path.iterdir())
+
+
+async def test_one_at_a_time(mocker: MockerFixture, tmp_path: Path) -> None:
+    started = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        started.set()
+        await finish.wait()
+        await PlainTextResponse("OK")(scope, receive, send)
+
+    middleware = ProfilingMiddleware(app)
+    scope = {"type": "http", "headers": [(b"profile-token", b"secret")]}
+    send = mocker.AsyncMock()
+    first = asyncio.create_task(middleware(scope, mocker.AsyncMock(), send))
+    await started.wait()
+    second = asyncio.create_task(middleware(scope, mocker.AsyncMock(), send))
+    finish.set()
+    await asyncio.gather(first, second)
+
+    headers = [
+        dict(message["headers"])
+        for (message,), _ in send.await_args_list
+        if message["type"] == "http.response.start"
+    ]
+    assert sorted(b"profile" in h for h in headers) == [False, True]
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,125 @@
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+from tortoise.transactions import in_transaction
+
+from app import queries, settings
+from app.metrics import metrics
+from app.models import Organization
+from app.queries import QueryCountMiddleware, count_queries, statement
+from tests.shorthands import max_queries, uses_db
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        (
+            'SELECT "id" FROM "user" WHERE "id"=$1',
+            'SELECT "id" FROM "user" WHERE "id"=?',
+        ),
+        (
+            'SELECT "id" FROM "t1" WHERE "id" IN ($1,$2, $3) LIMIT 10',
+            'SELECT "id" FROM "t1" WHERE "id" IN (?) LIMIT ?',
+        ),
+        ("SELECT 'it''s', 1.5", "SELECT ?"),
+    ],
+)
+def test_statement(query: str, expected: str) -> None:
+    assert statement(query) == expected
+
+
+@uses_db
+async def test_count_queries() -> None:
+    with count_queries() as outer:
+        await Organization.create(name="A")
+        with count_queries() as inner:
+            async with in_transaction():
+                await Organization.filter(name="A").first()
+        await connections.get("default").execute_script("SELECT 1")
+    assert inner.count == 1
+    assert outer.count == 3
+    assert outer.seconds >= inner.seconds > 0
+    await Organization.all()
+    assert outer.count == 3
+
+
+@uses_db
+async def test_slow_query(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.QUERIES, "slow_query_seconds", 0)
+    logger = mocker.patch("app.queries.logger")
+    await connections.get("default").execute_query("SELECT 1")
+    logger.warning.assert_called_once_with(
+        "Slow query ({:.3f}s): {}", mocker.ANY, "SELECT 1"
+    )
+
+
+@uses_db
+async def test_repeated_query(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.QUERIES, "repeated_query_threshold", 3)
+    logger = mocker.patch("app.queries.logger")
+    with count_queries("test") as log:
+        for name in "ABCD":
+            await Organization.filter(name=name).first()
+    assert log.count == 4
+    logger.warning.assert_called_once_with(
+        "Possible N+1 query in {}, the same statement ran {} times: {}",
+        "test",
+        3,
+        mocker.ANY,
+    )
+
+
+@uses_db
+async def test_repeated_query_nested(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.QUERIES, "repeated_query_threshold", 3)
+    logger = mocker.patch("app.queries.logger")
+    normalize = mocker.spy(queries, "statement")
+    # E.g. those of the request, of its timing and of the access log.
+    with count_queries("test"), count_queries() as inner, count_queries():
+        for name in "ABCD":
+            await Organization.filter(name=name).first()
+    assert inner.count == 4
+    assert inner.statements is None
+    logger.warning.assert_called_once()
+    assert normalize.call_count == 4
+
+    # Logs only counting don't need statements.
+    with count_queries():
+        await Organization.all()
+    assert normalize.call_count == 4
+
+
+@uses_db
+async def test_max_queries() -> None:
+    with max_queries(1):
+        await Organization.all()
+    with (
+        pytest.raises(AssertionError, match="2 queries ran, expected at most 1"),
+        max_queries(1),
+    ):
+        await Organization.all()
+        await Organization.all()
+
+
+@uses_db
+async def test_middleware(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(metrics, "routes", {})
+    with count_queries() as log:
+        await client.get(f"/sharing-links/{uuid4()}")
+        await client.get(f"/sharing-links/{uuid4()}")
+        await client.get("/ready")
+    route_metrics = metrics.routes["GET", "/sharing-links/{token}"]
+    assert route_metrics.db_queries == log.count > 0
+    assert route_metrics.db_seconds == pytest.approx(log.seconds)
+    assert metrics.routes["GET", "/ready"].db_queries == 0
+
+
+async def test_not_http(mocker: MockerFixture) -> None:
+    app = mocker.AsyncMock()
+    scope = {"type": "lifespan"}
+    receive, send = mocker.AsyncMock(), mocker.AsyncMock()
+    await QueryCountMiddleware(app)(scope, receive, send)
+    app.assert_awaited_once_with(scope, receive, send)
@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+
+from app import settings
+from app.auth import TokenType, create_jwt
+from app.rate_limits import MemoryBuckets, SharedBuckets, Take, rate_limiter
+from app.sharding import DEFAULT_SHARD
+from tests.shorthands import uses_db
+
+
+@pytest.fixture
+def now(mocker: MockerFixture) -> list[float]:
+    now = [1000.0]
+    mocker.patch("time.monotonic", side_effect=lambda: now[0])
+    return now
+
+
+def test_take() -> None:
+    take = Take(allowed=True, burst=10, rate=2, tokens=3.5)
+    assert take.headers == {
+        "RateLimit-Limit": "10",
+        "RateLimit-Remaining": "3",
+        "RateLimit-Reset": "4",
+    }
+    assert take.retry_after == 1
+    assert Take(allowed=False, burst=10, rate=0.1, tokens=0.5).retry_after == 5
+
+
+class TestMemoryBuckets:
+    async def test_take(self, now: list[float]) -> None:
+        buckets = MemoryBuckets()
+        takes = [await buckets.take("key", 1, 2) for _ in range(3)]
+        assert [take.allowed for take in takes] == [True, True, False]
+
+        now[0] += 0.5
+        assert not (await buckets.take("key", 1, 2)).allowed
+        now[0] += 0.5
+        take = await buckets.take("key", 1, 2)
+        assert take.allowed
+        assert take.tokens == 0
+
+    async def test_cleanup(self, now: list[float]) -> None:
+        buckets = MemoryBuckets()
+        await buckets.take("a", 1, 2)
+        await buckets.take("b", 1, 2)
+        await buckets.take("b", 1, 2)
+
+        now[0] += 1
+        assert await buckets.cleanup() == 1
+        assert list(buckets.buckets) == ["b"]
+
+
+@uses_db
+class TestSharedBuckets:
+    async def test_take(self) -> None:
+        buckets = SharedBuckets()
+        # Time stands still in the test transaction, so nothing is refilled.
+        takes = [await buckets.take("key", 1, 2) for _ in range(3)]
+        assert [take.allowed for take in takes] == [True, True, False]
+        assert takes[-1].tokens == 0
+
+    async def test_refill(self) -> None:
+        buckets = SharedBuckets()
+        await buckets.take("key", 1, 2)
+        await buckets.take("key", 1, 2)
+        await connections.get(DEFAULT_SHARD).execute_query(
+            'UPDATE "ratelimitbucket" SET "update_time" = now() - interval \'1.5s\''
+        )
+        take = await buckets.take("key", 1, 2)
+        assert take.allowed
+        assert take.tokens == pytest.approx(0.5)
+
+    async def test_cleanup(self) -> None:
+        buckets = SharedBuckets()
+        await buckets.take("a", 1, 2)
+        await buckets.take("b", 1, 2)
+        await connections.get(DEFAULT_SHARD).execute_query(
+            'UPDATE "ratelimitbucket" SET "update_time" = now() - interval \'1s\' '
+            "WHERE \"key\" = 'a'"
+        )
+        assert await buckets.cleanup() == 1
+
+
+@uses_db
+@pytest.mark.parametrize("shared", [False, True])
+class TestRequests:
+    @pytest.fixture(autouse=True)
+    def limits(self, mocker: MockerFixture, shared: bool) -> None:
+        mocker.patch.object(settings.RATE_LIMITS, "shared", shared)
+        mocker.patch.object(settings.RATE_LIMITS, "token_rate", 1)
+        mocker.patch.object(settings.RATE_LIMITS, "token_burst", 2)
+        mocker.patch.object(settings.RATE_LIMITS, "organization_rate", 0.01)
+        mocker.patch.object(settings.RATE_LIMITS, "organization_burst", 3)
+        mocker.patch.object(rate_limiter, "memory", MemoryBuckets())
+
+    @staticmethod
+    def headers(organization_id: int = 1) -> dict[str, str]:
+        token = create_jwt(
+            data={"sub": str(organization_id)},
+            expires_in=timedelta(minutes=5),
+            type_=TokenType.ACCESS_TOKEN,
+        )
+        return {"Authorization": f"Bearer {token}"}
+
+    async def test_token_limit(self, client: AsyncClient) -> None:
+        headers = self.headers()
+        response = await client.get("/me", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["RateLimit-Limit"] == "2"
+        assert response.headers["RateLimit-Remaining"] == "1"
+
+        await client.get("/me", headers=headers)
+        response = await client.get("/me", headers=headers)
+        assert response.status_code == 429
+        assert response.headers["RateLimit-Remaining"] == "0"
+        assert response.headers["Retry-After"] == "1"
+
+    async def test_organization_limit(self, client: AsyncClient) -> None:
+        statuses = [
+            (await client.get("/me", headers=self.headers())).status_code
+            for _ in range(4)
+        ]
+        assert statuses == [200, 200, 200, 429]
+        # Other organizations have limits of their own.
+        response = await client.get("/me", headers=self.headers(2))
+        assert response.status_code == 200
+
+    async def test_cleanup(self, client: AsyncClient) -> None:
+        await client.get("/me", headers=self.headers())
+        # Neither bucket is full yet.
+        assert await rate_limiter.cleanup() == 0
+
+    async def test_disabled(self, mocker: MockerFixture, client: AsyncClient) -> None:
+        mocker.patch.object(settings.RATE_LIMITS, "enabled", False)
+        headers = self.headers()
+        for _ in range(3):
+            response = await client.get("/me", headers=headers)
+            assert response.status_code == 200
+        assert "RateLimit-Limit" not in response.headers
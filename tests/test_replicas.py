@@ -0,0 +1,135 @@
+from datetime import timedelta
+
+import pytest
+from faker import Faker
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.connection import connections
+
+from app import jobs, settings
+from app.auth import TokenType, create_jwt
+from app.models import Organization, User
+from app.replicas import ReplicaPool, busy_connections, replica_reads
+from app.sharding import DEFAULT_SHARD, read_connection, shard_replicas
+from tests.conftest import TEST_REPLICA
+from tests.shorthands import uses_replicated_db
+
+
+class Stop(Exception):
+    pass
+
+
+@pytest.fixture
+def pool() -> ReplicaPool:
+    pool = ReplicaPool(["replica_a", "replica_b", "replica_c"])
+    pool.lags = {"replica_a": 0, "replica_b": 0.5}
+    return pool
+
+
+class TestReplicaPool:
+    def test_available(self, mocker: MockerFixture, pool: ReplicaPool) -> None:
+        assert pool.available() == ["replica_a", "replica_b"]
+        mocker.patch.object(settings.REPLICAS, "max_lag_seconds", 0.1)
+        assert pool.available() == ["replica_a"]
+        mocker.patch.object(settings.REPLICAS, "max_lag_seconds", -1)
+        assert pool.pick() is None
+
+    def test_round_robin(self, pool: ReplicaPool) -> None:
+        picks = [pool.pick() for _ in range(4)]
+        assert picks == ["replica_b", "replica_a", "replica_b", "replica_a"]
+
+    def test_least_busy(self, mocker: MockerFixture, pool: ReplicaPool) -> None:
+        mocker.patch.object(settings.REPLICAS, "selection", "least_busy")
+        busy = {"replica_a": 3, "replica_b": 1}
+        mocker.patch("app.replicas.busy_connections", side_effect=busy.get)
+        assert pool.pick() == "replica_b"
+
+
+def test_busy_connections(mocker: MockerFixture) -> None:
+    client = mocker.patch.object(connections, "get").return_value
+    client._pool = None
+    assert busy_connections("replica") == 0
+
+    client._pool = mocker.Mock()
+    client._pool.get_size.return_value = 5
+    client._pool.get_idle_size.return_value = 2
+    assert busy_connections("replica") == 3
+
+
+@uses_replicated_db
+class TestReplicated:
+    def test_read_connection(self) -> None:
+        assert read_connection(DEFAULT_SHARD) == DEFAULT_SHARD
+        token = replica_reads.set(True)
+        try:
+            assert read_connection(DEFAULT_SHARD) == TEST_REPLICA
+        finally:
+            replica_reads.reset(token)
+
+    async def test_reads(self, faker: Faker, client: AsyncClient) -> None:
+        # Only in the replica, so only found when read from there.
+        organization = Organization(name=faker.company())
+        await organization.save(using_db=connections.get(TEST_REPLICA))
+
+        response = await client.get(f"/organizations/{organization.id}")
+        assert response.status_code == 200
+        response = await client.get("/organizations/")
+        assert [obj["id"] for obj in response.json()["items"]] == [str(organization.id)]
+
+    async def test_lagging(self, faker: Faker, client: AsyncClient) -> None:
+        shard_replicas(DEFAULT_SHARD).lags[TEST_REPLICA] = 60
+        organization = await Organization.create(name=faker.company())
+
+        response = await client.get(f"/organizations/{organization.id}")
+        assert response.status_code == 200
+
+    async def test_writes(self, faker: Faker, client: AsyncClient) -> None:
+        organization = await Organization.create(name=faker.company())
+        token = create_jwt(
+            data={"sub": str(organization.id)},
+            expires_in=timedelta(minutes=5),
+            type_=TokenType.ACCESS_TOKEN,
+        )
+        client.headers["Authorization"] = f"Bearer {token}"
+        # Only in the primary, so only found when read from there.
+        user = await User.create(
+            organization=organization,
+            username=faker.user_name(),
+            email=faker.email(),
+        )
+        response = await client.post(
+            f"/users/{user.id}/items/import",
+            json=[{"name": faker.file_name(), "type": "file"}],
+        )
+        assert response.status_code == 201
+
+        response = await client.get(f"/users/{user.id}")
+        assert response.status_code == 404
+
+    async def test_check_lag(self) -> None:
+        pool = shard_replicas(DEFAULT_SHARD)
+        pool.lags.clear()
+        await pool.check_lag()
+        assert pool.lags == {TEST_REPLICA: 0}
+
+    async def test_check_lag_failure(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(
+            connections.get(TEST_REPLICA),
+            "execute_query",
+            side_effect=OSError,
+        )
+        pool = shard_replicas(DEFAULT_SHARD)
+        await pool.check_lag()
+        assert pool.lags == {}
+
+
+class TestRunReplicaLagJob:
+    async def test_smoke(self, mocker: MockerFixture) -> None:
+        check_lag = mocker.patch.object(ReplicaPool, "check_lag")
+        sleep = mocker.patch("asyncio.sleep", side_effect=[None, Stop])
+
+        with pytest.raises(Stop):
+            await jobs.run_replica_lag_job()
+
+        assert check_lag.await_count == 2
+        sleep.assert_called_with(settings.REPLICAS.lag_check_interval_seconds)
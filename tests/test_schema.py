@@ -0,0 +1,59 @@
+import re
+
+import pytest
+from pytest_mock import MockerFixture
+from tortoise import Tortoise
+
+from app import schema, settings
+from app.models import Item, SharingLink
+from app.schema import generate_schemas, partitioned_schema_sql
+from tests.conftest import TEST_PARTITIONS
+from tests.shorthands import uses_db
+
+RELATION_NAME = re.compile(r'"Relation Name": "(\w+)"')
+
+
+async def partitions_of(table: str) -> list[str]:
+    _, rows = await Item._meta.db.execute_query(
+        "SELECT inhrelid::regclass::text AS name FROM pg_inherits "
+        "WHERE inhparent = $1::regclass ORDER BY 1",
+        [table],
+    )
+    return [row["name"] for row in rows]
+
+
+def test_partitioned_schema_sql() -> None:
+    before, after = partitioned_schema_sql(2)
+    assert 'PARTITION OF "item"\n    FOR VALUES WITH (MODULUS 2, REMAINDER 1)' in before
+    assert '"sharinglink_p1" PARTITION OF "sharinglink"' in before
+    assert '"fk_item_owner_id"' in after
+
+
+async def test_plain(mocker: MockerFixture) -> None:
+    mocker.patch.object(schema, "get_schema_sql", return_value="SCHEMA")
+    get_connection = mocker.patch.object(Tortoise, "get_connection")
+    execute_script = get_connection.return_value.execute_script = mocker.AsyncMock()
+    mocker.patch.object(settings.PARTITIONS, "count", 0)
+    await generate_schemas()
+    execute_script.assert_awaited_once_with("SCHEMA")
+
+
+@uses_db
+class TestPartitioned:
+    @pytest.mark.parametrize("table", ["item", "sharinglink"])
+    async def test_partitions(self, table: str) -> None:
+        assert await partitions_of(table) == [
+            f"{table}_p{remainder}" for remainder in range(TEST_PARTITIONS)
+        ]
+
+    async def test_idempotent(self) -> None:
+        await generate_schemas(partitions=TEST_PARTITIONS)
+        assert len(await partitions_of("item")) == TEST_PARTITIONS
+
+    @pytest.mark.parametrize("model", [Item, SharingLink])
+    async def test_pruned(self, model: type[Item | SharingLink]) -> None:
+        plan = await model.filter(organization_id=1, id=1).explain()
+        assert len(RELATION_NAME.findall(str(plan))) == 1
+
+        plan = await model.filter(id=1).explain()
+        assert len(RELATION_NAME.findall(str(plan))) == TEST_PARTITIONS
@@ -0,0 +1,35 @@
+import pytest
+
+from app.settings import AdmissionSettings, PostgresSettings
+
+
+@pytest.mark.parametrize(
+    ("workers", "min_size", "max_size"),
+    [(1, 10, 80), (4, 2, 20), (3, 3, 26), (100, 1, 1)],
+)
+def test_connection_split(workers: int, min_size: int, max_size: int) -> None:
+    database = PostgresSettings(min_size=10, max_size=80)
+    credentials = database.connection(workers)["credentials"]
+    assert (credentials["minsize"], credentials["maxsize"]) == (min_size, max_size)
+
+
+@pytest.mark.parametrize(
+    ("workers", "max_size"),
+    [(1, 79), (4, 19), (3, 25), (100, 1)],
+)
+def test_connection_split_listen(workers: int, max_size: int) -> None:
+    database = PostgresSettings(min_size=10, max_size=80)
+    credentials = database.connection(workers, listen=True)["credentials"]
+    assert credentials["maxsize"] == max_size
+
+
+@pytest.mark.parametrize(
+    ("workers", "slots", "organization_slots"),
+    [(1, 100, 25), (4, 25, 6), (3, 33, 8), (100, 1, 1)],
+)
+def test_admission_split(workers: int, slots: int, organization_slots: int) -> None:
+    admission = AdmissionSettings(slots=100, organization_slots=25).split(workers)
+    assert (admission.slots, admission.organization_slots) == (
+        slots,
+        organization_slots,
+    )
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+import pytest
+from faker import Faker
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app.auth import TokenType, create_jwt
+from app.models import Organization, User
+from app.sharding import (
+    DEFAULT_SHARD,
+    ShardMap,
+    current_shard,
+    find_in_shards,
+    shard_map,
+    use_organization_shard,
+    using_shard,
+)
+from tests.conftest import TEST_SHARD
+from tests.shorthands import uses_db, uses_sharded_db
+
+
+async def create_organization(faker: Faker, shard: str) -> Organization:
+    with using_shard(shard):
+        return await Organization.create(name=faker.company())
+
+
+def test_using_shard() -> None:
+    with using_shard(TEST_SHARD):
+        assert current_shard.get() == TEST_SHARD
+    assert current_shard.get() == DEFAULT_SHARD
+
+
+@uses_db
+async def test_single_shard(mocker: MockerFixture) -> None:
+    exists = mocker.patch("tortoise.queryset.ExistsQuery.__await__")
+    assert await ShardMap().find(1) == DEFAULT_SHARD
+    exists.assert_not_called()
+
+
+@uses_sharded_db
+class TestShardMap:
+    @pytest.mark.parametrize("shard", [DEFAULT_SHARD, TEST_SHARD])
+    async def test_find(self, faker: Faker, shard: str) -> None:
+        organization = await create_organization(faker, shard)
+        assert await shard_map.find(organization.id) == shard
+        assert shard_map.shards == {organization.id: shard}
+
+    async def test_find_cached(self, mocker: MockerFixture) -> None:
+        mocker.patch.object(shard_map, "shards", {1: TEST_SHARD})
+        assert await shard_map.find(1) == TEST_SHARD
+
+    async def test_find_missing(self) -> None:
+        assert await shard_map.find(1) is None
+        assert shard_map.shards == {}
+
+    async def test_pick(self, faker: Faker) -> None:
+        assert await shard_map.pick() == DEFAULT_SHARD
+        await create_organization(faker, DEFAULT_SHARD)
+        assert await shard_map.pick() == TEST_SHARD
+
+
+@uses_sharded_db
+class TestFindInShards:
+    async def test_smoke(self, faker: Faker) -> None:
+        organization = await create_organization(faker, TEST_SHARD)
+        with using_shard(DEFAULT_SHARD):
+            found = await find_in_shards(Organization.filter(id=organization.id))
+            assert found == organization
+            assert current_shard.get() == TEST_SHARD
+
+    async def test_missing(self) -> None:
+        assert await find_in_shards(Organization.filter(id=1)) is None
+        assert current_shard.get() == DEFAULT_SHARD
+
+
+@uses_sharded_db
+class TestRequests:
+    async def test_use_organization_shard(self, faker: Faker) -> None:
+        organization = await create_organization(faker, TEST_SHARD)
+        with using_shard(DEFAULT_SHARD):
+            await use_organization_shard(organization.id)
+            assert current_shard.get() == TEST_SHARD
+            await use_organization_shard(1)
+            assert current_shard.get() == DEFAULT_SHARD
+
+    async def test_routed(self, faker: Faker, client: AsyncClient) -> None:
+        organizations = {}
+        for shard in (DEFAULT_SHARD, TEST_SHARD):
+            organization = await create_organization(faker, shard)
+            with using_shard(shard):
+                await User.create(
+                    organization=organization,
+                    username=shard,
+                    email=faker.email(),
+                )
+            organizations[shard] = organization
+
+        for shard, organization in organizations.items():
+            token = create_jwt(
+                data={"sub": str(organization.id)},
+                expires_in=timedelta(minutes=5),
+                type_=TokenType.ACCESS_TOKEN,
+            )
+            response = await client.get(
+                "/users/", headers={"Authorization": f"Bearer {token}"}
+            )
+            assert response.status_code == 200
+            assert [user["username"] for user in response.json()["items"]] == [shard]
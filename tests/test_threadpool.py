@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+from anyio.to_thread import current_default_thread_limiter
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from app import settings, threadpool
+from app.threadpool import configure_threadpool, sync_endpoint
+
+
+async def test_configure_threadpool(mocker: MockerFixture) -> None:
+    limiter = current_default_thread_limiter()
+    mocker.patch.object(settings.THREADPOOL, "size", 7)
+    total_tokens = limiter.total_tokens
+    try:
+        configure_threadpool()
+        assert limiter.total_tokens == 7
+    finally:
+        limiter.total_tokens = total_tokens
+
+
+@pytest.mark.parametrize("inline", [True, False])
+async def test_sync_endpoint(mocker: MockerFixture, inline: bool) -> None:
+    mocker.patch.object(settings.THREADPOOL, "inline_sync_endpoints", inline)
+
+    def get_thread(value: int) -> tuple[int, int]:
+        return value, threading.get_ident()
+
+    value, thread = await sync_endpoint(get_thread)(value=1)
+    assert value == 1
+    assert (thread == threading.get_ident()) is inline
+
+
+@pytest.mark.parametrize("inline", [True, False])
+async def test_routes(mocker: MockerFixture, client: AsyncClient, inline: bool) -> None:
+    mocker.patch.object(settings.THREADPOOL, "inline_sync_endpoints", inline)
+    run_in_threadpool = mocker.spy(threadpool, "run_in_threadpool")
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert run_in_threadpool.called is not inline
@@ -0,0 +1,116 @@
+import re
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+from starlette.responses import PlainTextResponse
+from starlette.types import Receive, Scope, Send
+
+from app import settings
+from app.metrics import metrics
+from app.models import Organization
+from app.queries import QueryCountMiddleware
+from app.timing import ServerTimingMiddleware
+from tests.shorthands import uses_db
+
+
+def phases(header: str) -> dict[str, float]:
+    return {
+        name: float(duration)
+        for name, duration in re.findall(
+            r"(\w+);(?:desc=\"[^\"]*\";)?dur=([\d.]+)", header
+        )
+    }
+
+
+async def test_disabled(client: AsyncClient) -> None:
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+
+
+async def test_enabled(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "enabled", True)
+    response = await client.get("/")
+    assert response.status_code == 200
+    header = response.headers["Server-Timing"]
+    assert header.startswith('db;desc="0 queries";dur=0.00, ')
+    timings = phases(header)
+    assert timings.keys() == {"db", "app", "serialize", "total"}
+    assert timings["total"] >= timings["app"] + timings["serialize"]
+
+
+async def test_no_endpoint(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "enabled", True)
+    response = await client.get("/nowhere")
+    assert response.status_code == 404
+    assert phases(response.headers["Server-Timing"]).keys() == {"db", "total"}
+
+
+@pytest.mark.parametrize(
+    ("headers", "timed"),
+    [
+        ({}, False),
+        ({"Server-Timing-Token": "wrong"}, False),
+        ({"Server-Timing-Token": "secret"}, True),
+    ],
+)
+async def test_token(
+    mocker: MockerFixture,
+    client: AsyncClient,
+    headers: dict[str, str],
+    timed: bool,
+) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "token", "secret")
+    response = await client.get("/", headers=headers)
+    assert ("Server-Timing" in response.headers) is timed
+
+
+async def test_auth(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "enabled", True)
+    response = await client.post(
+        "/token", data={"grant_type": "authorization_code", "code": "invalid"}
+    )
+    assert response.status_code == 400
+    assert "auth" in phases(response.headers["Server-Timing"])
+
+
+@uses_db
+async def test_db(mocker: MockerFixture, client: AsyncClient) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "enabled", True)
+    response = await client.get(f"/sharing-links/{uuid4()}")
+    assert response.status_code == 404
+    header = response.headers["Server-Timing"]
+    assert re.match(r'db;desc="[1-9]\d* queries";', header)
+    timings = phases(header)
+    assert timings["app"] >= timings["db"]
+
+
+async def test_not_http(mocker: MockerFixture) -> None:
+    app = mocker.AsyncMock()
+    scope = {"type": "lifespan"}
+    receive, send = mocker.AsyncMock(), mocker.AsyncMock()
+    await ServerTimingMiddleware(app)(scope, receive, send)
+    app.assert_awaited_once_with(scope, receive, send)
+
+
+@uses_db
+async def test_repeated_query(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings.SERVER_TIMING, "enabled", True)
+    mocker.patch.object(settings.QUERIES, "repeated_query_threshold", 2)
+    mocker.patch.object(metrics, "routes", {})
+    logger = mocker.patch("app.queries.logger")
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        for name in "AB":
+            await Organization.filter(name=name).first()
+        await PlainTextResponse("OK")(scope, receive, send)
+
+    transport = ASGITransport(QueryCountMiddleware(ServerTimingMiddleware(app)))
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/repeated")
+    assert response.headers["Server-Timing"].startswith('db;desc="2 queries";')
+    # Only by the request's log, not also by the timing's.
+    logger.warning.assert_called_once()
+    assert logger.warning.call_args.args[1] == "GET /repeated"
@@ -0,0 +1,80 @@
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+from faker import Faker
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from tortoise.backends.asyncpg.client import AsyncpgDBClient
+from tortoise.connection import connections
+
+from app import warmup
+from app.auth import TokenType, create_jwt
+from app.models import Item, Organization, User
+from app.sharding import DEFAULT_SHARD
+from tests.shorthands import uses_db
+
+
+@pytest.mark.usefixtures("init_tortoise")
+async def test_warm_up(mocker: MockerFixture) -> None:
+    client = connections.get(DEFAULT_SHARD)
+    # Start over with a pool of several connections.
+    await client.close()
+    mocker.patch.object(client, "pool_minsize", 3)
+
+    mocker.patch.object(warmup.readiness, "ready", False)
+    await warmup.warm_up()
+    assert warmup.readiness.ready
+
+    statements = {query.sql() for query in warmup.hot_queries()}
+    async with AsyncExitStack() as stack:
+        for _ in range(3):
+            connection = await stack.enter_async_context(client.acquire_connection())
+            # The statement cache of the connection, as looked up by `fetch`.
+            cached = {stmt.query for stmt in connection._stmt_cache.iter_statements()}
+            assert statements <= cached
+
+
+@uses_db
+async def test_hot_queries(
+    mocker: MockerFixture,
+    faker: Faker,
+    client: AsyncClient,
+) -> None:
+    """The warmed up statements are the ones the endpoints actually run."""
+    organization = await Organization.create(name=faker.company())
+    user = await User.create(
+        organization=organization,
+        username=faker.user_name(),
+        email=faker.email(),
+    )
+    folder = await Item.create(
+        organization=organization,
+        owner=user,
+        name=faker.file_name(),
+        type=Item.Type.FOLDER,
+    )
+    token = create_jwt(
+        data={"sub": str(organization.id)},
+        expires_in=timedelta(minutes=5),
+        type_=TokenType.ACCESS_TOKEN,
+    )
+    client.headers["Authorization"] = f"Bearer {token}"
+    execute_query = mocker.spy(AsyncpgDBClient, "execute_query")
+
+    for url in [
+        f"/organizations/{organization.id}",
+        f"/users/{user.id}",
+        f"/users/{user.id}/items/",
+        f"/users/{user.id}/items/?cursor={folder.id}",
+        f"/folders/{folder.id}/items/",
+        f"/items/{folder.id}/sharing-links/?active_only=true",
+        f"/sharing-links/{uuid4()}",
+    ]:
+        response = await client.get(url)
+        assert response.status_code in (200, 404), url
+
+    statements = {query.sql() for query in warmup.hot_queries()}
+    executed = {call.args[1] for call in execute_query.call_args_list}
+    assert executed <= statements